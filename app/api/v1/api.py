@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import health, chat, voice
+from app.api.v1.endpoints import health, chat
 
 api_router = APIRouter()
 
@@ -1,4 +1,50 @@
 
-from fastapi import APIRouter
+import logging
+from typing import Callable, Dict
+
+from fastapi import APIRouter, Depends, Query, WebSocket, status
+
+from app.client.base import BaseClient
+from app.client.websocket import WebSocketClient
+from app.services.chain import BotChain
+from app.services.voice.tts import resolve_audio_format
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
+
+# client_id -> 当前连接
+sessions: Dict[str, WebSocketClient] = {}
+
+
+def get_chain_factory() -> Callable[[BaseClient], BotChain]:
+    return BotChain
+
+
+@router.websocket("/api/v1/ws/chat/{client_id}")
+async def chat_websocket(
+    websocket: WebSocket,
+    client_id: str,
+    chain_factory: Callable[[BaseClient], BotChain] = Depends(get_chain_factory),
+    audio_format: str = Query("mp3", alias="format"),
+    sample_rate: int = Query(22050),
+):
+    # TTS 直接输出浏览器要的格式，例如 pcm 可以边收边播
+    try:
+        resolve_audio_format(audio_format, sample_rate)
+    except ValueError as e:
+        logger.warning(f"Client {client_id} rejected: {e}")
+        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        return
+    await websocket.accept()
+    client = WebSocketClient(websocket, client_id,
+                             audio_format=audio_format, sample_rate=sample_rate)
+    sessions[client_id] = client
+    logger.info(f"Client {client_id} connected, {len(sessions)} active sessions")
+    try:
+        chain = chain_factory(client)
+        await chain.run_forever()
+    finally:
+        if sessions.get(client_id) is client:
+            del sessions[client_id]
+        logger.info(f"Client {client_id} closed, {len(sessions)} active sessions")
@@ -1,9 +1,18 @@
 from app.schemas import Message
+from app.services.tracing import NULL_TRACE
 from typing import AsyncGenerator
 
 
 class BaseClient:
 
+    # TTS 输出格式（"mp3" / "pcm" / "opus"）和采样率，由客户端按播放方式选择
+    audio_format: str = "mp3"
+    sample_rate: int = 22050
+    # 会话标识，同一个客户端重连后接着之前的对话
+    client_id: str = "local"
+    # 当前这一轮的打点，由 BotChain 设置
+    trace = NULL_TRACE
+
     async def stt_input(self) -> AsyncGenerator[bytes, None]:
         raise NotImplementedError
 
@@ -13,6 +22,9 @@ class BaseClient:
     async def llm_output(self, message: Message):
         raise NotImplementedError
 
+    async def flush(self):
+        raise NotImplementedError
+
     async def heartbeat(self):
         raise NotImplementedError
 
@@ -0,0 +1,170 @@
+"""
+Non-blocking microphone capture
+PortAudio 回调线程写入预分配的环形缓冲区，事件循环里的消费者按帧读取
+"""
+import asyncio
+import logging
+from typing import Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class RingBuffer:
+    """预分配的镜像环形缓冲区
+
+    Every byte is stored twice, at ``i`` and ``i + capacity``, so any window
+    of up to ``capacity`` bytes is contiguous and can be handed out as a
+    ``memoryview`` without copying. There is one writer; ``written`` counts
+    all bytes ever written and readers keep their own absolute cursors.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = bytearray(2 * capacity)
+        self._view = memoryview(self._buf)
+        self.written = 0
+
+    def write(self, data: bytes) -> None:
+        data = memoryview(data).cast("B")
+        # 一次写入超过容量时只保留最后 capacity 字节
+        skipped = max(0, len(data) - self.capacity)
+        data = data[skipped:]
+        pos = (self.written + skipped) % self.capacity
+        first = min(len(data), self.capacity - pos)
+        self._put(pos, data[:first])
+        self._put(0, data[first:])
+        # 数据写完后再推进计数，读者不会看到半帧
+        self.written += skipped + len(data)
+
+    def _put(self, pos: int, data: memoryview) -> None:
+        n = len(data)
+        if n:
+            self._view[pos:pos + n] = data
+            self._view[pos + self.capacity:pos + self.capacity + n] = data
+
+    def read(self, cursor: int, size: int) -> memoryview:
+        """``size`` bytes starting at absolute position ``cursor``
+
+        The view aliases the buffer: it stays valid until the writer has
+        produced another ``capacity - size`` bytes.
+        """
+        if size > self.capacity:
+            raise ValueError(f"frame of {size} bytes exceeds ring capacity {self.capacity}")
+        if cursor + size > self.written or cursor < self.written - self.capacity:
+            raise IndexError(f"bytes [{cursor}, {cursor + size}) are not in the ring")
+        start = cursor % self.capacity
+        return self._view[start:start + size]
+
+
+class CaptureReader:
+    """环形缓冲区的一个消费者，维护自己的读位置"""
+
+    def __init__(self, capture: "MicrophoneCapture", frame_bytes: int):
+        self.capture = capture
+        self.frame_bytes = frame_bytes
+        self.cursor = capture.ring.written
+        self.overruns = 0
+        self.ready = asyncio.Event()
+
+    def available(self) -> int:
+        return self.capture.ring.written - self.cursor
+
+    def skip_to_latest(self) -> None:
+        """Drop everything buffered so far, e.g. after a wake word"""
+        self.cursor = self.capture.ring.written
+
+    async def read(self) -> memoryview:
+        ring = self.capture.ring
+        while True:
+            self.ready.clear()
+            if self.available() > ring.capacity - self.frame_bytes:
+                # 消费太慢被写入端追上，跳到最新的一帧
+                self.overruns += 1
+                logger.warning(f"Capture overrun, {self.available()} bytes behind")
+                self.cursor = ring.written - self.frame_bytes
+            if self.available() >= self.frame_bytes:
+                frame = ring.read(self.cursor, self.frame_bytes)
+                self.cursor += self.frame_bytes
+                return frame
+            if self.capture.closed:
+                raise EOFError("capture closed")
+            await self.ready.wait()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> memoryview:
+        try:
+            return await self.read()
+        except EOFError:
+            raise StopAsyncIteration
+
+    def close(self) -> None:
+        self.capture.readers.discard(self)
+
+
+class MicrophoneCapture:
+    """麦克风采集
+
+    PyAudio runs in callback mode, so reads never block the event loop: the
+    PortAudio thread copies each period into the ring buffer and wakes the
+    readers with ``call_soon_threadsafe``.
+    """
+
+    def __init__(self, rate: int = 16000, channels: int = 1, sample_width: int = 2,
+                 period_frames: int = 512, buffer_seconds: float = 5.0,
+                 device_index: Optional[int] = None):
+        self.rate = rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.period_frames = period_frames
+        self.device_index = device_index
+        self.ring = RingBuffer(int(rate * buffer_seconds) * channels * sample_width)
+        self.readers: Set[CaptureReader] = set()
+        self.closed = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pa = None
+        self._stream = None
+
+    def reader(self, frame_bytes: int) -> CaptureReader:
+        reader = CaptureReader(self, frame_bytes)
+        self.readers.add(reader)
+        return reader
+
+    def start(self) -> None:
+        import pyaudio
+
+        self._loop = asyncio.get_running_loop()
+        self.closed = False
+        self._pa = pyaudio.PyAudio()
+        self._stream = self._pa.open(
+            format=self._pa.get_format_from_width(self.sample_width),
+            channels=self.channels,
+            rate=self.rate,
+            input=True,
+            input_device_index=self.device_index,
+            frames_per_buffer=self.period_frames,
+            stream_callback=self._on_audio)
+        self._stream.start_stream()
+
+    def stop(self) -> None:
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pa is not None:
+            self._pa.terminate()
+            self._pa = None
+        self.closed = True
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup)
+
+    def _on_audio(self, in_data, frame_count, time_info, status):
+        # PortAudio 线程
+        self.ring.write(in_data)
+        self._loop.call_soon_threadsafe(self._wakeup)
+        return None, 0  # pyaudio.paContinue
+
+    def _wakeup(self) -> None:
+        for reader in self.readers:
+            reader.ready.set()
@@ -0,0 +1,91 @@
+"""
+Audio front end for the local client
+一次采集，分发给唤醒词、VAD 和 ASR
+"""
+import time
+import logging
+from typing import AsyncGenerator, Callable, Optional
+
+from app.client.capture import MicrophoneCapture
+from app.services.voice.vad import VoiceActivityDetector
+
+logger = logging.getLogger(__name__)
+
+
+class AudioFrontEnd:
+    """音频前端
+
+    Wake-word detection and speech share the single capture ring. While
+    idle, ``wake_frame_bytes`` frames go to ``wake_word``. Once it fires (or
+    ``wake()`` is called), the speech reader starts at the exact ring
+    position where the wake word ended, so words spoken right after it are
+    not lost. ``frame_bytes`` frames then pass through the VAD to ASR as
+    memoryviews into the ring. After ``idle_timeout`` seconds without speech
+    or ``touch()`` it goes back to waiting for the wake word.
+    """
+
+    def __init__(self, capture: MicrophoneCapture,
+                 wake_word: Optional[Callable[[memoryview], bool]] = None,
+                 vad: Optional[VoiceActivityDetector] = None,
+                 frame_bytes: int = 3200, wake_frame_bytes: int = 1024,
+                 idle_timeout: float = 10.0):
+        self.capture = capture
+        self.wake_word = wake_word
+        self.vad = vad or VoiceActivityDetector()
+        self.idle_timeout = idle_timeout
+        self.wake_reader = capture.reader(wake_frame_bytes)
+        self.speech_reader = capture.reader(frame_bytes)
+        self.awake = False
+        self.last_active_time = time.monotonic()
+        self._woken = False
+
+    def wake(self) -> None:
+        """Start listening without a wake word, e.g. on a key press"""
+        self._woken = True
+
+    def touch(self) -> None:
+        """Keep the session open, e.g. while the assistant is talking"""
+        self.last_active_time = time.monotonic()
+
+    async def wait_for_wake(self) -> int:
+        """Ring position at which listening should start"""
+        self._woken = False
+        self.wake_reader.skip_to_latest()
+        logger.info("Listening for wake word...")
+        while True:
+            frame = await self.wake_reader.read()
+            # 手动唤醒最多晚一个唤醒词帧生效
+            if self._woken:
+                logger.info("Woken manually")
+                return self.wake_reader.cursor
+            if self.wake_word is not None and self.wake_word(frame):
+                logger.info("Wake word detected!")
+                return self.wake_reader.cursor
+
+    async def listen(self, cursor: int) -> AsyncGenerator[bytes, None]:
+        """Voiced frames from ``cursor`` on until the user goes quiet
+
+        The VAD's trailing silence after each utterance is forwarded too so
+        ASR can finalize the sentence, but only speech keeps the session
+        awake.
+        """
+        self.speech_reader.cursor = cursor
+        self.vad.reset()
+        self.awake = True
+        self.touch()
+        try:
+            while time.monotonic() - self.last_active_time <= self.idle_timeout:
+                frame = await self.speech_reader.read()
+                for data in self.vad.process(frame):
+                    if self.vad.triggered:
+                        self.touch()
+                    yield data
+            logger.info("no speech detected, back to wake word")
+        finally:
+            self.awake = False
+
+    async def stream(self) -> AsyncGenerator[bytes, None]:
+        while True:
+            cursor = await self.wait_for_wake()
+            async for data in self.listen(cursor):
+                yield data
@@ -12,17 +12,20 @@ import sys
 import time
 import logging
 import numpy
-import pyaudio
 import pvporcupine
-import audioop
 from fastapi import WebSocket
 from typing import AsyncGenerator, Optional
 
+from app.client.capture import MicrophoneCapture
+from app.client.frontend import AudioFrontEnd
 from app.services.voice.mp3player import RealtimeMp3Player
+from app.services.voice.vad import VoiceActivityDetector
 from app.config.settings import settings
-from app.schemas import Message
+from app.schemas import Message, Step
+from app.services import tracing
 from app.services.chain import BotChain
 from app.client.base import BaseClient
+from app.devices.manager import get_device_manager
 
 
 logging.basicConfig(level=logging.INFO)
@@ -33,103 +36,76 @@ parser.add_argument("--speech")
 
 class LocalClient(BaseClient):
 
-    def __init__(self, rms_threshold: int = 300):
+    # 本地播放直接要 PCM，不用再解码 MP3
+    audio_format = "pcm"
+    sample_rate = 22050
+
+    def __init__(self, rms_threshold: int = 300, frame_bytes: int = 3200,
+                 wake_frame_length: Optional[int] = None, buffer_seconds: float = 5.0):
         super().__init__()
         # RMS threshold for audio (16-bit PCM). Frames with RMS below
-        # this value will be filtered out in `input()`.
+        # this value are never treated as speech.
         self.rms_threshold = rms_threshold
-        self.mic = pyaudio.PyAudio()
-        self.stream = self.mic.open(
-            format=pyaudio.paInt16,
-            channels=1,
-            rate=16000,
-            # frames_per_buffer=3200,
-            input=True)
         self.porcupine = pvporcupine.create(
             access_key=settings.PICOVOICE_ACCESS_KEY,
             keyword_paths=[settings.PICOVOICE_CUSTOM_PPN],
             model_path=settings.PICOVOICE_ZH_MODEL)
-        self.player = RealtimeMp3Player()
-        self.last_active_time = time.time()
+        # 采集在 PortAudio 回调线程里进行，唤醒词、VAD 和 ASR 共用一份音频
+        self.capture = MicrophoneCapture(rate=16000, buffer_seconds=buffer_seconds)
+        self.frontend = AudioFrontEnd(
+            self.capture,
+            wake_word=self.detect,
+            vad=VoiceActivityDetector(min_rms=rms_threshold),
+            frame_bytes=frame_bytes,
+            wake_frame_bytes=(wake_frame_length or self.porcupine.frame_length)
+            * self.capture.sample_width)
+        self.player = RealtimeMp3Player(decoder="pcm", rate=self.sample_rate)
+
+    def detect(self, frame: memoryview) -> bool:
+        pcm = numpy.frombuffer(frame, dtype=numpy.int16)
+        return self.porcupine.process(pcm) >= 0
+
+    def on_stdin(self):
+        sys.stdin.readline()
+        logger.info("Enter key pressed!")
+        self.frontend.wake()
 
-    async def detect(self):
-        logger.info("Listening for wake word... (Press Enter to start recording)")
-        # Create a task to listen for keyboard input
-        async def listen_for_enter():
-            input()
-            return True
-        
-        enter_task = asyncio.create_task(listen_for_enter())
-        
-        try:
-            while True:
-                # Check if Enter was pressed
-                if enter_task.done():
-                    logger.info("Enter key pressed!")
-                    self.last_active_time = time.time()
-                    break
-                
-                # Listen for wake word
-                pcm = self.stream.read(self.porcupine.frame_length, exception_on_overflow=False)
-                pcm = numpy.frombuffer(pcm, dtype=numpy.int16)
-                keyword_index = self.porcupine.process(pcm)
-                if keyword_index >= 0:
-                    logger.info("Wake word detected!")
-                    self.last_active_time = time.time()
-                    break  
-                else:
-                    await asyncio.sleep(0.05)
-        finally:
-            # Cancel the enter task if it's still running
-            if not enter_task.done():
-                enter_task.cancel()
     async def stt_input(self) -> AsyncGenerator[bytes, None]:
-        while True:
-            await self.detect()
-            while True:
-                data = self.stream.read(3200, exception_on_overflow=False)
-                # idata = numpy.frombuffer(data, dtype=numpy.int16)
-                # fdata = idata.astype(numpy.float32) / 32768.0
-                # rms = numpy.sqrt(numpy.mean(fdata ** 2))
-
-                # rms = audioop.rms(data, 2)
-                rms = 500
-
-                if rms > self.rms_threshold:
-                    logger.info(f"rms - {rms}")
-                    self.last_active_time = time.time()
-                    yield data
-                    await asyncio.sleep(0.05)
-                else:
-                    await asyncio.sleep(0.05)
-
-                if time.time() - self.last_active_time > 1:
-                    await asyncio.sleep(0.1)
-                    
-                if time.time() - self.last_active_time > 10:
-                    logger.info("no speech detected, break")
-                    break
+        logger.info("Listening for wake word... (Press Enter to start recording)")
+        async for data in self.frontend.stream():
+            # 下游会保留帧（如插话预录），这里复制一次
+            yield bytes(data)
 
     async def llm_output(self, message: Message):
-        if message.data.text_chunk:
-            print(f"{message.data.text_chunk}", end="", flush=True)
-            self.last_active_time = time.time()
-        elif message.data.audio_chunk:
+        if message.data.audio_chunk:
             self.player.write(message.data.audio_chunk)
-            self.last_active_time = time.time()
+            self.trace.mark(tracing.CLIENT_AUDIO)
+            self.frontend.touch()
+        elif message.step == Step.LLM and not message.data.is_final and message.data.text_chunk:
+            print(f"{message.data.text_chunk}", end="", flush=True)
+            self.frontend.touch()
+        elif message.step == Step.TTS and message.data.is_final:
+            # 回复结束，播完剩余部分不算卡顿
+            self.player.end_of_stream()
         else:
             pass
         
+    async def flush(self):
+        # 清空抖动缓冲即可静音，很快返回
+        self.player.flush()
+
     async def heartbeat(self):
         pass
 
     async def start(self):
+        self.capture.start()
         self.player.start()
+        # stdin 由事件循环监听，不阻塞采集和播放
+        asyncio.get_running_loop().add_reader(sys.stdin, self.on_stdin)
 
     async def stop(self):
-        self.stream.stop_stream()
-        self.stream.close()
-        self.mic.terminate()
+        asyncio.get_running_loop().remove_reader(sys.stdin)
+        self.capture.stop()
         self.player.stop()
 
 
@@ -147,7 +123,10 @@ async def main():
         
         # Create a BotChain instance with this client
         from app.services.chain import BotChain
-        chain = BotChain(client)
+        from app.services.voice.stt import close_recognition_pool
+        devices = get_device_manager()
+        await devices.start()
+        chain = BotChain(client, devices=devices)
         
         # Start the BotChain
         await chain.start()
@@ -156,6 +135,9 @@ async def main():
     finally:
         # Close the client
         await chain.stop()
+        await devices.stop()
+        # 预热的识别会话占着非守护线程，不关掉进程退不出去
+        await close_recognition_pool()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+"""
+WebSocket client for AnyBot
+
+Bridges one browser session (app/static/index.html) to its own BotChain:
+16 kHz PCM frames come in as binary messages, text events go out as JSON and
+synthesized audio as binary frames.
+"""
+import asyncio
+import logging
+from typing import AsyncGenerator, Optional, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.client.base import BaseClient
+from app.schemas import Message, Role, Step
+from app.services import tracing
+
+logger = logging.getLogger(__name__)
+
+
+class WebSocketClient(BaseClient):
+    """每个 WebSocket 连接对应一个客户端
+
+    Both directions go through bounded queues. When the chain falls behind,
+    the reader stops pulling frames off the socket and TCP pushes back on the
+    browser. When the browser falls behind, ``llm_output`` blocks and only
+    this session's chain slows down.
+    """
+
+    def __init__(self, websocket: WebSocket, client_id: str,
+                 max_input_frames: int = 50, max_output_messages: int = 200,
+                 audio_format: str = "mp3", sample_rate: int = 22050):
+        super().__init__()
+        self.websocket = websocket
+        self.client_id = client_id
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.inbound: asyncio.Queue[Optional[bytes]] = asyncio.Queue(maxsize=max_input_frames)
+        self.outbound: asyncio.Queue[Union[bytes, dict]] = asyncio.Queue(maxsize=max_output_messages)
+        self.tasks: list[asyncio.Task] = []
+
+    async def stt_input(self) -> AsyncGenerator[bytes, None]:
+        while True:
+            data = await self.inbound.get()
+            if data is None:
+                break
+            yield data
+
+    async def llm_output(self, message: Message):
+        data = message.data
+        if data is None:
+            return
+        if message.step == Step.ASR and data.role == Role.USER and data.is_final:
+            await self.outbound.put({"type": "sentence_complete", "content": data.text_chunk})
+        elif message.step == Step.LLM and data.is_final:
+            await self.outbound.put({"type": "text", "content": data.text_chunk})
+        elif message.step == Step.TTS and data.audio_chunk:
+            await self.outbound.put(data.audio_chunk)
+        elif message.step == Step.TTS and data.is_final:
+            await self.outbound.put({"type": "turn_done"})
+
+    async def flush(self):
+        # 丢弃还没发出去的音频，文本事件保留
+        kept = []
+        while not self.outbound.empty():
+            item = self.outbound.get_nowait()
+            if not isinstance(item, bytes):
+                kept.append(item)
+        for item in kept:
+            self.outbound.put_nowait(item)
+        # 已经发到浏览器、排好播放的音频由浏览器自己停掉
+        await self.outbound.put({"type": "interrupt"})
+
+    async def heartbeat(self):
+        pass
+
+    async def start(self):
+        self.tasks.append(asyncio.create_task(self.receive_loop()))
+        self.tasks.append(asyncio.create_task(self.send_loop()))
+
+    async def stop(self):
+        for task in self.tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+
+    async def receive_loop(self):
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    await self.inbound.put(message["bytes"])
+        except WebSocketDisconnect:
+            pass
+        finally:
+            logger.info(f"Client {self.client_id} disconnected")
+            # 通知 stt_input 结束，不能因为队列满而阻塞
+            while True:
+                try:
+                    self.inbound.put_nowait(None)
+                    break
+                except asyncio.QueueFull:
+                    self.inbound.get_nowait()
+
+    async def send_loop(self):
+        try:
+            while True:
+                item = await self.outbound.get()
+                if isinstance(item, bytes):
+                    await self.websocket.send_bytes(item)
+                    self.trace.mark(tracing.CLIENT_AUDIO)
+                else:
+                    await self.websocket.send_json(item)
+        except (WebSocketDisconnect, RuntimeError) as e:
+            logger.info(f"Client {self.client_id} send loop ended: {e}")
@@ -1,10 +1,24 @@
+import logging
+from typing import List, Optional
 from app.config.settings import settings
+from app.devices.client import HomeAssistantClient, HomeAssistantError, get_client
+
+logger = logging.getLogger(__name__)
+
 
 class BaseDevice:
-    
-    def __init__(self):
+
+    # Home Assistant domain of the entity, e.g. "switch" or "light"
+    domain: str = ""
+    # 设备类别（与 prompt.jinja 中的指令对应，如 "灯"）、所在区域和别名
+    category: str = ""
+    area: str = ""
+    aliases: List[str] = []
+
+    def __init__(self, client: Optional[HomeAssistantClient] = None):
         self.endpoint = settings.HOMEASSISTANT_ENDPOINT
         self.token = settings.HOMEASSISTANT_TOKEN
+        self.client = client or get_client()
 
     def get_headers(self):
         return {
@@ -15,3 +29,24 @@ class BaseDevice:
     def get_device_id(self):
         raise NotImplementedError
 
+    async def call_service(self, service: str, **data) -> bool:
+        try:
+            await self.client.call_service(self.domain, service, self.get_device_id(), **data)
+            return True
+        except HomeAssistantError as e:
+            logger.error(f"{service} {self.get_device_id()} failed: {e}")
+            return False
+
+    async def turn_on(self) -> bool:
+        return await self.call_service("turn_on")
+
+    async def turn_off(self) -> bool:
+        return await self.call_service("turn_off")
+
+    async def get_state(self) -> Optional[str]:
+        try:
+            state = await self.client.get_state(self.get_device_id())
+        except HomeAssistantError as e:
+            logger.error(f"get state {self.get_device_id()} failed: {e}")
+            return None
+        return state.get("state") if state else None
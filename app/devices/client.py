@@ -0,0 +1,120 @@
+"""
+Home Assistant REST client
+共享的异步 HTTP 客户端：连接复用、超时、带抖动的重试和并发限制
+"""
+import random
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HomeAssistantError(Exception):
+    """Home Assistant 请求失败"""
+
+
+class HomeAssistantClient:
+    """Home Assistant 客户端
+
+    One keep-alive connection pool is shared by every device. Requests that
+    fail with a transport error or a 5xx response are retried with
+    exponential backoff and full jitter. At most ``max_concurrency`` requests
+    are in flight, so a large fan-out cannot flood the HA instance.
+    """
+
+    def __init__(self, endpoint: str, token: str,
+                 timeout: float = 5.0, retries: int = 2, backoff: float = 0.2,
+                 max_concurrency: int = 8, max_keepalive: int = 8):
+        self.endpoint = endpoint.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_keepalive = max_keepalive
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.endpoint,
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {self.token}"
+                },
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_keepalive,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=60))
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def request(self, method: str, path: str, json: Any = None) -> Any:
+        attempt = 0
+        while True:
+            try:
+                async with self.semaphore:
+                    resp = await self.http.request(method, path, json=json)
+                if resp.status_code < 500:
+                    resp.raise_for_status()
+                    return resp.json() if resp.content else None
+                error = HomeAssistantError(f"{method} {path}: HTTP {resp.status_code}")
+            except httpx.HTTPStatusError as e:
+                raise HomeAssistantError(f"{method} {path}: HTTP {e.response.status_code}") from e
+            except httpx.TransportError as e:
+                error = HomeAssistantError(f"{method} {path}: {e!r}")
+            if attempt >= self.retries:
+                raise error
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+            attempt += 1
+            logger.warning(f"{error}, retry {attempt}/{self.retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def call_service(self, domain: str, service: str, entity_id: str,
+                           **data) -> Any:
+        payload = {"entity_id": entity_id, **data}
+        return await self.request("POST", f"/api/services/{domain}/{service}", json=payload)
+
+    async def call_service_many(self, service: str,
+                                entities: Sequence[Tuple[str, str]]) -> Dict[str, bool]:
+        """Call ``service`` on many ``(domain, entity_id)`` pairs in parallel"""
+        async def call(domain: str, entity_id: str) -> bool:
+            try:
+                await self.call_service(domain, service, entity_id)
+                return True
+            except HomeAssistantError as e:
+                logger.error(f"{service} {entity_id} failed: {e}")
+                return False
+
+        results = await asyncio.gather(*[call(d, e) for d, e in entities])
+        return {entity_id: ok for (_, entity_id), ok in zip(entities, results)}
+
+    async def get_state(self, entity_id: str) -> Dict[str, Any]:
+        return await self.request("GET", f"/api/states/{entity_id}")
+
+    async def get_states(self) -> List[Dict[str, Any]]:
+        return await self.request("GET", "/api/states")
+
+
+_shared_client: Optional[HomeAssistantClient] = None
+
+
+def get_client() -> HomeAssistantClient:
+    """所有设备共享同一个 Home Assistant 客户端"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = HomeAssistantClient(
+            settings.HOMEASSISTANT_ENDPOINT,
+            settings.HOMEASSISTANT_TOKEN)
+    return _shared_client
@@ -0,0 +1,92 @@
+"""
+Command dispatcher
+把 LLM 流式输出的 ``指令|内容`` 映射到设备并立即执行
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from app.devices.manager import DeviceManager
+from app.schemas import CMD
+from app.services.chat.response import ResponseParser, COMMAND
+
+logger = logging.getLogger(__name__)
+
+# prompt.jinja 中的可执行指令 -> (操作, 设备类别)
+COMMANDS: Dict[str, Tuple[CMD, str]] = {
+    "开灯": (CMD.ON, "灯"),
+    "关灯": (CMD.OFF, "灯"),
+    "灯状态": (CMD.STATE, "灯"),
+}
+
+STATE_REPLIES = {"on": "开着的", "off": "关着的"}
+
+
+class CommandDispatcher:
+    """指令分发
+
+    Wraps the turn's ``ResponseParser``. As soon as the reply is known to be
+    a command and its content names exactly one known command, execution is
+    started in the background while the LLM keeps streaming. ``result``
+    waits for it and returns a short reply to speak.
+    """
+
+    def __init__(self, manager: DeviceManager, query: str = "",
+                 commands: Optional[Dict[str, Tuple[CMD, str]]] = None):
+        self.manager = manager
+        self.query = query
+        self.commands = commands or COMMANDS
+        self.parser = ResponseParser()
+        self.command: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def feed(self, token: str) -> str:
+        content = self.parser.feed(token)
+        if self.parser.kind == COMMAND and self.task is None:
+            self._dispatch(final=False)
+        return content
+
+    def finish(self) -> str:
+        content = self.parser.finish()
+        if self.parser.kind == COMMAND and self.task is None:
+            self._dispatch(final=True)
+        return content
+
+    def _dispatch(self, final: bool):
+        text = self.parser.content.strip().strip("。.！!")
+        if text not in self.commands:
+            if final and text:
+                logger.warning(f"Unknown command: {text}")
+            return
+        # 还可能是更长指令的前缀，例如 "灯" 与 "灯状态"
+        if not final and any(c != text and c.startswith(text) for c in self.commands):
+            return
+        self.dispatch(text)
+
+    def dispatch(self, command: str, device_ids: Optional[List[str]] = None):
+        """Start executing ``command``, also used when it was matched without the LLM"""
+        self.command = command
+        cmd, category = self.commands[command]
+        if device_ids is None:
+            device_ids = self.manager.resolve(category, self.query)
+        logger.info(f"Dispatch {command} -> {cmd.value} {device_ids}")
+        self.task = asyncio.create_task(self._execute(cmd, category, device_ids))
+
+    async def _execute(self, cmd: CMD, category: str, device_ids) -> str:
+        if not device_ids:
+            return f"没有找到{category}"
+        if cmd == CMD.STATE:
+            states = await self.manager.query_state(device_ids)
+            known = {STATE_REPLIES.get(s) for s in states.values()} - {None}
+            if len(known) == 1:
+                return f"{category}是{known.pop()}"
+            return f"{category}状态未知"
+        results = await self.manager.execute(cmd, device_ids)
+        if all(results.values()):
+            return f"已为您{'打开' if cmd == CMD.ON else '关闭'}{category}"
+        return f"{category}操作失败"
+
+    async def result(self) -> Optional[str]:
+        if self.task is None:
+            return None
+        return await self.task
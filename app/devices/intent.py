@@ -0,0 +1,183 @@
+"""
+Local intent router
+常见设备指令在本地匹配并直接执行，不再等 LLM 返回 ``指令|开灯``
+"""
+import re
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.devices.dispatcher import COMMANDS
+from app.devices.manager import DeviceManager
+from app.schemas import CMD
+
+logger = logging.getLogger(__name__)
+
+# 动作词 -> 操作
+ACTIONS: Dict[str, CMD] = {
+    "开": CMD.ON, "打开": CMD.ON, "开启": CMD.ON, "点亮": CMD.ON, "亮": CMD.ON,
+    "关": CMD.OFF, "关闭": CMD.OFF, "关掉": CMD.OFF, "关上": CMD.OFF, "熄灭": CMD.OFF,
+    "开着吗": CMD.STATE, "关着吗": CMD.STATE, "亮着吗": CMD.STATE,
+    "开了吗": CMD.STATE, "关了吗": CMD.STATE, "状态": CMD.STATE,
+    "是开着的吗": CMD.STATE, "是关着的吗": CMD.STATE,
+}
+
+# 不影响语义的虚词
+FILLERS = ["请", "帮我", "给我", "麻烦", "把", "将", "一下", "吧", "了", "的", "呀", "啊",
+           "所有", "全部", "都", "现在"]
+
+PUNCTUATION = re.compile(r"[\s，。！？、,.!?~]+")
+
+ACTION, DEVICE, AREA, FILLER = "action", "device", "area", "filler"
+
+
+def prompt_commands(source: str) -> List[str]:
+    """Command names listed under ``可执行指令`` in a prompt template"""
+    names = []
+    in_section = False
+    for line in source.splitlines():
+        line = line.strip()
+        if line.startswith("可执行指令"):
+            in_section = True
+        elif in_section and line.startswith("-"):
+            names.append(re.split(r"[:：]", line[1:], maxsplit=1)[0].strip())
+        elif in_section and line:
+            break
+    return names
+
+
+class AhoCorasick:
+    """多模式串匹配自动机，一次扫描找出所有词表命中"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, object]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[Tuple[int, object]]] = [[]]
+        for word, value in patterns:
+            self._add(word, value)
+        self._build()
+
+    def _add(self, word: str, value) -> None:
+        state = 0
+        for ch in word:
+            if ch not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][ch] = len(self.goto) - 1
+            state = self.goto[state][ch]
+        self.output[state].append((len(word), value))
+
+    def _build(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0) if state else 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def finditer(self, text: str):
+        """``(start, end, value)`` for every occurrence"""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for length, value in self.output[state]:
+                yield i + 1 - length, i + 1, value
+
+
+@dataclass
+class Intent:
+    command: str
+    cmd: CMD
+    category: str
+    device_ids: List[str]
+
+
+class IntentRouter:
+    """本地意图路由
+
+    Tokens come from one Aho-Corasick pass over the query: actions, device
+    categories and aliases, areas and filler words. The fewest matches that
+    cover the query are kept, and the slot grammar accepts it only when:
+    - the tokens cover every character except punctuation,
+    - they name exactly one operation,
+    - they name a device category that the operation applies to.
+    Anything else, like "不要开灯" or "灯为什么不亮", is left to the LLM.
+    """
+
+    def __init__(self, manager: DeviceManager, command_names: Optional[Iterable[str]] = None,
+                 commands: Optional[Dict[str, Tuple[CMD, str]]] = None):
+        self.manager = manager
+        commands = commands or COMMANDS
+        names = list(command_names) if command_names is not None else list(commands)
+        # 只有 prompt 中列出且能执行的指令才走快速通道
+        self.commands: Dict[Tuple[CMD, str], str] = {
+            commands[name]: name for name in names if name in commands}
+        categories = {category for _, category in self.commands}
+
+        patterns: List[Tuple[str, Tuple[str, object]]] = []
+        patterns += [(word, (ACTION, cmd)) for word, cmd in ACTIONS.items()]
+        patterns += [(word, (FILLER, None)) for word in FILLERS]
+        patterns += [(category, (DEVICE, category)) for category in categories]
+        for alias, ids in manager.by_alias.items():
+            for category in {manager.devices[i].category for i in ids} & categories:
+                patterns.append((alias, (DEVICE, category)))
+        patterns += [(area, (AREA, area)) for area in manager.by_area]
+        self.matcher = AhoCorasick(patterns)
+
+    @classmethod
+    def from_prompt(cls, manager: DeviceManager, prompt: str = "command") -> "IntentRouter":
+        from app.services.chat.prompt import prompt_registry
+
+        return cls(manager, prompt_commands(prompt_registry.source(prompt)))
+
+    def tokenize(self, text: str) -> Optional[List[Tuple[str, object]]]:
+        """Fewest tokens covering all of ``text``, or None if something is left over"""
+        ending: Dict[int, List[Tuple[int, Tuple[str, object]]]] = {}
+        for start, end, value in self.matcher.finditer(text):
+            ending.setdefault(end, []).append((start, value))
+        # best[i]: 覆盖 text[:i] 的最少词数及回溯信息
+        best: List[Optional[Tuple[int, int, Tuple[str, object]]]] = [None] * (len(text) + 1)
+        best[0] = (0, 0, None)
+        for end in range(1, len(text) + 1):
+            for start, value in ending.get(end, []):
+                if best[start] is not None and (best[end] is None or best[start][0] + 1 < best[end][0]):
+                    best[end] = (best[start][0] + 1, start, value)
+        if best[-1] is None:
+            return None
+        tokens = []
+        i = len(text)
+        while i:
+            _, start, value = best[i]
+            tokens.append(value)
+            i = start
+        return tokens[::-1]
+
+    def match(self, query: str) -> Optional[Intent]:
+        text = PUNCTUATION.sub("", query)
+        if not text:
+            return None
+        tokens = self.tokenize(text)
+        if tokens is None:
+            return None
+        actions = {value for kind, value in tokens if kind == ACTION}
+        categories = {value for kind, value in tokens if kind == DEVICE}
+        if len(actions) != 1 or len(categories) != 1:
+            return None
+        key = (actions.pop(), categories.pop())
+        command = self.commands.get(key)
+        if command is None:
+            return None
+        device_ids = self.manager.resolve(key[1], query)
+        if not device_ids:
+            # 说的设备找不到，交给 LLM 去回答
+            return None
+        logger.info(f"Intent {query} -> {command} {device_ids}")
+        return Intent(command=command, cmd=key[0], category=key[1], device_ids=device_ids)
@@ -1,15 +1,168 @@
-from typing import Dict
+import asyncio
+import inspect
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from app.config.settings import settings
 from app.devices.base import BaseDevice
-from app.schemas import DeviceEvent
+from app.devices.client import get_client
+from app.devices.state import StateStore
+from app.devices.websocket import HomeAssistantWebSocket
+from app.schemas import CMD, DeviceEvent
+
+logger = logging.getLogger(__name__)
+
+CMD_STATES = {CMD.ON: "on", CMD.OFF: "off"}
+STATE_NAMES = {"on": "开", "off": "关", "unavailable": "离线"}
+
+# 常见的房间名：没有设备的房间也要认得，"关书房灯" 不能变成关掉所有灯
+AREAS = ["客厅", "卧室", "主卧", "次卧", "书房", "厨房", "餐厅", "卫生间", "浴室",
+         "洗手间", "阳台", "玄关", "走廊", "过道", "儿童房", "客房", "车库", "地下室"]
 
 
 class DeviceManager:
     
-    def __init__(self):
+    def __init__(self, states: Optional[StateStore] = None):
         self.devices: Dict[str, BaseDevice] = {}
+        self.states = states if states is not None else StateStore()
+        self.listeners: List[Callable[[DeviceEvent], None]] = []
+        # 类别 / 区域 / 别名 -> 实体 ID
+        self.by_category: Dict[str, Set[str]] = defaultdict(set)
+        self.by_area: Dict[str, Set[str]] = defaultdict(set)
+        self.by_alias: Dict[str, Set[str]] = defaultdict(set)
+        self.transport: Optional[HomeAssistantWebSocket] = None
 
     def register(self, device: BaseDevice):
-        self.devices[device.get_device_id()] = device
+        device_id = device.get_device_id()
+        self.devices[device_id] = device
+        if self.transport is not None:
+            device.client = self.transport
+        if device.category:
+            self.by_category[device.category].add(device_id)
+        if device.area:
+            self.by_area[device.area].add(device_id)
+        for alias in device.aliases:
+            self.by_alias[alias].add(device_id)
+
+    def attach(self, transport: HomeAssistantWebSocket):
+        """Send commands over a Home Assistant websocket that keeps ``states`` current"""
+        # 订阅推送的状态一直是最新的，不再按 TTL 过期
+        self.states.ttl = None
+        transport.states = self.states
+        self.transport = transport
+        for device in self.devices.values():
+            device.client = transport
+
+    async def start(self):
+        if self.transport is not None:
+            await self.transport.start()
+
+    async def stop(self):
+        if self.transport is not None:
+            await self.transport.stop()
+
+    def subscribe(self, listener: Callable[[DeviceEvent], None]):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[DeviceEvent], None]):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
 
     def notify(self, event: DeviceEvent):
-        pass
\ No newline at end of file
+        for listener in self.listeners:
+            result = listener(event)
+            if inspect.isawaitable(result):
+                asyncio.ensure_future(result)
+
+    def resolve(self, category: str, text: str = "") -> List[str]:
+        """Entities of ``category`` referred to by ``text``
+
+        An alias named in the text wins over an area, and with neither the
+        command applies to every entity of the category. An area named in
+        the text that has no such entity resolves to nothing, never to the
+        whole category.
+        """
+        candidates = self.by_category.get(category, set())
+        matched = {i for alias, ids in self.by_alias.items() if alias in text for i in ids}
+        if matched & candidates:
+            return sorted(matched & candidates)
+        areas = [area for area in set(self.by_area) | set(AREAS) if area in text]
+        if areas:
+            return sorted({i for area in areas for i in self.by_area.get(area, ())} & candidates)
+        return sorted(candidates)
+
+    def describe_states(self) -> str:
+        """已知设备状态，一行一个，给 LLM 参考
+
+        Only entities whose state is in the store are listed; nothing is
+        fetched, so this is cheap enough to call on every request.
+        """
+        lines = []
+        for device_id, device in sorted(self.devices.items()):
+            state = self.states.get(device_id)
+            if state is None:
+                continue
+            name = f"{device.area}{device.category}" or device_id
+            lines.append(f"{name}：{STATE_NAMES.get(state, state)}")
+        return "\n".join(lines)
+
+    async def execute(self, cmd: CMD, device_ids: Iterable[str]) -> Dict[str, bool]:
+        if cmd not in CMD_STATES:
+            raise ValueError(f"{cmd.value} does not switch devices")
+        results = await self.broadcast(cmd, device_ids)
+        for device_id, ok in results.items():
+            if ok:
+                self.states.set(device_id, CMD_STATES[cmd])
+            else:
+                self.states.invalidate(device_id)
+        self.notify(DeviceEvent(cmd=cmd, message=",".join(i for i, ok in results.items() if ok)))
+        return results
+
+    async def query_state(self, device_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+        """States from the local cache, fetching only entities it does not know"""
+        states = {i: self.states.get(i) for i in device_ids}
+        missing = [i for i, state in states.items() if state is None]
+        if missing:
+            fetched = await asyncio.gather(*[self.devices[i].get_state() for i in missing])
+            for device_id, state in zip(missing, fetched):
+                if state is not None:
+                    self.states.set(device_id, state)
+                states[device_id] = state
+        return states
+
+    async def broadcast(self, cmd: CMD,
+                        device_ids: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """Run ``cmd`` on many devices in parallel, e.g. "turn off all lights"."""
+        if cmd not in CMD_STATES:
+            # 查询状态走 query_state，绝不能落到下面的关闭分支
+            raise ValueError(f"{cmd.value} does not switch devices")
+        devices = [self.devices[i] for i in device_ids] if device_ids is not None \
+            else list(self.devices.values())
+        if cmd == CMD.ON:
+            results = await asyncio.gather(*[d.turn_on() for d in devices])
+        else:
+            results = await asyncio.gather(*[d.turn_off() for d in devices])
+        return {d.get_device_id(): ok for d, ok in zip(devices, results)}
+
+
+def create_device_manager() -> DeviceManager:
+    from app.devices.xiaomi_cuco_switch import XiaomiCucoSwitch
+
+    manager = DeviceManager()
+    manager.register(XiaomiCucoSwitch())
+    return manager
+
+
+_shared_manager: Optional[DeviceManager] = None
+
+
+def get_device_manager() -> DeviceManager:
+    """进程内共享的设备管理器，所有会话共用一条 Home Assistant 长连接"""
+    global _shared_manager
+    if _shared_manager is None:
+        _shared_manager = create_device_manager()
+        _shared_manager.attach(HomeAssistantWebSocket(
+            settings.HOMEASSISTANT_ENDPOINT,
+            settings.HOMEASSISTANT_TOKEN,
+            fallback=get_client()))
+    return _shared_manager
@@ -0,0 +1,36 @@
+"""
+Local cache of Home Assistant entity states
+"""
+import time
+from typing import Dict, Optional, Tuple
+
+
+class StateStore:
+    """实体状态缓存
+
+    Keeps the last known state of every entity with the time it was learned.
+    ``get`` only returns states younger than ``ttl`` seconds; pass
+    ``ttl=None`` to trust cached states forever.
+    """
+
+    def __init__(self, ttl: Optional[float] = 300):
+        self.ttl = ttl
+        self._states: Dict[str, Tuple[str, float]] = {}
+
+    def set(self, entity_id: str, state: str) -> None:
+        self._states[entity_id] = (state, time.monotonic())
+
+    def get(self, entity_id: str) -> Optional[str]:
+        item = self._states.get(entity_id)
+        if item is None:
+            return None
+        state, updated_at = item
+        if self.ttl is not None and time.monotonic() - updated_at > self.ttl:
+            return None
+        return state
+
+    def invalidate(self, entity_id: str) -> None:
+        self._states.pop(entity_id, None)
+
+    def __len__(self) -> int:
+        return len(self._states)
@@ -0,0 +1,181 @@
+"""
+Home Assistant WebSocket API client
+长连接订阅 state_changed 事件，并通过同一连接下发指令
+文档: https://developers.home-assistant.io/docs/api/websocket
+"""
+import json
+import random
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import websockets
+
+from app.devices.client import HomeAssistantClient, HomeAssistantError
+from app.devices.state import StateStore
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionLost(HomeAssistantError):
+    """连接不可用，指令可能没有送达"""
+
+
+class HomeAssistantWebSocket:
+    """Home Assistant WebSocket 客户端
+
+    After authenticating it loads every entity state with ``get_states`` and
+    subscribes to ``state_changed`` events, so ``states`` always mirrors HA
+    without polling. ``call_service`` and ``get_state`` have the same shape
+    as ``HomeAssistantClient``, so devices can use either one. While the
+    socket is down, commands fall back to the REST client and the connection
+    is re-established with jittered backoff.
+    """
+
+    def __init__(self, endpoint: str, token: str,
+                 states: Optional[StateStore] = None,
+                 fallback: Optional[HomeAssistantClient] = None,
+                 timeout: float = 5.0, max_backoff: float = 30.0):
+        url = endpoint.rstrip("/")
+        url = url.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+        self.url = f"{url}/api/websocket"
+        self.token = token
+        self.states = states if states is not None else StateStore(ttl=None)
+        self.fallback = fallback
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.connected = asyncio.Event()
+        self._ws = None
+        self._next_id = 1
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run(self):
+        attempt = 0
+        while True:
+            try:
+                async with websockets.connect(self.url, max_size=None) as ws:
+                    await self._authenticate(ws)
+                    self._ws = ws
+                    reader = asyncio.create_task(self._read_loop(ws))
+                    try:
+                        await self._sync()
+                        attempt = 0
+                        await reader
+                    finally:
+                        reader.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Home Assistant websocket error: {e!r}")
+            finally:
+                self._disconnected()
+            delay = random.uniform(0, min(self.max_backoff, 0.5 * (2 ** attempt)))
+            attempt += 1
+            logger.info(f"Reconnecting to Home Assistant in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _authenticate(self, ws):
+        message = json.loads(await ws.recv())
+        if message.get("type") != "auth_required":
+            raise HomeAssistantError(f"Unexpected message: {message}")
+        await ws.send(json.dumps({"type": "auth", "access_token": self.token}))
+        message = json.loads(await ws.recv())
+        if message.get("type") != "auth_ok":
+            raise HomeAssistantError(f"Authentication failed: {message}")
+
+    async def _sync(self):
+        # 先订阅再全量拉取，两者之间的变化不会丢
+        await self.command({"type": "subscribe_events", "event_type": "state_changed"})
+        for state in await self.command({"type": "get_states"}) or []:
+            self.states.set(state["entity_id"], state["state"])
+        self.connected.set()
+        logger.info(f"Connected to Home Assistant, {len(self.states)} entities")
+
+    async def _read_loop(self, ws):
+        async for raw in ws:
+            message = json.loads(raw)
+            if message.get("type") == "event":
+                self._on_event(message["event"])
+            elif message.get("type") == "result":
+                future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    if message.get("success"):
+                        future.set_result(message.get("result"))
+                    else:
+                        future.set_exception(HomeAssistantError(str(message.get("error"))))
+
+    def _on_event(self, event: Dict[str, Any]):
+        if event.get("event_type") != "state_changed":
+            return
+        data = event.get("data", {})
+        new_state = data.get("new_state")
+        if new_state is None:
+            self.states.invalidate(data.get("entity_id"))
+        else:
+            self.states.set(data["entity_id"], new_state["state"])
+
+    def _disconnected(self):
+        self.connected.clear()
+        self._ws = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionLost("websocket disconnected"))
+        self._pending.clear()
+
+    async def command(self, message: Dict[str, Any]) -> Any:
+        if self._ws is None:
+            raise ConnectionLost("websocket not connected")
+        message_id = self._next_id
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        try:
+            await self._ws.send(json.dumps({"id": message_id, **message}))
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError as e:
+            raise HomeAssistantError(f"{message['type']} timed out") from e
+        except (websockets.ConnectionClosed, OSError) as e:
+            raise ConnectionLost(f"{message['type']} failed: {e!r}") from e
+        finally:
+            self._pending.pop(message_id, None)
+
+    async def call_service(self, domain: str, service: str, entity_id: str,
+                           **data) -> Any:
+        if not self.connected.is_set() and self.fallback is not None:
+            return await self.fallback.call_service(domain, service, entity_id, **data)
+        message = {
+            "type": "call_service",
+            "domain": domain,
+            "service": service,
+            "target": {"entity_id": entity_id},
+        }
+        if data:
+            message["service_data"] = data
+        try:
+            return await self.command(message)
+        except ConnectionLost as e:
+            # 连接刚断开、重连循环还没察觉时，同样改走 REST
+            if self.fallback is None:
+                raise
+            logger.warning(f"{e}, retrying {service} {entity_id} over REST")
+            return await self.fallback.call_service(domain, service, entity_id, **data)
+
+    async def get_state(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        state = self.states.get(entity_id)
+        if state is not None:
+            return {"entity_id": entity_id, "state": state}
+        # 长时间没有变化的实体可能已过缓存期，回退到 REST 查询一次
+        if self.fallback is not None:
+            return await self.fallback.get_state(entity_id)
+        return None
@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -5,12 +7,27 @@ from fastapi.responses import FileResponse
 
 from app.api import router
 from app.config import settings
+from app.devices.manager import get_device_manager
 from app.log import configure_app_logging
+from app.services.voice.stt import close_recognition_pool
 
 # Initialize logging
 configure_app_logging()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 所有会话共用一条 Home Assistant 长连接
+    devices = get_device_manager()
+    await devices.start()
+    yield
+    await devices.stop()
+    # 预热的识别会话占着非守护线程，不关掉进程退不出去
+    await close_recognition_pool()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     description=settings.DESCRIPTION,
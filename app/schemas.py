@@ -36,6 +36,7 @@ class Message(BaseModel):
 class CMD(str, Enum):
     ON = "turn_on"
     OFF = "turn_off"
+    STATE = "get_state"
 
 
 class DeviceEvent(BaseModel):
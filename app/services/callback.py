@@ -1,36 +1,68 @@
 import logging
 import asyncio
+import threading
+from typing import Optional
 from app.log import get_logger
+from app.services.tracing import NULL_TRACE
 
 logger = get_logger(__name__)
 
 
 class ChainCallback:
-    """ASR 回调处理"""
+    """ASR 回调处理
 
-    def __init__(self, text_queue: asyncio.Queue, audio_queue: asyncio.Queue):
+    Dashscope SDK 在自己的线程里触发回调，这里通过 ``call_soon_threadsafe``
+    把结果交给事件循环，消费方直接 ``await queue.get()`` 即可，无需轮询。
+    """
+
+    def __init__(self, text_queue: asyncio.Queue, audio_queue: asyncio.Queue,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
         self.text_queue = text_queue
         self.audio_queue = audio_queue
+        self.loop = loop
+        self._loop_thread_id: Optional[int] = None
+        # 当前这一轮的打点，识别、LLM、合成各环节共用
+        self.trace = NULL_TRACE
+        if self.loop is None:
+            try:
+                self.bind_loop(asyncio.get_running_loop())
+            except RuntimeError:
+                pass
+        else:
+            self.bind_loop(self.loop)
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Bind the event loop that owns the queues (must be called from it)."""
+        self.loop = loop
+        self._loop_thread_id = threading.get_ident()
+
+    def _put(self, queue: asyncio.Queue, item: tuple, kind: str) -> None:
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            logger.warning("%s queue is full, dropping item", kind)
 
-    def on_text(self, text: str, is_final: bool) -> None:
+    def _dispatch(self, queue: asyncio.Queue, item: tuple, kind: str) -> None:
+        loop = self.loop
+        if loop is None or threading.get_ident() == self._loop_thread_id:
+            self._put(queue, item, kind)
+            return
+        try:
+            loop.call_soon_threadsafe(self._put, queue, item, kind)
+        except RuntimeError:
+            logger.warning("Event loop is closed, dropping %s item", kind)
+
+    def on_text(self, text: str, is_final: bool, stability: float = 1.0) -> None:
+        """``stability`` scores an interim hypothesis, finals are always 1.0"""
         if text:
-            try:
-                self.text_queue.put_nowait((text, is_final))
-            except asyncio.QueueFull:
-                logger.warning("Message queue is full, dropping text: %s", text)
-            except Exception:
-                raise
+            self._dispatch(self.text_queue, (text, is_final, stability), "Text")
 
     def on_text_complete(self) -> None:
         logger.info("ASR recognition complete")
 
     def on_audio(self, audio_bytes: bytes, is_final: bool) -> None:
-        if audio_bytes:
-            try:
-                self.audio_queue.put_nowait((audio_bytes, is_final))
-            except asyncio.QueueFull:
-                logger.warning("Audio queue is full, dropping audio chunk of size: %d", len(audio_bytes))
+        if audio_bytes or is_final:
+            self._dispatch(self.audio_queue, (audio_bytes, is_final), "Audio")
 
     def on_audio_complete(self) -> None:
         logger.info("TTS synthesis complete")
-
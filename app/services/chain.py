@@ -3,15 +3,30 @@ import time
 import logging
 import asyncio
 from collections.abc import Coroutine
-from typing import AsyncGenerator, List
+from typing import AsyncGenerator, List, Optional
+from collections import deque
 from contextlib import suppress
 
+from app.config import settings
+
 from app.services.chat.llm import OpenAILLM
+from app.services.chat.segment import SentenceSegmenter
+from app.services.chat.response import COMMAND, NOISE, SEPARATOR
 from app.services.voice.stt import DashscopeSTT
 from app.services.voice.tts import DashscopeTTS
+from app.services.voice.endpoint import Endpointer
+from app.services.voice.vad import BargeInDetector
+from app.services.voice.noise import NoiseFilter
+from app.services.speculation import Speculator
+from app.services.session import SessionStore, get_session_store
+from app.services import tracing
+from app.services.tracing import LatencyTracer, get_tracer
 from app.schemas import Step, Role, Payload, Message, CMD, DeviceEvent
 from app.services.callback import ChainCallback
 from app.client.base import BaseClient
+from app.devices.dispatcher import CommandDispatcher
+from app.devices.intent import IntentRouter
+from app.devices.manager import DeviceManager, get_device_manager
 
 logger = logging.getLogger(__name__)
 
@@ -19,93 +34,175 @@ logger = logging.getLogger(__name__)
 class BotState:
     """收集 ASR 结果并定期发送给 LLM 进行处理"""
 
-    def __init__(self, callback: ChainCallback):
+    def __init__(self, callback: ChainCallback,
+                 silence_timeout: float = 1.0, max_utterance: float = 10.0,
+                 noise_filter: Optional[NoiseFilter] = None,
+                 speculator: Optional[Speculator] = None):
         self.callback = callback
+        self.noise_filter = noise_filter or NoiseFilter()
+        self.speculator = speculator
         self.latest_received_texts: List[Payload] = []
-        self.latest_received_audios: List[Payload] = []
+        self.queries: asyncio.Queue[str] = asyncio.Queue()
+        self.endpointer = Endpointer(
+            self.on_endpoint,
+            silence_timeout=silence_timeout,
+            max_utterance=max_utterance)
 
     async def collect(self):
-        stt_task = asyncio.create_task(self.collect_stt_texts())
-        tts_task = asyncio.create_task(self.collect_tts_audios())
-        await asyncio.gather(stt_task, tts_task)
+        self.callback.bind_loop(asyncio.get_running_loop())
+        await self.collect_stt_texts()
 
     async def clear(self):
+        self.endpointer.reset()
         self.latest_received_texts.clear()
-        self.latest_received_audios.clear()
+        if self.speculator is not None:
+            self.speculator.cancel()
 
     async def collect_stt_texts(self):
         while True:
-            try:
-                result = self.callback.text_queue.get_nowait()
-                text, is_final = result
-                logger.info(f"collect text: {text}")
-            except asyncio.QueueEmpty:
-                await asyncio.sleep(0.05)
-                continue
+            text, is_final, stability = await self.callback.text_queue.get()
+            logger.info(f"collect text: {text}")
             text_payload = Payload(role=Role.USER, text_chunk=text, is_final=is_final)
             self.latest_received_texts.append(text_payload)
+            self.endpointer.feed(text, is_final)
+            if self.speculator is not None:
+                self.speculator.update(self.endpointer.text, stability)
 
-    async def collect_tts_audios(self):
-        while True:
-            try:
-                audio_bytes, is_final = self.callback.audio_queue.get_nowait()
-            except asyncio.QueueEmpty:
-                await asyncio.sleep(0.1)
-                continue
-            audio_payload = Payload(role=Role.ASSISTANT, audio_chunk=audio_bytes, is_final=is_final)
-            self.latest_received_audios.append(audio_payload)
+    def on_endpoint(self, full_text: str):
+        logger.info(f"Stream Query: {full_text}")
+        self.callback.trace.mark(tracing.ENDPOINT)
+        self.latest_received_texts.clear()
+        self.queries.put_nowait(full_text)
 
     async def stream_query(self) -> AsyncGenerator[str, None]:
         while True:
-            full_text = ""
-            if len(self.latest_received_texts) > 0:
-                last_payload = self.latest_received_texts[-1]
-                wait_seconds = time.time() - last_payload.dttm
-                if (last_payload.is_final and wait_seconds > 1) or wait_seconds > 10:
-                    full_text = "".join([p.text_chunk for p in self.latest_received_texts])
-                    logger.info(f"Stream Query: {full_text}")
-                    self.latest_received_texts.clear()
-                    if full_text:
-                        yield full_text
-            else:
-                await asyncio.sleep(0.05)
+            query = await self.queries.get()
+            # 明显的噪声不再交给 LLM 判断
+            if self.noise_filter.accept(query):
+                yield query
+                continue
+            # 被丢弃的话不算一轮，重新计时
+            self.callback.trace.clear()
+            if self.speculator is not None:
+                self.speculator.cancel()
 
     async def on_device_event(self, event: DeviceEvent):
-        pass
+        logger.info(f"Device event: {event.cmd.value} {event.message}")
 
 
 class BotChain:
     """STT -> LLM -> TTS"""
 
-    def __init__(self, client: BaseClient):
+    # 播放结束标记最长等待时间
+    AUDIO_DONE_TIMEOUT = 30
+
+    def __init__(self, client: BaseClient,
+                 silence_timeout: float = 1.0, max_utterance: float = 10.0,
+                 barge_in: Optional[BargeInDetector] = None,
+                 devices: Optional[DeviceManager] = None,
+                 router: Optional[IntentRouter] = None,
+                 noise_filter: Optional[NoiseFilter] = None,
+                 speculate: Optional[bool] = None,
+                 store: Optional[SessionStore] = None,
+                 tracer: Optional[LatencyTracer] = None):
         self.step: Step = Step.STARTED
         self.client = client
+        # 会话状态放在共享存储里，重启或换 worker 后还能接着聊
+        self.store = store or get_session_store()
+        self.session_id = client.client_id
 
-        self.text_queue: asyncio.Queue[tuple[str, bool]] = asyncio.Queue(maxsize=1000)
+        self.text_queue: asyncio.Queue[tuple[str, bool, float]] = asyncio.Queue(maxsize=1000)
         self.audio_queue: asyncio.Queue[tuple[bytes, bool]] = asyncio.Queue(maxsize=1000)
 
         self.callback = ChainCallback(self.text_queue, self.audio_queue)
 
         self.stt = DashscopeSTT(self.callback)
-        self.tts = DashscopeTTS(self.callback)
+        self.tts = DashscopeTTS(
+            self.callback,
+            audio_format=client.audio_format,
+            sample_rate=client.sample_rate,
+            store=self.store)
         self.llm = OpenAILLM(self.callback)
-        self.state: BotState = BotState(self.callback)
+        self.memory = self.llm.memory
+        self.memory.bind(self.store, self.session_id)
+        self.state: BotState = BotState(
+            self.callback,
+            silence_timeout=silence_timeout,
+            max_utterance=max_utterance,
+            noise_filter=noise_filter)
+        self.devices = devices or get_device_manager()
+        self.devices.subscribe(self.state.on_device_event)
+        self.llm.device_states = self.devices.describe_states
+        # 已知的设备指令在本地匹配，不经过 LLM
+        self.router = router or IntentRouter.from_prompt(self.devices)
+        if speculate is None:
+            # 推测请求可能白白多花一次 LLM 调用，默认关闭
+            speculate = bool(getattr(settings, "LLM_SPECULATION", False))
+        if speculate:
+            # 端点确认之前先把稳定的识别结果发给 LLM
+            self.state.speculator = Speculator(
+                lambda q: self.llm.agenerate(q), accept=self.speculable)
         self.tasks: List[asyncio.tasks.Task] = []
+        self.turn_task: Optional[asyncio.Task] = None
+        self._state_writes: set = set()
+
+        # 回复期间检测用户插话，保留触发前的几帧音频送给 ASR
+        self.barge_in = barge_in or BargeInDetector()
+        self.barge_in_frames: deque = deque(maxlen=self.barge_in.min_frames + 2)
+        self.audio_done = asyncio.Event()
+
+        # time-to-first-audio of the current turn
+        self.turn_started_at: Optional[float] = None
+        self.last_ttfa: Optional[float] = None
+        # 每轮在各环节边界打点，耗时分布在进程内汇总
+        self.tracer = tracer or get_tracer()
+        self.begin_trace()
+
+    def begin_trace(self) -> tracing.TurnTrace:
+        """Open the trace of the next turn; every stage marks the same one"""
+        trace = self.tracer.begin(self.session_id)
+        self.callback.trace = trace
+        self.client.trace = trace
+        return trace
+
+    def finish_trace(self, **attributes) -> None:
+        durations = self.tracer.finish(self.callback.trace, **attributes)
+        if durations:
+            logger.info("Turn latency: " + ", ".join(
+                f"{name}={ms:.0f}ms" for name, ms in durations.items()))
+        self.begin_trace()
+
+    def speculable(self, text: str) -> bool:
+        """Only text that will go to the LLM is worth speculating on"""
+        if self.turn_task is not None and not self.turn_task.done():
+            # 本轮还在进行，迟到的识别结果不触发新请求
+            return False
+        return self.state.noise_filter.classify(text)[1] is None \
+            and self.router.match(text) is None
 
     async def start(self):
         logger.info("Starting BotChain...")
         self.step = Step.ASR
         await self.client.start()
+        self.stt.prewarm()
+        await self.memory.load()
 
         receive_task = asyncio.create_task(self.process_audio_receive())
         generate_task = asyncio.create_task(self.process_llm_generate())
+        output_task = asyncio.create_task(self.process_audio_output())
         state_task = asyncio.create_task(self.state.collect())
         
         self.tasks.append(receive_task)
         self.tasks.append(generate_task)
+        self.tasks.append(output_task)
         self.tasks.append(state_task)
         try:
-            await asyncio.wait(self.tasks)
+            # 任何一个环节结束（例如客户端断开）整个会话就结束
+            await asyncio.wait(self.tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in self.tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
         except asyncio.CancelledError:
             logger.info("Cancelling BotChain...")
             for task in self.tasks:
@@ -117,37 +214,113 @@ class BotChain:
 
     async def stop(self):
         logger.info("Stopping BotChain...")
+        self.devices.unsubscribe(self.state.on_device_event)
         await self.client.stop()
         await self.stt.stop()
         await self.tts.stop()
         await self.llm.stop()
         self.tasks.clear()
         await self.state.clear()
+        logger.info(f"Noise filter: {self.state.noise_filter.stats()}")
+        logger.info(f"Latency: {self.tracer.stats()}")
+        if self.state.speculator is not None:
+            logger.info(f"Speculation: {self.state.speculator.stats()}")
+
+    def save_state(self, **fields):
+        """Write turn state to the session store without holding up the turn"""
+        task = asyncio.create_task(self.store.set_state(
+            self.session_id, updated_at=time.time(), **fields))
+        self._state_writes.add(task)
+        task.add_done_callback(self._state_writes.discard)
 
     async def process_audio_receive(self):
         try:
             logger.info("Starting to receive audio data from client")
             async for data in self.client.stt_input():
-                await self.stt.ensure_started()
                 if self.step == Step.ASR:
                     await self.stt.recognize(data, is_final=False)
-                else:
-                    await asyncio.sleep(0.05)
                     continue
+                self.barge_in_frames.append(data)
+                if self.barge_in.is_speech(data):
+                    await self.interrupt()
+                    while self.barge_in_frames:
+                        await self.stt.recognize(self.barge_in_frames.popleft(), is_final=False)
         except Exception as e:
             logger.error(f"Error receiving audio data: {e}")
         logger.info("Stopped receiving audio data from client")
 
+    async def interrupt(self):
+        """Barge-in: stop the current answer and listen again"""
+        logger.info("User barged in, interrupting current turn")
+        task = self.turn_task
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.wait([task])
+        await self.llm.cancel()
+        await self.tts.cancel()
+        while not self.audio_queue.empty():
+            self.audio_queue.get_nowait()
+        await self.client.flush()
+        self.barge_in.reset()
+        self.step = Step.ASR
+        self.finish_trace(interrupted=True)
+
     async def process_llm_generate(self):
         logger.info("Starting LLM generation process")
         try:
             async for query in self.state.stream_query():
                 logger.info(f"User Query: {query}")
-                await self.stt.stop()
-                # await self.state.clear()
-                self.step = Step.LLM
-                full_text = ""
-                async for text_chunk in self.llm.agenerate(query):
+                self.turn_task = asyncio.create_task(self.process_turn(query))
+                await asyncio.wait([self.turn_task])
+                if not self.turn_task.cancelled() and self.turn_task.exception():
+                    raise self.turn_task.exception()
+        except Exception as e:
+            logger.error(f"Error in speech chain: {e}")
+        finally:
+            if self.turn_task is not None and not self.turn_task.done():
+                self.turn_task.cancel()
+            await self.stop()
+        logger.info("LLM generation process ended")
+
+    async def process_turn(self, query: str):
+        # 旧会话在后台关闭，不耽误这一轮的 LLM 请求
+        await self.stt.stop(wait=False)
+        # 回答期间把下一轮的识别会话先连好
+        self.stt.prewarm()
+        # await self.state.clear()
+        self.step = Step.LLM
+        self.barge_in.reset()
+        self.barge_in_frames.clear()
+        self.audio_done.clear()
+        self.turn_started_at = time.monotonic()
+        self.last_ttfa = None
+        trace = self.callback.trace
+        trace.mark(tracing.TURN_START)
+        self.save_state(step=Step.LLM.value, query=query)
+        await self.client.llm_output(Message(
+            step=Step.ASR,
+            data=Payload(role=Role.USER, text_chunk=query, is_final=True)))
+
+        segments: asyncio.Queue[Optional[str]] = asyncio.Queue()
+        synthesize_task = asyncio.create_task(self.process_text_synthesize(segments))
+        segmenter = SentenceSegmenter()
+        dispatcher = CommandDispatcher(self.devices, query)
+        parser = dispatcher.parser
+        full_text = ""
+        try:
+            intent = self.router.match(query)
+            speculator = self.state.speculator
+            speculation = speculator.take(query) if speculator is not None else None
+            trace.attributes["route"] = "intent" if intent is not None else "llm"
+            trace.attributes["speculated"] = speculation is not None
+            if intent is not None:
+                if speculation is not None:
+                    speculation.cancel()
+                dispatcher.dispatch(intent.command, intent.device_ids)
+            else:
+                tokens = speculation.stream() if speculation is not None \
+                    else self.llm.agenerate(query)
+                async for text_chunk in tokens:
                     full_text += text_chunk
                     message = Message(
                         step=Step.LLM, 
@@ -156,15 +329,83 @@ class BotChain:
                             text_chunk=text_chunk, 
                             is_final=False))
                     await self.client.llm_output(message)
-                self.step = Step.ASR
-        except Exception as e:
-            logger.error(f"Error in speech chain: {e}")
+                    content = dispatcher.feed(text_chunk)
+                    if content and parser.speakable:
+                        for segment in segmenter.feed(content):
+                            segments.put_nowait(segment)
+                content = dispatcher.finish()
+                if parser.speakable:
+                    for segment in segmenter.feed(content):
+                        segments.put_nowait(segment)
+                    rest = segmenter.flush()
+                    if rest:
+                        segments.put_nowait(rest)
+                elif parser.kind == NOISE:
+                    self.state.noise_filter.learn(query)
+            # 指令已在流式输出过程中开始执行，这里只等待结果并播报
+            reply = await dispatcher.result()
+            if reply:
+                segments.put_nowait(reply)
+            # 记下这一轮，供后续追问使用
+            self.llm.remember(query, full_text if intent is None
+                              else f"{COMMAND}{SEPARATOR}{intent.command}")
+            await self.client.llm_output(Message(
+                step=Step.LLM,
+                data=Payload(
+                    role=Role.ASSISTANT,
+                    text_chunk=reply or parser.content or full_text,
+                    is_final=True)))
+            segments.put_nowait(None)
+            self.step = Step.TTS
+            spoken = await synthesize_task
+            if spoken:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.audio_done.wait(), self.AUDIO_DONE_TIMEOUT)
         finally:
-            await self.stop()
-        logger.info("LLM generation process ended")
+            if not synthesize_task.done():
+                synthesize_task.cancel()
+            await self.client.llm_output(Message(
+                step=Step.TTS,
+                data=Payload(role=Role.ASSISTANT, is_final=True)))
+        self.step = Step.ASR
+        ttfa_ms = round(self.last_ttfa * 1000) if self.last_ttfa is not None else ""
+        self.save_state(step=Step.ASR.value, last_query=query, ttfa_ms=ttfa_ms)
+        if self.callback.trace is trace:
+            self.finish_trace()
 
-    async def process_text_synthesize(self):
-        pass
+    async def process_text_synthesize(self, segments: asyncio.Queue) -> int:
+        """Drive TTS with each speakable segment as soon as it is cut"""
+        spoken = 0
+        while True:
+            segment = await segments.get()
+            if segment is None:
+                break
+            await self.tts.synthesize(segment)
+            spoken += 1
+        await self.tts.synthesize("", is_final=True)
+        return spoken
+
+    async def process_audio_output(self):
+        """Forward synthesized audio to the client"""
+        while True:
+            audio_bytes, is_final = await self.audio_queue.get()
+            if self.step == Step.ASR:
+                # 打断之后迟到的音频
+                continue
+            if is_final:
+                self.audio_done.set()
+                continue
+            if self.turn_started_at is not None and self.last_ttfa is None:
+                self.callback.trace.mark(tracing.FIRST_AUDIO)
+                self.last_ttfa = time.monotonic() - self.turn_started_at
+                logger.info(f"Time to first audio: {self.last_ttfa * 1000:.0f} ms")
+            message = Message(
+                step=Step.TTS,
+                data=Payload(
+                    role=Role.ASSISTANT,
+                    audio_chunk=audio_bytes,
+                    is_final=is_final))
+            await self.client.llm_output(message)
 
     async def run_forever(self):
         try:
@@ -0,0 +1,206 @@
+"""
+LLM response cache
+重复的问答直接回放上次的回复，不再请求 LLM
+"""
+import re
+import time
+import asyncio
+import logging
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncGenerator, Callable, Iterable, List, Optional, Tuple
+
+import numpy
+
+from app.services.chat.response import ANSWER, ResponseParser
+from app.services.voice.tts_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+NON_CONTENT = re.compile(r"[^\w]|_", re.UNICODE)
+
+# 答案随时间变化：问时间的从不缓存，问天气、日期的只缓存一小会
+CLOCK_WORDS = ["几点", "时间", "几分", "现在"]
+VOLATILE_WORDS = ["今天", "明天", "昨天", "天气", "气温", "温度", "下雨", "星期", "几号", "日期"]
+
+# 指代或承接上文的词，出现时回答取决于之前的对话
+CONTEXT_WORDS = ["那", "呢", "它", "他", "她", "这", "刚才", "之前", "上面", "再", "还", "也",
+                 "继续", "接着"]
+
+# 回放时每个 "token" 的字符数
+REPLAY_CHARS = 4
+
+
+def normalize_query(query: str) -> str:
+    """全半角、大小写、标点和空白都不影响缓存键"""
+    return NON_CONTENT.sub("", normalize_text(query)).lower()
+
+
+def is_context_free(query: str) -> bool:
+    """问题本身就完整，回答与之前聊过什么无关
+
+    Conservative: a query that refers back ("那上海呢", "再说一遍") or is too
+    short to stand on its own ("为什么") counts as a follow-up.
+    """
+    content = normalize_query(query)
+    return len(content) >= 4 and not any(word in content for word in CONTEXT_WORDS)
+
+
+class HashingEmbedder:
+    """字符 n-gram 哈希向量
+
+    A dependency-free embedding for near-duplicate phrasings: unigram and
+    bigram counts hashed into ``dim`` buckets and L2-normalised, so the dot
+    product of two vectors is their cosine similarity. Any callable that
+    maps text to a 1-D vector can be used instead, e.g. a real embedding
+    model.
+    """
+
+    def __init__(self, dim: int = 512, ngrams: Tuple[int, ...] = (1, 2)):
+        self.dim = dim
+        self.ngrams = ngrams
+
+    def __call__(self, text: str) -> numpy.ndarray:
+        vector = numpy.zeros(self.dim, dtype=numpy.float32)
+        for n in self.ngrams:
+            for i in range(len(text) - n + 1):
+                vector[zlib.crc32(text[i:i + n].encode("utf-8")) % self.dim] += 1.0
+        norm = numpy.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+@dataclass
+class CachedResponse:
+    key: str
+    reply: str
+    expires_at: float
+    vector: Optional[numpy.ndarray] = None
+
+
+class ResponseCache:
+    """问答回复缓存
+
+    Replies are keyed by prompt, model and the normalised query. Only
+    replies whose type is in ``cacheable`` (``问答`` by default) are stored,
+    commands and noise verdicts never are, and queries about the clock are
+    never cached at all. Entries expire after ``ttl`` seconds, or
+    ``volatile_ttl`` for queries about the date or weather.
+
+    With an ``embedder`` an exact miss falls back to the most similar cached
+    query in a small in-memory vector index, served when the cosine
+    similarity is at least ``similarity``.
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, volatile_ttl: float = 600,
+                 max_entries: int = 512,
+                 embedder: Optional[Callable[[str], numpy.ndarray]] = None,
+                 similarity: float = 0.92,
+                 cacheable: Iterable[str] = (ANSWER,),
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.volatile_ttl = volatile_ttl
+        self.max_entries = max_entries
+        self.embedder = embedder
+        self.similarity = similarity
+        self.cacheable = set(cacheable)
+        self.clock = clock
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, prompt: str = "command", model: str = "") -> str:
+        return "\x00".join([prompt, model, normalize_query(query)])
+
+    def ttl_for(self, query: str) -> float:
+        """0 when the answer must not be cached"""
+        if any(word in query for word in CLOCK_WORDS):
+            return 0
+        if any(word in query for word in VOLATILE_WORDS):
+            return self.volatile_ttl
+        return self.ttl
+
+    def get(self, query: str, prompt: str = "command", model: str = "") -> Optional[str]:
+        key = self.key(query, prompt, model)
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            del self._entries[key]
+            entry = None
+        if entry is None and self.embedder is not None:
+            entry = self._nearest(key, query, now)
+            if entry is not None:
+                self.similar_hits += 1
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(entry.key)
+        return entry.reply
+
+    def _nearest(self, key: str, query: str, now: float) -> Optional[CachedResponse]:
+        scope = key.rsplit("\x00", 1)[0]
+        candidates: List[CachedResponse] = [
+            e for e in self._entries.values()
+            if e.vector is not None and e.expires_at > now and e.key.rsplit("\x00", 1)[0] == scope]
+        if not candidates:
+            return None
+        vector = self.embedder(normalize_query(query))
+        scores = numpy.stack([e.vector for e in candidates]) @ vector
+        best = int(numpy.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        logger.info(f"Similar cached query ({scores[best]:.2f}) for: {query}")
+        return candidates[best]
+
+    def put(self, query: str, reply: str, prompt: str = "command", model: str = "") -> bool:
+        """Store ``reply`` if the policy allows it"""
+        parser = ResponseParser()
+        parser.feed(reply)
+        parser.finish()
+        if parser.kind not in self.cacheable or not parser.content.strip():
+            return False
+        ttl = self.ttl_for(query)
+        if ttl <= 0:
+            return False
+        key = self.key(query, prompt, model)
+        vector = self.embedder(normalize_query(query)) if self.embedder is not None else None
+        self._entries[key] = CachedResponse(key, reply, self.clock() + ttl, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return True
+
+    @staticmethod
+    async def replay(reply: str, chars: int = REPLAY_CHARS) -> AsyncGenerator[str, None]:
+        """Yield a cached reply in small chunks, like a streamed completion"""
+        for i in range(0, len(reply), chars):
+            yield reply[i:i + chars]
+            await asyncio.sleep(0)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "entries": len(self._entries),
+        }
+
+
+_shared_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """进程内共享的回复缓存，所有会话共用"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = ResponseCache()
+    return _shared_cache
@@ -1,54 +1,184 @@
-import os
-import jinja2
+import httpx
+import asyncio
 import logging
-from typing import AsyncGenerator
-from openai import OpenAI
+from typing import AsyncGenerator, Callable, Dict, List, Optional, Tuple
+from openai import AsyncOpenAI, AsyncStream
 from app.config import settings
+from app.services.chat.prompt import PromptRegistry, prompt_registry
+from app.services.chat.cache import ResponseCache, get_response_cache, is_context_free
+from app.services.chat.memory import ConversationMemory
+from app.services.chat.response import NOISE, ResponseParser
+from app.services import tracing
 from app.log import get_logger
 
 logger = get_logger(__name__)
-current_dir = os.path.dirname(__file__)
+
+_shared_client: Optional[AsyncOpenAI] = None
+
+
+def get_async_client() -> AsyncOpenAI:
+    """进程内共享的 AsyncOpenAI 客户端
+
+    All BotChain instances stream through the same keep-alive connection
+    pool, so only the first request of a worker pays the TCP/TLS handshake.
+    """
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = AsyncOpenAI(
+            base_url=settings.OPENAI_BASE_URL,
+            api_key=settings.OPENAI_API_KEY,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=20,
+                    keepalive_expiry=60),
+                timeout=httpx.Timeout(60, connect=5)))
+    return _shared_client
+
 
 class OpenAILLM:
     """阿里云 Dashscope LLM 服务"""
 
-    def __init__(self, callback):
+    def __init__(self, callback, client: Optional[AsyncOpenAI] = None,
+                 timeout: Optional[float] = 30,
+                 prompts: Optional[PromptRegistry] = None,
+                 cache: Optional[ResponseCache] = None,
+                 memory: Optional[ConversationMemory] = None,
+                 device_states: Optional[Callable[[], str]] = None):
         self.callback = callback
-        self.client = OpenAI(
-            base_url=settings.OPENAI_BASE_URL,
-            api_key=settings.OPENAI_API_KEY)
-        self.history = []
+        self.client = client or get_async_client()
+        self.prompts = prompts or prompt_registry
+        self.cache = cache or get_response_cache()
+        self.timeout = timeout
+        # 当前设备状态的描述，例如 DeviceManager.describe_states
+        self.device_states = device_states
+        # 每个会话一份对话记忆，超出预算时在后台压缩成摘要
+        self.memory = memory or ConversationMemory(summarizer=self.summarize)
+        self._stream: Optional[AsyncStream] = None
+        self._compacting: Optional[asyncio.Task] = None
 
     async def start(self):
         pass
 
     async def stop(self):
-        pass
+        await self.cancel()
+        if self._compacting is not None and not self._compacting.done():
+            self._compacting.cancel()
 
-    async def load_prompt(self, q: str):
-        prompt_file = os.path.join(current_dir, 'prompt.jinja')
-        temp: jinja2.Template = jinja2.Template(open(prompt_file, 'r').read())
-        return temp.render(q=q)
+    async def cancel(self):
+        """Abort the in-flight upstream stream, e.g. when the user barges in"""
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            logger.info("Cancelling LLM stream")
+            await stream.close()
 
-    async def agenerate(self, q: str, model: str = None) -> AsyncGenerator[str, None]:
+    def current_states(self) -> str:
+        if self.device_states is None:
+            return ""
+        try:
+            return self.device_states()
+        except Exception as e:
+            logger.warning(f"Reading device states failed: {e}")
+            return ""
+
+    def build_messages(self, q: str, prompt: str = "command",
+                       states: str = "") -> List[Dict[str, str]]:
+        """System prompt, conversation so far, then the query
+
+        The system message is the same every turn and the history only grows
+        at the end, so consecutive requests share a long common prefix. The
+        device states change between turns, so they go right before the
+        query rather than into the system prompt.
+        """
+        system = self.prompts.render_system(prompt)
+        if system is None:
+            return [{"role": "user", "content": self.prompts.render(prompt, q=q)}]
+        return [
+            {"role": "system", "content": system},
+            *self.memory.messages(),
+            *([{"role": "system", "content": f"当前设备状态：\n{states}"}] if states else []),
+            {"role": "user", "content": q},
+        ]
+
+    def remember(self, q: str, reply: str) -> None:
+        """Record a finished turn; noise is not worth remembering"""
+        parser = ResponseParser()
+        parser.feed(reply)
+        parser.finish()
+        if parser.kind == NOISE or not reply:
+            return
+        self.memory.add(q, reply)
+        if self.memory.over_budget and (self._compacting is None or self._compacting.done()):
+            self._compacting = asyncio.create_task(self.memory.compact())
+
+    async def summarize(self, summary: str, turns: List[Tuple[str, str]],
+                        model: str = None) -> str:
+        # 指令放在 system 里，和 build_messages 一样只把要处理的内容作为 user 消息
+        response = await self.client.chat.completions.create(
+            model=model or settings.OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": self.prompts.render_system("summary")},
+                {"role": "user", "content": self.prompts.render_block(
+                    "summary", "user", summary=summary, turns=turns)},
+            ],
+            timeout=self.timeout)
+        return response.choices[0].message.content or ""
+
+    async def agenerate(self, q: str, model: str = None,
+                        timeout: Optional[float] = None,
+                        prompt: str = "command") -> AsyncGenerator[str, None]:
         model = model or settings.OPENAI_MODEL
+        # 推测请求可能被替换，以最后一次请求为准
+        trace = getattr(self.callback, "trace", tracing.NULL_TRACE)
+        trace.mark(tracing.LLM_REQUEST, replace=True)
+        # 承接上文的追问答案取决于历史，只有新对话或完整独立的问题才用缓存
+        cacheable = self.memory.empty or is_context_free(q)
+        states = self.current_states()
+        # 回答可能引用设备状态，状态变了就不能复用
+        scope = f"{prompt}\x00{states}" if states else prompt
+        cached = self.cache.get(q, scope, model) if cacheable else None
+        if cached is not None:
+            logger.info(f"LLM cache hit: {q}")
+            trace.attributes["llm_cache"] = "hit"
+            first = True
+            async for token in self.cache.replay(cached):
+                if first:
+                    trace.mark(tracing.LLM_FIRST_TOKEN, replace=True)
+                    first = False
+                yield token
+            return
         answer = ""
+        stream = None
         try:
-            user_message = {"role": "user", "content": await self.load_prompt(q)}
-            messages = [user_message]
-            response = self.client.chat.completions.create(
+            messages = self.build_messages(q, prompt, states)
+            stream = await self.client.chat.completions.create(
                 model=model,
                 messages=messages,
-                stream=True
+                stream=True,
+                timeout=timeout or self.timeout
             )
-            for chunk in response:
+            self._stream = stream
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
                 content = chunk.choices[0].delta.content
                 if content is None:
                     continue
+                if not answer:
+                    trace.mark(tracing.LLM_FIRST_TOKEN, replace=True)
                 answer += content
                 yield content
-            # self.history.append({"role": "user", "content": prompt})
-            # self.history.append({"role": "assistant", "content": answer})
+            if self._stream is stream and cacheable:
+                # 被 cancel() 截断的回复不缓存
+                self.cache.put(q, answer, scope, model)
         except Exception as e:
+            if stream is not None and self._stream is None:
+                logger.info("LLM stream cancelled")
+                return
             logger.error(f"LLM error: {e}")
-            raise e
\ No newline at end of file
+            raise e
+        finally:
+            if stream is not None:
+                if self._stream is stream:
+                    self._stream = None
+                await stream.close()
@@ -0,0 +1,147 @@
+"""
+Conversation memory
+按 token 预算保留最近几轮对话，更早的对话压缩成摘要
+"""
+import re
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+Turn = Tuple[str, str]
+
+CJK = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计：中文大约一字一个 token，其余大约四个字符一个"""
+    cjk = len(CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class ConversationMemory:
+    """会话记忆
+
+    Keeps the turns of one session as ``(query, reply)`` pairs and renders
+    them as chat messages. Once they add up to more than ``max_tokens``,
+    ``compact`` folds the oldest turns, all but the last ``keep_turns``, into
+    a running summary with ``summarizer(summary, turns)``; without a
+    summarizer they are dropped. Messages only ever get appended between two
+    compactions, so the prompt prefix stays stable for upstream caching.
+
+    A conversation that has been idle for ``idle_reset`` seconds starts over.
+
+    ``bind`` attaches a ``SessionStore``: ``load`` restores the conversation
+    of a returning session and every change is written through in the
+    background, so another worker can pick the session up.
+    """
+
+    def __init__(self, max_tokens: int = 1200, keep_turns: int = 2,
+                 summarizer: Optional[Callable[[str, List[Turn]], Awaitable[str]]] = None,
+                 idle_reset: Optional[float] = 300,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.summarizer = summarizer
+        self.idle_reset = idle_reset
+        self.count_tokens = count_tokens
+        self.turns: List[Turn] = []
+        self.summary = ""
+        self.last_active = time.monotonic()
+        self.compactions = 0
+        self.store = None
+        self.session_id: Optional[str] = None
+        self._writes: Set[asyncio.Task] = set()
+
+    def bind(self, store, session_id: str) -> None:
+        self.store = store
+        self.session_id = session_id
+
+    async def load(self) -> None:
+        """Restore the bound session's conversation"""
+        if self.store is None:
+            return
+        summary, turns, updated_at = await self.store.load_history(self.session_id)
+        if updated_at is None:
+            return
+        idle = max(0.0, time.time() - updated_at)
+        self.summary, self.turns = summary, list(turns)
+        self.last_active = time.monotonic() - idle
+        self._expire()
+        if self.turns:
+            logger.info(f"Restored {len(self.turns)} turns of {self.session_id}")
+
+    def _write(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    def _expire(self) -> None:
+        if self.idle_reset is not None and time.monotonic() - self.last_active > self.idle_reset:
+            if self.turns or self.summary:
+                logger.info("Conversation idle, starting over")
+                self.clear()
+
+    def clear(self) -> None:
+        self.turns.clear()
+        self.summary = ""
+        if self.store is not None:
+            self._write(self.store.clear_history(self.session_id))
+
+    @property
+    def empty(self) -> bool:
+        self._expire()
+        return not self.turns and not self.summary
+
+    @property
+    def tokens(self) -> int:
+        return self.count_tokens(self.summary) + sum(
+            self.count_tokens(q) + self.count_tokens(r) for q, r in self.turns)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.tokens > self.max_tokens and len(self.turns) > self.keep_turns
+
+    def messages(self) -> List[Dict[str, str]]:
+        self._expire()
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"之前的对话摘要：{self.summary}"})
+        for query, reply in self.turns:
+            messages.append({"role": "user", "content": query})
+            messages.append({"role": "assistant", "content": reply})
+        return messages
+
+    def add(self, query: str, reply: str) -> None:
+        self._expire()
+        self.turns.append((query, reply))
+        self.last_active = time.monotonic()
+        if self.store is not None:
+            self._write(self.store.append_turn(self.session_id, query, reply))
+
+    async def compact(self) -> None:
+        """Fold all but the last ``keep_turns`` turns into the summary"""
+        if not self.over_budget:
+            return
+        folded = self.turns[:len(self.turns) - self.keep_turns]
+        summary = self.summary
+        if self.summarizer is not None:
+            try:
+                summary = (await self.summarizer(self.summary, folded)).strip()
+            except Exception as e:
+                logger.warning(f"Summarizing conversation failed, dropping old turns: {e}")
+        if self.turns[:len(folded)] != folded:
+            # 摘要期间会话被清空了
+            return
+        # 摘要期间可能又加了新的一轮，只去掉已经折叠的部分
+        self.turns = self.turns[len(folded):]
+        self.summary = summary
+        self.compactions += 1
+        if self.store is not None:
+            if self._writes:
+                # 先让追加写完，否则可能落在整体替换之后
+                await asyncio.wait(set(self._writes))
+            await self.store.save_history(self.session_id, self.summary, self.turns)
+        logger.info(f"Compacted {len(folded)} turns, memory now {self.tokens} tokens")
@@ -0,0 +1,81 @@
+"""
+Prompt templates
+提示词模板注册表：模板只在首次使用或文件修改后编译
+"""
+import os
+from typing import Dict, Optional
+
+import jinja2
+
+from app.log import get_logger
+
+logger = get_logger(__name__)
+current_dir = os.path.dirname(__file__)
+
+PROMPTS: Dict[str, str] = {
+    "command": "prompt.jinja",
+    "qa": "qa.jinja",
+    "summary": "summary.jinja",
+}
+
+
+class PromptRegistry:
+    """提示词模板注册表
+
+    Templates are loaded and compiled once through a shared
+    ``jinja2.Environment``; compiled bytecode is cached on disk so a restarted
+    worker skips compilation too. With ``auto_reload`` the environment only
+    stats the file on lookup and recompiles when its mtime changes.
+    """
+
+    def __init__(self, prompts: Optional[Dict[str, str]] = None,
+                 search_path: str = current_dir,
+                 bytecode_cache_dir: Optional[str] = None,
+                 auto_reload: bool = True):
+        self.prompts: Dict[str, str] = dict(PROMPTS if prompts is None else prompts)
+        # 不指定目录时 jinja2 使用当前用户私有（0700、校验属主）的临时目录，
+        # 共享的固定目录可能被其他本地用户抢先创建并放入恶意字节码
+        if bytecode_cache_dir is not None:
+            os.makedirs(bytecode_cache_dir, mode=0o700, exist_ok=True)
+        self.env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(search_path, encoding="utf-8"),
+            bytecode_cache=jinja2.FileSystemBytecodeCache(bytecode_cache_dir),
+            auto_reload=auto_reload,
+            keep_trailing_newline=True)
+
+    def register(self, name: str, filename: str) -> None:
+        self.prompts[name] = filename
+
+    def get(self, name: str) -> jinja2.Template:
+        try:
+            filename = self.prompts[name]
+        except KeyError:
+            raise ValueError(f"Unknown prompt: {name}") from None
+        return self.env.get_template(filename)
+
+    def source(self, name: str) -> str:
+        """Raw template text, e.g. to read the command list out of it"""
+        filename = self.get(name).name
+        return self.env.loader.get_source(self.env, filename)[0]
+
+    def render(self, name: str, **context) -> str:
+        return self.get(name).render(**context)
+
+    def render_block(self, name: str, block: str, **context) -> Optional[str]:
+        """One block of the template on its own, ``None`` if it has none"""
+        template = self.get(name)
+        render = template.blocks.get(block)
+        if render is None:
+            return None
+        return "".join(render(template.new_context(context)))
+
+    def render_system(self, name: str) -> Optional[str]:
+        """The template's ``system`` block on its own, ``None`` if it has none
+
+        The block must not depend on the query, so it can be sent as an
+        identical system message every turn and hit upstream prompt caching.
+        """
+        return self.render_block(name, "system")
+
+
+prompt_registry = PromptRegistry()
@@ -0,0 +1,53 @@
+"""
+Streaming parser for the ``类型|内容`` reply format defined in prompt.jinja
+"""
+from typing import Optional
+
+COMMAND = "指令"
+ANSWER = "问答"
+NOISE = "噪声"
+
+SEPARATOR = "|"
+# 超过这个长度还没看到分隔符，就认为模型没有按格式输出
+MAX_KIND_LENGTH = 4
+
+
+class ResponseParser:
+    """解析 LLM 流式输出的类型前缀
+
+    ``feed`` returns the part of each token that belongs to the content.
+    ``kind`` is ``None`` until the prefix is complete; a reply that does
+    not follow the format is treated as a plain answer.
+    """
+
+    def __init__(self):
+        self.kind: Optional[str] = None
+        self.content = ""
+        self._prefix = ""
+
+    @property
+    def speakable(self) -> bool:
+        return self.kind == ANSWER
+
+    def feed(self, token: str) -> str:
+        if self.kind is None:
+            self._prefix += token
+            head, sep, tail = self._prefix.partition(SEPARATOR)
+            if sep:
+                self.kind = head.strip()
+                token = tail
+            elif len(self._prefix) > MAX_KIND_LENGTH:
+                self.kind = ANSWER
+                token = self._prefix
+            else:
+                return ""
+        self.content += token
+        return token
+
+    def finish(self) -> str:
+        """Flush a short reply that never contained a separator"""
+        if self.kind is None:
+            self.kind = ANSWER
+            self.content = self._prefix
+            return self._prefix
+        return ""
@@ -0,0 +1,77 @@
+"""
+Sentence segmentation for streaming TTS
+把 LLM 的流式输出切分成可以直接送入 TTS 的短句
+"""
+from typing import List, Optional
+
+# 句末标点：遇到即切分
+SENTENCE_ENDS = set("。！？；!?;…\n")
+# 句中停顿：片段足够长时在此切分
+CLAUSE_BREAKS = set("，、：,:")
+# 紧跟在标点后的右引号/括号，归入前一个片段
+CLOSERS = set("”’」』）)】\"'")
+
+
+class SentenceSegmenter:
+    """流式断句
+
+    Tokens are buffered until a Chinese or Western sentence end is seen, a
+    clause break is reached after ``soft_chars`` characters, or the buffer
+    grows past ``max_chars``. The first segment of a turn uses
+    ``first_soft_chars`` so the first audio can start as early as possible.
+    """
+
+    def __init__(self, soft_chars: int = 12, max_chars: int = 40,
+                 first_soft_chars: int = 6):
+        self.soft_chars = soft_chars
+        self.max_chars = max_chars
+        self.first_soft_chars = first_soft_chars
+        self.buffer = ""
+        self.emitted = 0
+
+    def feed(self, text: str) -> List[str]:
+        self.buffer += text
+        segments = []
+        while True:
+            cut = self._find_cut()
+            if cut <= 0:
+                break
+            segment, self.buffer = self.buffer[:cut], self.buffer[cut:]
+            segment = segment.strip()
+            if segment:
+                segments.append(segment)
+                self.emitted += 1
+        return segments
+
+    def flush(self) -> Optional[str]:
+        segment, self.buffer = self.buffer.strip(), ""
+        if segment:
+            self.emitted += 1
+            return segment
+        return None
+
+    def reset(self) -> None:
+        self.buffer = ""
+        self.emitted = 0
+
+    def _find_cut(self) -> int:
+        buf = self.buffer
+        soft = self.first_soft_chars if self.emitted == 0 else self.soft_chars
+        for i, ch in enumerate(buf):
+            if ch in SENTENCE_ENDS or (ch in CLAUSE_BREAKS and i + 1 >= soft):
+                end = i + 1
+            elif ch == ".":
+                # "3.5" 之类的小数点不切分，需要看到下一个字符才能判断
+                if i + 1 >= len(buf):
+                    return 0
+                if not buf[i + 1].isspace():
+                    continue
+                end = i + 1
+            else:
+                continue
+            while end < len(buf) and buf[end] in CLOSERS:
+                end += 1
+            return end
+        if len(buf) >= self.max_chars:
+            return self.max_chars
+        return 0
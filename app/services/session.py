@@ -0,0 +1,254 @@
+"""
+Session store
+会话状态（对话历史、轮次状态、TTS 缓存索引）放在进程外，多个 worker 共享、重启不丢
+"""
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+Turn = Tuple[str, str]
+
+
+class SessionStore:
+    """会话存储接口
+
+    Conversation history is stored per session as a summary plus the turns
+    after it, turn state as a flat string map, and synthesized phrases as
+    audio shared by every session. ``load_history`` also returns the wall
+    clock time of the last change, so a restored conversation can tell how
+    long it has been idle.
+    """
+
+    async def load_history(self, session_id: str) -> Tuple[str, List[Turn], Optional[float]]:
+        raise NotImplementedError
+
+    async def append_turn(self, session_id: str, query: str, reply: str) -> None:
+        raise NotImplementedError
+
+    async def save_history(self, session_id: str, summary: str, turns: List[Turn]) -> None:
+        raise NotImplementedError
+
+    async def clear_history(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    async def get_state(self, session_id: str) -> Dict[str, str]:
+        raise NotImplementedError
+
+    async def set_state(self, session_id: str, **fields) -> None:
+        raise NotImplementedError
+
+    async def get_tts(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def put_tts(self, key: str, audio: bytes) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """进程内存储，单 worker 部署和测试用
+
+    Phrase audio is bounded by ``max_tts_entries`` and ``max_tts_bytes``,
+    least recently used first. In a single process ``TTSCache`` already
+    keeps the same audio, so the default byte budget is kept small.
+    """
+
+    def __init__(self, max_tts_entries: int = 1000, max_tts_bytes: int = 2 * 1024 * 1024):
+        self.history: Dict[str, Tuple[str, List[Turn], float]] = {}
+        self.state: Dict[str, Dict[str, str]] = {}
+        self.tts: "OrderedDict[str, bytes]" = OrderedDict()
+        self.tts_bytes = 0
+        self.max_tts_entries = max_tts_entries
+        self.max_tts_bytes = max_tts_bytes
+
+    async def load_history(self, session_id):
+        summary, turns, updated_at = self.history.get(session_id, ("", [], None))
+        return summary, list(turns), updated_at
+
+    async def append_turn(self, session_id, query, reply):
+        summary, turns, _ = self.history.get(session_id, ("", [], None))
+        self.history[session_id] = (summary, turns + [(query, reply)], time.time())
+
+    async def save_history(self, session_id, summary, turns):
+        self.history[session_id] = (summary, list(turns), time.time())
+
+    async def clear_history(self, session_id):
+        self.history.pop(session_id, None)
+
+    async def get_state(self, session_id):
+        return dict(self.state.get(session_id, {}))
+
+    async def set_state(self, session_id, **fields):
+        self.state.setdefault(session_id, {}).update({k: str(v) for k, v in fields.items()})
+
+    async def get_tts(self, key):
+        audio = self.tts.get(key)
+        if audio is not None:
+            self.tts.move_to_end(key)
+        return audio
+
+    async def put_tts(self, key, audio):
+        if len(audio) > self.max_tts_bytes:
+            return
+        old = self.tts.pop(key, None)
+        if old is not None:
+            self.tts_bytes -= len(old)
+        self.tts[key] = audio
+        self.tts_bytes += len(audio)
+        while len(self.tts) > self.max_tts_entries or self.tts_bytes > self.max_tts_bytes:
+            _, evicted = self.tts.popitem(last=False)
+            self.tts_bytes -= len(evicted)
+
+
+class RedisSessionStore(SessionStore):
+    """Redis 存储
+
+    Keys live under ``prefix``. A session's keys expire ``session_ttl``
+    seconds after its last write. Phrase audio expires after ``tts_ttl`` and
+    is indexed in a sorted set by last use; beyond ``max_tts_entries`` the
+    least recently used phrases are removed. Every change is written in a
+    single pipelined round trip.
+
+    Redis being unavailable never fails a turn: errors are logged and the
+    call behaves as if nothing was stored.
+    """
+
+    def __init__(self, client: "redis.Redis", prefix: str = "anybot",
+                 session_ttl: int = 24 * 3600, tts_ttl: int = 7 * 24 * 3600,
+                 max_tts_entries: int = 5000):
+        self.redis = client
+        self.prefix = prefix
+        self.session_ttl = session_ttl
+        self.tts_ttl = tts_ttl
+        self.max_tts_entries = max_tts_entries
+
+    @classmethod
+    def from_url(cls, url: str, timeout: float = 1.0, **kwargs) -> "RedisSessionStore":
+        # 连不上时快速失败，不能让一轮对话卡在重试上
+        client = redis.from_url(
+            url, socket_timeout=timeout, socket_connect_timeout=timeout,
+            retry=Retry(ExponentialBackoff(cap=0.2, base=0.02), 1))
+        return cls(client, **kwargs)
+
+    def _key(self, session_id: str, kind: str) -> str:
+        return f"{self.prefix}:session:{session_id}:{kind}"
+
+    @property
+    def _tts_index(self) -> str:
+        return f"{self.prefix}:tts:index"
+
+    def _tts_key(self, key: str) -> str:
+        return f"{self.prefix}:tts:{key}"
+
+    async def load_history(self, session_id):
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.get(self._key(session_id, "summary"))
+                pipe.lrange(self._key(session_id, "turns"), 0, -1)
+                pipe.hget(self._key(session_id, "state"), "history_at")
+                summary, turns, updated_at = await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Loading session {session_id} failed: {e}")
+            return "", [], None
+        return (summary.decode("utf-8") if summary else "",
+                [tuple(json.loads(t)) for t in turns],
+                float(updated_at) if updated_at else None)
+
+    def _touch(self, pipe, session_id: str) -> None:
+        pipe.hset(self._key(session_id, "state"), "history_at", time.time())
+        for kind in ("summary", "turns", "state"):
+            pipe.expire(self._key(session_id, kind), self.session_ttl)
+
+    async def _execute(self, pipe, what: str) -> Optional[list]:
+        try:
+            return await pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"{what} failed: {e}")
+            return None
+
+    async def append_turn(self, session_id, query, reply):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(self._key(session_id, "turns"), json.dumps([query, reply], ensure_ascii=False))
+            self._touch(pipe, session_id)
+            await self._execute(pipe, f"Saving turn of {session_id}")
+
+    async def save_history(self, session_id, summary, turns):
+        # 压缩后整体替换，用事务保证其他 worker 不会读到一半
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._key(session_id, "summary"), summary)
+            pipe.delete(self._key(session_id, "turns"))
+            if turns:
+                pipe.rpush(self._key(session_id, "turns"),
+                           *[json.dumps(list(t), ensure_ascii=False) for t in turns])
+            self._touch(pipe, session_id)
+            await self._execute(pipe, f"Saving history of {session_id}")
+
+    async def clear_history(self, session_id):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(self._key(session_id, "summary"), self._key(session_id, "turns"))
+            pipe.hdel(self._key(session_id, "state"), "history_at")
+            await self._execute(pipe, f"Clearing history of {session_id}")
+
+    async def get_state(self, session_id):
+        try:
+            state = await self.redis.hgetall(self._key(session_id, "state"))
+        except redis.RedisError as e:
+            logger.warning(f"Loading state of {session_id} failed: {e}")
+            return {}
+        return {k.decode("utf-8"): v.decode("utf-8") for k, v in state.items()}
+
+    async def set_state(self, session_id, **fields):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(self._key(session_id, "state"),
+                      mapping={k: str(v) for k, v in fields.items()})
+            pipe.expire(self._key(session_id, "state"), self.session_ttl)
+            await self._execute(pipe, f"Saving state of {session_id}")
+
+    async def get_tts(self, key):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(self._tts_key(key))
+            pipe.zadd(self._tts_index, {key: time.time()}, xx=True)
+            result = await self._execute(pipe, "Loading TTS audio")
+        return result[0] if result else None
+
+    async def put_tts(self, key, audio):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(self._tts_key(key), audio, ex=self.tts_ttl)
+            pipe.zadd(self._tts_index, {key: time.time()})
+            pipe.zcard(self._tts_index)
+            result = await self._execute(pipe, "Saving TTS audio")
+        if not result or result[-1] <= self.max_tts_entries:
+            return
+        try:
+            evicted = await self.redis.zpopmin(self._tts_index, result[-1] - self.max_tts_entries)
+            if evicted:
+                await self.redis.delete(*[self._tts_key(k.decode("utf-8")) for k, _ in evicted])
+        except redis.RedisError as e:
+            logger.warning(f"Trimming TTS audio failed: {e}")
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+_shared_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """进程内共享的会话存储：配置了 ``REDIS_URL`` 就用 Redis，否则放在内存里"""
+    global _shared_store
+    if _shared_store is None:
+        url = getattr(settings, "REDIS_URL", None)
+        _shared_store = RedisSessionStore.from_url(url) if url else MemorySessionStore()
+    return _shared_store
@@ -0,0 +1,140 @@
+"""
+Speculative LLM requests
+用户还没说完（或者刚说完、端点还没确认）时就先把问题发给 LLM
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, List, Optional
+
+from app.services.chat.cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class Speculation:
+    """对一个尚未确认的查询提前发起的 LLM 请求
+
+    Tokens are collected in the background. Once the query is confirmed,
+    ``stream`` replays what has arrived so far and then follows the live
+    request, so the turn sees an ordinary token stream.
+    """
+
+    def __init__(self, query: str, generate: Callable[[str], AsyncIterator[str]]):
+        self.query = query
+        self.key = normalize_query(query)
+        self.tokens: List[str] = []
+        self.started_at = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.error: Optional[Exception] = None
+        self._more = asyncio.Event()
+        self.task = asyncio.create_task(self._run(generate))
+
+    async def _run(self, generate) -> None:
+        try:
+            async for token in generate(self.query):
+                if self.first_token_at is None:
+                    self.first_token_at = time.monotonic()
+                self.tokens.append(token)
+                self._more.set()
+        except Exception as e:
+            # 交给 stream() 抛出；被丢弃的推测不需要报错
+            self.error = e
+        finally:
+            self._more.set()
+
+    async def stream(self) -> AsyncIterator[str]:
+        i = 0
+        try:
+            while True:
+                self._more.clear()
+                while i < len(self.tokens):
+                    yield self.tokens[i]
+                    i += 1
+                if self.task.done():
+                    break
+                await self._more.wait()
+        finally:
+            self.cancel()
+        if self.error is not None:
+            raise self.error
+
+    def cancel(self) -> None:
+        if not self.task.done():
+            self.task.cancel()
+
+
+class Speculator:
+    """推测执行
+
+    ``update`` is called with the utterance so far and the stability of
+    its latest ASR result. When the text is stable enough (final results
+    are 1.0), long enough and ``accept`` allows it, an LLM request is
+    started for it; a speculation for text that has since changed is
+    cancelled and counted as wasted. At the endpoint ``take`` returns the
+    speculation if it was for the confirmed query.
+
+    For every committed speculation the head start it gave the turn is
+    recorded: the time from starting it to the endpoint, or to its first
+    token if that came earlier.
+    """
+
+    def __init__(self, generate: Callable[[str], AsyncIterator[str]],
+                 accept: Optional[Callable[[str], bool]] = None,
+                 min_stability: float = 0.95, min_chars: int = 2,
+                 history: int = 200):
+        self.generate = generate
+        self.accept = accept
+        self.min_stability = min_stability
+        self.min_chars = min_chars
+        self.current: Optional[Speculation] = None
+        self.started = 0
+        self.committed = 0
+        self.wasted = 0
+        self.saved_ms: Deque[float] = deque(maxlen=history)
+
+    def update(self, text: str, stability: float) -> None:
+        key = normalize_query(text)
+        if self.current is not None and self.current.key == key:
+            return
+        self.cancel()
+        if stability < self.min_stability or len(key) < self.min_chars:
+            return
+        if self.accept is not None and not self.accept(text):
+            return
+        logger.info(f"Speculating on: {text} ({stability:.2f})")
+        self.current = Speculation(text, self.generate)
+        self.started += 1
+
+    def take(self, query: str) -> Optional[Speculation]:
+        """The speculation for ``query``, if any; any other one is cancelled"""
+        speculation, self.current = self.current, None
+        if speculation is None:
+            return None
+        if speculation.key != normalize_query(query):
+            speculation.cancel()
+            self.wasted += 1
+            return None
+        now = time.monotonic()
+        head_start = min(now, speculation.first_token_at or now) - speculation.started_at
+        self.saved_ms.append(head_start * 1000)
+        self.committed += 1
+        logger.info(f"Speculation committed, {head_start * 1000:.0f} ms ahead")
+        return speculation
+
+    def cancel(self) -> None:
+        speculation, self.current = self.current, None
+        if speculation is not None:
+            speculation.cancel()
+            self.wasted += 1
+
+    def stats(self) -> dict:
+        saved = sorted(self.saved_ms)
+        return {
+            "started": self.started,
+            "committed": self.committed,
+            "wasted": self.wasted,
+            "saved_ms_mean": round(sum(saved) / len(saved), 1) if saved else 0.0,
+            "saved_ms_p50": round(saved[len(saved) // 2], 1) if saved else 0.0,
+        }
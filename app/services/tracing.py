@@ -0,0 +1,227 @@
+"""
+Turn latency tracing
+每轮对话在各环节边界打点，统计各阶段耗时的分布
+"""
+import time
+import json
+import logging
+import itertools
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetry 是可选依赖: pip install anybot[tracing]
+    otel_trace = None
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 各环节边界，大致按一轮对话中出现的先后顺序
+ASR_FIRST_FRAME = "asr_first_frame"
+ASR_READY = "asr_ready"
+ASR_FIRST_RESULT = "asr_first_result"
+ASR_FINAL = "asr_final"
+ENDPOINT = "endpoint"
+TURN_START = "turn_start"
+LLM_REQUEST = "llm_request"
+LLM_FIRST_TOKEN = "llm_first_token"
+TTS_REQUEST = "tts_request"
+TTS_FIRST_CHUNK = "tts_first_chunk"
+FIRST_AUDIO = "first_audio"
+CLIENT_AUDIO = "client_audio"
+TURN_END = "turn_end"
+
+# 统计的阶段：名称 -> (起点, 终点)，两端都打过点才计入
+SPANS: Dict[str, Tuple[str, str]] = {
+    "asr_connect": (ASR_FIRST_FRAME, ASR_READY),
+    "asr_finalize": (ASR_FIRST_RESULT, ASR_FINAL),
+    "endpoint_wait": (ASR_FINAL, ENDPOINT),
+    "llm_ttft": (LLM_REQUEST, LLM_FIRST_TOKEN),
+    "tts_first_chunk": (TTS_REQUEST, TTS_FIRST_CHUNK),
+    "client_handoff": (FIRST_AUDIO, CLIENT_AUDIO),
+    "time_to_first_audio": (ENDPOINT, FIRST_AUDIO),
+    "turn": (ASR_FIRST_RESULT, TURN_END),
+}
+
+
+class TurnTrace:
+    """一轮对话的打点
+
+    ``mark`` stamps ``time.monotonic()`` for a stage boundary. By default the
+    first stamp of a stage wins; ``replace=True`` keeps the last one instead,
+    for boundaries that may be crossed again before the turn settles (a new
+    ASR sentence, an LLM request replacing a speculative one). Marks may come
+    from SDK threads: each is a single dict assignment.
+    """
+
+    active = True
+
+    def __init__(self, turn_id: str, session_id: str = ""):
+        self.turn_id = turn_id
+        self.session_id = session_id
+        self.started_at = time.monotonic()
+        # 导出 span 时换算成墙钟时间
+        self.wall_started_at = time.time()
+        self.marks: Dict[str, float] = {}
+        self.attributes: Dict[str, object] = {}
+
+    def mark(self, stage: str, replace: bool = False) -> None:
+        if replace or stage not in self.marks:
+            self.marks[stage] = time.monotonic()
+
+    def clear(self) -> None:
+        """Forget the marks, e.g. when the utterance was dropped as noise"""
+        self.marks.clear()
+        self.attributes.clear()
+
+    def durations(self) -> Dict[str, float]:
+        """Milliseconds spent in each span of ``SPANS`` that was crossed"""
+        marks = self.marks
+        return {
+            name: (marks[end] - marks[start]) * 1000
+            for name, (start, end) in SPANS.items()
+            if start in marks and end in marks and marks[end] >= marks[start]
+        }
+
+    def spans(self) -> List[dict]:
+        """Crossed spans with wall clock start and end, for exporting"""
+        offset = self.wall_started_at - self.started_at
+        return [
+            {
+                "trace_id": self.turn_id,
+                "session_id": self.session_id,
+                "name": name,
+                "start": self.marks[SPANS[name][0]] + offset,
+                "end": self.marks[SPANS[name][1]] + offset,
+            }
+            for name in self.durations()
+        ]
+
+
+class _NullTrace:
+    """没有打开的轮次时使用，打点什么也不做"""
+
+    active = False
+    marks: Dict[str, float] = {}
+
+    @property
+    def attributes(self) -> Dict[str, object]:
+        # 每次给一个新的，写进去的东西直接丢掉
+        return {}
+
+    def mark(self, stage: str, replace: bool = False) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def log_exporter(trace: TurnTrace) -> None:
+    """One JSON line per turn"""
+    logger.info(json.dumps({"trace_id": trace.turn_id, "session_id": trace.session_id,
+                            **{k: round(v, 1) for k, v in trace.durations().items()},
+                            **trace.attributes}, ensure_ascii=False))
+
+
+def otel_exporter(trace: TurnTrace) -> None:
+    """Turn spans into OpenTelemetry spans under one root span per turn"""
+    tracer = otel_trace.get_tracer(__name__)
+    offset = trace.wall_started_at - trace.started_at
+    root = tracer.start_span(
+        "turn", start_time=int((min(trace.marks.values()) + offset) * 1e9),
+        attributes={"anybot.turn_id": trace.turn_id, "anybot.session_id": trace.session_id,
+                    **{f"anybot.{k}": str(v) for k, v in trace.attributes.items()}})
+    context = otel_trace.set_span_in_context(root)
+    for span in trace.spans():
+        if span["name"] != "turn":
+            tracer.start_span(span["name"], context=context,
+                              start_time=int(span["start"] * 1e9)).end(int(span["end"] * 1e9))
+    root.end(int((trace.marks[TURN_END] + offset) * 1e9))
+
+
+EXPORTERS: Dict[str, Callable[[TurnTrace], None]] = {
+    "log": log_exporter,
+    "otel": otel_exporter,
+}
+
+
+class LatencyTracer:
+    """各阶段耗时统计
+
+    ``begin`` opens a ``TurnTrace``; ``finish`` stamps its end, adds its span
+    durations to bounded per-span histories and hands it to ``exporter``.
+    Nothing is computed on the audio path: percentiles are only worked out
+    when ``stats()`` is called.
+    """
+
+    def __init__(self, history: int = 1000,
+                 exporter: Optional[Callable[[TurnTrace], None]] = None):
+        self.history = history
+        self.exporter = exporter
+        self.samples: Dict[str, Deque[float]] = {}
+        self.turns = 0
+        self._ids = itertools.count(1)
+
+    def begin(self, session_id: str = "") -> TurnTrace:
+        return TurnTrace(f"{session_id}-{next(self._ids)}", session_id)
+
+    def finish(self, trace: TurnTrace, **attributes) -> Dict[str, float]:
+        if not trace.active or not trace.marks:
+            return {}
+        trace.mark(TURN_END)
+        trace.attributes.update(attributes)
+        durations = trace.durations()
+        for name, ms in durations.items():
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.history)
+            samples.append(ms)
+        self.turns += 1
+        if self.exporter is not None:
+            try:
+                self.exporter(trace)
+            except Exception as e:
+                logger.warning(f"Exporting trace {trace.turn_id} failed: {e}")
+        return durations
+
+    def stats(self) -> dict:
+        stats: dict = {"turns": self.turns}
+        for name in SPANS:
+            values = list(self.samples.get(name, ()))
+            if not values:
+                continue
+            stats[name] = {
+                "count": len(values),
+                "p50": round(percentile(values, 0.5), 1),
+                "p95": round(percentile(values, 0.95), 1),
+                "p99": round(percentile(values, 0.99), 1),
+            }
+        return stats
+
+
+_shared_tracer: Optional[LatencyTracer] = None
+
+
+def get_tracer() -> LatencyTracer:
+    """进程内共享的耗时统计，``TRACE_EXPORTER`` 可设为 "log" 或 "otel" 导出每轮的 span"""
+    global _shared_tracer
+    if _shared_tracer is None:
+        name = getattr(settings, "TRACE_EXPORTER", None)
+        exporter = EXPORTERS.get(name) if name else None
+        if name == "otel" and otel_trace is None:
+            logger.warning("opentelemetry-api is not installed, spans are not exported")
+            exporter = None
+        _shared_tracer = LatencyTracer(exporter=exporter)
+    return _shared_tracer
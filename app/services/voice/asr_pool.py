@@ -0,0 +1,186 @@
+"""
+Pre-warmed ASR sessions
+识别会话池：回答当前问题的同时把下一轮的识别会话先连好
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, List, Set
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingCallback:
+    """转发识别结果，会话被哪个 BotChain 取走就转给谁
+
+    Stands in for the ``ChainCallback`` when a session is created, so a
+    session started before anyone needs it can later be bound to the chain
+    that takes it.
+    """
+
+    def __init__(self):
+        self.target = None
+
+    def __getattr__(self, name):
+        target = self.__dict__.get("target")
+        if target is None:
+            # 尚未被取走的会话不会收到音频，只可能有连接层面的事件
+            return lambda *args, **kwargs: None
+        return getattr(target, name)
+
+
+class RecognitionSession:
+    """一个已建立连接的识别会话"""
+
+    def __init__(self, recognition, router: RoutingCallback):
+        self.recognition = recognition
+        self.router = router
+        self.start_ms: float = 0.0
+        self.ready_at: float = 0.0
+
+    def bind(self, callback) -> None:
+        self.router.target = callback
+
+    def send(self, frame: bytes) -> None:
+        self.recognition.send_audio_frame(frame)
+
+
+class RecognitionPool:
+    """识别会话池
+
+    ``factory(callback)`` creates an unstarted recognizer (for Dashscope a
+    ``Recognition``) that reports to ``callback``. ``prewarm`` starts
+    sessions in worker threads until ``size`` are ready; ``acquire`` hands
+    out a ready one, or starts one on the spot when none is. A session that
+    has been idle longer than ``max_idle`` seconds is assumed to have been
+    closed by the server and is replaced. Sessions are single-use: after
+    ``release`` (or ``discard``, which does not wait) the recognizer is
+    stopped, never returned to the pool. ``close`` stops every session the
+    pool still holds; an idle started recognizer runs a non-daemon SDK
+    thread that would otherwise keep the process alive.
+
+    The pool is shared by every chain in the process. Start latency of
+    every session and the time callers actually waited are kept for
+    ``stats()``.
+    """
+
+    def __init__(self, factory: Callable[[RoutingCallback], object], size: int = 1,
+                 max_idle: float = 20.0, history: int = 200):
+        self.factory = factory
+        self.size = size
+        self.max_idle = max_idle
+        self.ready: Deque[RecognitionSession] = deque()
+        self._warming: Set[asyncio.Task] = set()
+        self._closing: Set[asyncio.Task] = set()
+        self.start_ms: Deque[float] = deque(maxlen=history)
+        self.wait_ms: Deque[float] = deque(maxlen=history)
+        self.warm_hits = 0
+        self.cold_starts = 0
+        self.expired = 0
+        self.closed = False
+
+    async def _start(self) -> RecognitionSession:
+        router = RoutingCallback()
+        session = RecognitionSession(self.factory(router), router)
+        started = time.monotonic()
+        # SDK 的 start() 会阻塞到握手完成，放到线程里
+        await asyncio.get_running_loop().run_in_executor(None, session.recognition.start)
+        session.ready_at = time.monotonic()
+        session.start_ms = (session.ready_at - started) * 1000
+        self.start_ms.append(session.start_ms)
+        logger.info(f"ASR session started in {session.start_ms:.0f} ms")
+        return session
+
+    def prewarm(self) -> None:
+        """Start sessions in the background until ``size`` are ready or starting"""
+        if self.closed:
+            return
+        self._drop_expired()
+        while len(self.ready) + len(self._warming) < self.size:
+            task = asyncio.create_task(self._warm())
+            self._warming.add(task)
+            task.add_done_callback(self._warming.discard)
+
+    async def _warm(self) -> None:
+        try:
+            session = await self._start()
+        except Exception as e:
+            logger.warning(f"ASR session pre-warm failed: {e}")
+            return
+        if self.closed:
+            self._close(session)
+        else:
+            self.ready.append(session)
+
+    def _drop_expired(self) -> None:
+        now = time.monotonic()
+        while self.ready and now - self.ready[0].ready_at > self.max_idle:
+            self.expired += 1
+            self._close(self.ready.popleft())
+
+    async def acquire(self, callback) -> RecognitionSession:
+        """A started session reporting to ``callback``"""
+        requested = time.monotonic()
+        self._drop_expired()
+        if not self.ready and self._warming:
+            # 预热中的会话比重新建立的更早就绪
+            await asyncio.wait(set(self._warming))
+            self._drop_expired()
+        if self.ready:
+            session = self.ready.popleft()
+            self.warm_hits += 1
+        else:
+            session = await self._start()
+            self.cold_starts += 1
+        session.bind(callback)
+        self.wait_ms.append((time.monotonic() - requested) * 1000)
+        return session
+
+    async def release(self, session: RecognitionSession) -> None:
+        """Stop ``session``, waiting for its last results"""
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, session.recognition.stop)
+        except Exception as e:
+            logger.warning(f"Error stopping ASR session: {e}")
+
+    def discard(self, session: RecognitionSession) -> None:
+        """Stop ``session`` in the background, dropping any results it still sends"""
+        session.bind(None)
+        self._close(session)
+
+    def _close(self, session: RecognitionSession) -> None:
+        task = asyncio.create_task(self.release(session))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def close(self) -> None:
+        """Stop every pre-warmed session and wait for all sessions to stop"""
+        self.closed = True
+        # 正在连接的会话连上后也要关掉
+        if self._warming:
+            await asyncio.wait(set(self._warming))
+        while self.ready:
+            self._close(self.ready.popleft())
+        if self._closing:
+            await asyncio.wait(set(self._closing))
+
+    @staticmethod
+    def _percentile(values: List[float], q: float) -> float:
+        if not values:
+            return 0.0
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def stats(self) -> dict:
+        start, wait = list(self.start_ms), list(self.wait_ms)
+        return {
+            "warm_hits": self.warm_hits,
+            "cold_starts": self.cold_starts,
+            "expired": self.expired,
+            "ready": len(self.ready),
+            "start_ms_p50": round(self._percentile(start, 0.5), 1),
+            "start_ms_max": round(max(start, default=0.0), 1),
+            "wait_ms_p50": round(self._percentile(wait, 0.5), 1),
+            "wait_ms_max": round(max(wait, default=0.0), 1),
+        }
@@ -0,0 +1,145 @@
+"""
+Streaming MP3 decoders for RealtimeMp3Player
+进程内 PyAV 解码优先，ffmpeg 子进程作为后备
+"""
+import queue
+import shutil
+import logging
+import subprocess
+from typing import Optional
+
+try:
+    import av
+except ImportError:  # PyAV 是可选依赖: pip install anybot[audio]
+    av = None
+
+logger = logging.getLogger(__name__)
+
+
+class FfmpegDecoder:
+    """ffmpeg 子进程解码，MP3 经 stdin 进、PCM 从 stdout 出"""
+
+    name = "ffmpeg"
+
+    def __init__(self, rate: int = 22050):
+        self.process = subprocess.Popen(
+            [
+                'ffmpeg', '-i', 'pipe:0', '-f', 's16le', '-ar', str(rate),
+                '-ac', '1', 'pipe:1'
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def write(self, data: bytes) -> None:
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def read(self, size: int = 1024) -> bytes:
+        """Blocking read of decoded PCM, ``b""`` once the stream has ended"""
+        return self.process.stdout.read(size)
+
+    def close(self) -> None:
+        """No more input; ``read`` drains what is left"""
+        self.process.stdin.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.wait()
+
+
+class PyAVDecoder:
+    """PyAV 进程内流式解码
+
+    MP3 bytes are parsed into packets and decoded on the caller's thread as
+    they are written, so there is no process to spawn and no pipe to copy
+    through. Decoded PCM waits in a queue for the play thread.
+    """
+
+    name = "pyav"
+
+    def __init__(self, rate: int = 22050):
+        self.codec = av.CodecContext.create("mp3", "r")
+        self.resampler = av.AudioResampler(format="s16", layout="mono", rate=rate)
+        self.pcm: "queue.Queue[Optional[bytes]]" = queue.Queue()
+
+    def _decode(self, packet) -> None:
+        try:
+            frames = self.codec.decode(packet)
+        except av.error.InvalidDataError:
+            # ID3 标签或被截断的帧
+            return
+        for frame in frames:
+            self._emit(self.resampler.resample(frame))
+
+    def _emit(self, frames) -> None:
+        for frame in frames:
+            self.pcm.put(bytes(frame.planes[0])[:frame.samples * 2])
+
+    def write(self, data: bytes) -> None:
+        for packet in self.codec.parse(data):
+            self._decode(packet)
+
+    def read(self, size: int = 1024) -> bytes:
+        # 返回一个完整的解码帧，不按 size 切分
+        return self.pcm.get() or b""
+
+    def close(self) -> None:
+        for packet in self.codec.parse(None):
+            self._decode(packet)
+        self._decode(None)
+        self._emit(self.resampler.resample(None))
+        self.pcm.put(None)
+
+    def kill(self) -> None:
+        while not self.pcm.empty():
+            self.pcm.get_nowait()
+        self.pcm.put(None)
+
+
+class PcmPassthrough:
+    """TTS 直接输出 PCM 时不需要解码，只保证按整样本交给播放线程"""
+
+    name = "pcm"
+
+    def __init__(self, rate: int = 22050):
+        self.pcm: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._partial = b""
+
+    def write(self, data: bytes) -> None:
+        data = self._partial + data
+        cut = len(data) - len(data) % 2
+        self._partial = data[cut:]
+        if cut:
+            self.pcm.put(data[:cut])
+
+    def read(self, size: int = 1024) -> bytes:
+        return self.pcm.get() or b""
+
+    def close(self) -> None:
+        self.pcm.put(None)
+
+    def kill(self) -> None:
+        while not self.pcm.empty():
+            self.pcm.get_nowait()
+        self._partial = b""
+        self.pcm.put(None)
+
+
+def create_decoder(backend: str = "auto", rate: int = 22050):
+    """``"pyav"``, ``"ffmpeg"``, ``"auto"`` (PyAV when installed) or ``"pcm"``
+    for audio that is already raw PCM"""
+    if backend == "pcm":
+        return PcmPassthrough(rate)
+    if backend == "auto":
+        backend = "pyav" if av is not None else "ffmpeg"
+    if backend == "pyav":
+        if av is None:
+            raise RuntimeError("PyAV is not installed, pip install av")
+        return PyAVDecoder(rate)
+    if backend == "ffmpeg":
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("ffmpeg executable not found")
+        return FfmpegDecoder(rate)
+    raise ValueError(f"Unknown decoder backend: {backend}")
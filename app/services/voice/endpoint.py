@@ -0,0 +1,110 @@
+"""
+End-of-utterance detection
+根据 ASR 结果判断用户一句话是否说完
+"""
+import asyncio
+from typing import Callable, List, Optional
+
+from app.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class Endpointer:
+    """语音端点检测
+
+    Every utterance owns at most one deadline timer on the event loop. Each ASR
+    result moves the deadline: a final result ends the utterance after
+    ``silence_timeout`` seconds of quiet, and no utterance may last longer than
+    ``max_utterance`` seconds from its first result. When the timer fires the
+    accumulated text is handed to ``on_endpoint``.
+
+    A non-final result is an interim hypothesis of the sentence in progress:
+    it replaces the previous one instead of being appended, and is superseded
+    by that sentence's final result.
+    """
+
+    def __init__(self, on_endpoint: Callable[[str], None],
+                 silence_timeout: float = 1.0, max_utterance: float = 10.0):
+        self.on_endpoint = on_endpoint
+        self.silence_timeout = silence_timeout
+        self.max_utterance = max_utterance
+        self._chunks: List[str] = []
+        self._partial = ""
+        self._started_at: float = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._chunks or self._partial)
+
+    @property
+    def text(self) -> str:
+        """The utterance so far, including the current interim hypothesis"""
+        return "".join(self._chunks) + self._partial
+
+    def feed(self, text: str, is_final: bool) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if not self.pending:
+            self._started_at = now
+        if is_final:
+            self._chunks.append(text)
+            self._partial = ""
+        else:
+            self._partial = text
+
+        deadline = self._started_at + self.max_utterance
+        if is_final:
+            deadline = min(deadline, now + self.silence_timeout)
+        if self._timer is not None:
+            if self._timer.when() == deadline:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_at(deadline, self._fire)
+
+    def reset(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._chunks.clear()
+        self._partial = ""
+
+    def _fire(self) -> None:
+        self._timer = None
+        text = self.text
+        self._chunks.clear()
+        self._partial = ""
+        if text:
+            self.on_endpoint(text)
+
+
+def stability(previous: str, current: str) -> float:
+    """Share of ``current`` already present, as a prefix, in ``previous``
+
+    1.0 when an interim hypothesis repeats unchanged, lower the more of it
+    was revised or is new since the last one.
+    """
+    if not current:
+        return 0.0
+    common = 0
+    for a, b in zip(previous, current):
+        if a != b:
+            break
+        common += 1
+    return common / len(current)
+
+
+class StabilityTracker:
+    """跟踪同一句话的中间结果，给每个结果一个稳定度"""
+
+    def __init__(self):
+        self.previous = ""
+
+    def update(self, text: str, is_final: bool) -> float:
+        if is_final:
+            self.previous = ""
+            return 1.0
+        score = stability(self.previous, text)
+        self.previous = text
+        return score
@@ -0,0 +1,93 @@
+"""
+Adaptive jitter buffer for audio playback
+网络/解码抖动缓冲，播放回调按固定帧长取数据
+"""
+import threading
+
+
+class JitterBuffer:
+    """自适应抖动缓冲
+
+    Decoded PCM is written from the decoder side and read in fixed-size
+    periods by the audio callback. A reply starts playing once ``target_ms``
+    of audio is buffered. Running dry in the middle of a reply counts as an
+    underrun: the gap is filled with silence and the target grows, up to
+    ``max_ms``. It slowly decays back to ``min_ms`` after clean replies.
+    Reaching the end of a reply marked with ``end_of_stream`` is not an
+    underrun. ``flush`` drops everything at once.
+    """
+
+    IDLE, BUFFERING, PLAYING = "idle", "buffering", "playing"
+
+    def __init__(self, rate: int = 22050, sample_width: int = 2,
+                 min_ms: float = 60, max_ms: float = 600, growth: float = 1.5):
+        self.bytes_per_ms = rate * sample_width / 1000
+        self.sample_width = sample_width
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.growth = growth
+        self.target_ms = min_ms
+        self.state = self.IDLE
+        self.underruns = 0
+        self.underrun_ms = 0.0
+        self._buf = bytearray()
+        self._ending = False
+        self._lock = threading.Lock()
+
+    @property
+    def buffered_ms(self) -> float:
+        return len(self._buf) / self.bytes_per_ms
+
+    def write(self, pcm: bytes) -> None:
+        with self._lock:
+            self._buf += pcm
+            if self.state == self.IDLE:
+                self.state = self.BUFFERING
+                self._ending = False
+
+    def end_of_stream(self) -> None:
+        """The current reply is complete, play out what is left"""
+        with self._lock:
+            self._ending = True
+
+    def flush(self) -> None:
+        with self._lock:
+            self._buf.clear()
+            self.state = self.IDLE
+            self._ending = False
+
+    def read(self, size: int) -> bytes:
+        """Exactly ``size`` bytes, padded with silence when not enough is buffered"""
+        with self._lock:
+            if self.state == self.BUFFERING:
+                if len(self._buf) >= self.target_ms * self.bytes_per_ms or self._ending:
+                    self.state = self.PLAYING
+                else:
+                    return bytes(size)
+            if self.state == self.IDLE:
+                return bytes(size)
+
+            size -= size % self.sample_width
+            out = bytes(self._buf[:size])
+            del self._buf[:size]
+            if len(out) < size:
+                if self._ending:
+                    self._finish_reply()
+                else:
+                    self._underrun(size - len(out))
+                out += bytes(size - len(out))
+            elif not self._buf and self._ending:
+                self._finish_reply()
+            return out
+
+    def _underrun(self, missing: int) -> None:
+        self.underruns += 1
+        self.underrun_ms += missing / self.bytes_per_ms
+        self.target_ms = min(self.max_ms, self.target_ms * self.growth)
+        # 重新攒够目标时长再继续播，避免断断续续
+        self.state = self.BUFFERING
+
+    def _finish_reply(self) -> None:
+        self.state = self.IDLE
+        self._ending = False
+        self.target_ms = max(self.min_ms, self.target_ms * 0.9)
@@ -1,87 +1,127 @@
-import subprocess
 import threading
+from typing import Optional
 
 import pyaudio
 
+from app.services.voice.decoder import create_decoder
+from app.services.voice.jitter import JitterBuffer
+
 
-# Define a callback to handle the result
 class RealtimeMp3Player:
-    def __init__(self, verbose=False):
-        self.ffmpeg_process = None
-        self._stream = None
-        self._player = None
-        self.play_thread = None
-        self.stop_event = threading.Event()
-        self.verbose = verbose
+    """常驻的 MP3 播放器
 
-    def reset(self):
-        self.ffmpeg_process = None
+    The PyAudio device, the output stream and the decoder are opened once
+    in ``start()`` and reused for every reply. The output stream runs in
+    callback mode and pulls fixed periods from a ``JitterBuffer``, so
+    ``flush()`` silences playback immediately by clearing that buffer. A
+    pump thread moves decoded PCM from the decoder into the buffer.
+    """
+
+    def __init__(self, verbose=False, decoder: str = "auto", rate: int = 22050,
+                 period_frames: int = 1024, jitter: Optional[JitterBuffer] = None):
+        # decoder: "pyav" (in-process), "ffmpeg" (subprocess), "auto", or
+        # "pcm" when the TTS already sends raw 16-bit PCM at ``rate``
+        self.decoder_backend = decoder
+        self.rate = rate
+        self.period_frames = period_frames
+        self.jitter = jitter or JitterBuffer(rate=rate)
+        self.decoder = None
         self._stream = None
         self._player = None
-        self.play_thread = None
-        self.stop_event = threading.Event()
+        self.pump_thread = None
+        self.lock = threading.Lock()
+        self.verbose = verbose
 
     def start(self):
         self._player = pyaudio.PyAudio()  # initialize pyaudio to play audio
         self._stream = self._player.open(
-            format=pyaudio.paInt16, channels=1, rate=22050,
-            output=True)  # initialize pyaudio stream
-        try:
-            self.ffmpeg_process = subprocess.Popen(
-                [
-                    'ffmpeg', '-i', 'pipe:0', '-f', 's16le', '-ar', '22050',
-                    '-ac', '1', 'pipe:1'
-                ],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL,
-            )  # initialize ffmpeg to decode mp3
-            if self.verbose:
-                print('mp3 audio player is started')
-        except subprocess.CalledProcessError as e:
-            # Capturing ffmpeg exceptions, printing error details
-            print(f'An error occurred: {e}')
+            format=pyaudio.paInt16, channels=1, rate=self.rate,
+            output=True, frames_per_buffer=self.period_frames,
+            stream_callback=self._on_period)
+        self._stream.start_stream()
+        self._open_decoder()
+        if self.verbose:
+            print(f'mp3 audio player is started with {self.decoder.name} decoder')
 
-    def stop(self):
-        try:
-            self.ffmpeg_process.stdin.close()
-            self.ffmpeg_process.wait()
-            if self.play_thread:
-                self.play_thread.join()
-            self._stream.stop_stream()
-            self._stream.close()
-            self._player.terminate()
-            if self.ffmpeg_process:
-                self.ffmpeg_process.terminate()
-            if self.verbose:
-                print('mp3 audio player is stopped')
-        except subprocess.CalledProcessError as e:
-            # Capturing ffmpeg exceptions, printing error details
-            print(f'An error occurred: {e}')
+    def _on_period(self, in_data, frame_count, time_info, status):
+        # PortAudio 线程，缓冲为空时输出静音
+        return self.jitter.read(frame_count * 2), pyaudio.paContinue
 
-    def play_audio(self):
-        # play audio with pcm data decode by ffmpeg
+    def _open_decoder(self):
         try:
-            while not self.stop_event.is_set():
-                pcm_data = self.ffmpeg_process.stdout.read(1024)
-                if pcm_data:
-                    self._stream.write(pcm_data)
-                else:
-                    break
-        except subprocess.CalledProcessError as e:
-            # Capturing ffmpeg exceptions, printing error details
+            self.decoder = create_decoder(self.decoder_backend, self.rate)
+        except (OSError, RuntimeError) as e:
+            # Capturing decoder exceptions, printing error details
             print(f'An error occurred: {e}')
+            return
+        self.pump_thread = threading.Thread(target=self.pump, args=(self.decoder,), daemon=True)
+        self.pump_thread.start()
+
+    def _close_decoder(self):
+        with self.lock:
+            decoder, self.decoder = self.decoder, None
+        if decoder is not None:
+            decoder.kill()
+            self.pump_thread.join()
+            self.pump_thread = None
+
+    def pump(self, decoder):
+        # move pcm data decoded in the background into the jitter buffer
+        while True:
+            pcm_data = decoder.read(1024)
+            if not pcm_data:
+                break
+            with self.lock:
+                # 被打断后旧解码器残留的数据直接丢弃
+                if decoder is self.decoder:
+                    self.jitter.write(pcm_data)
 
     def write(self, data: bytes) -> None:
-        # print('write audio data:', len(data))
+        with self.lock:
+            decoder = self.decoder
+        if decoder is None:
+            return
         try:
-            self.ffmpeg_process.stdin.write(data)
-            if self.play_thread is None:
-                # initialize play thread
-                # print('start play thread')
-                self._stream.start_stream()
-                self.play_thread = threading.Thread(target=self.play_audio)
-                self.play_thread.start()
-        except subprocess.CalledProcessError as e:
-            # Capturing ffmpeg exceptions, printing error details
-            print(f'An error occurred: {e}')
\ No newline at end of file
+            decoder.write(data)
+        except (OSError, ValueError) as e:
+            # the decoder was replaced by a concurrent flush
+            if self.verbose:
+                print(f'An error occurred: {e}')
+
+    def end_of_stream(self) -> None:
+        """The current reply is complete"""
+        self.jitter.end_of_stream()
+
+    def flush(self):
+        # discard everything queued for playback, e.g. when the user interrupts
+        with self.lock:
+            self.jitter.flush()
+            decoder, self.decoder = self.decoder, None
+        if decoder is not None:
+            # 解码器内部还留着旧回复的数据，换一个新的；旧的泵线程读到结尾自行退出。
+            # PyAV 只是新建解码上下文，ffmpeg 才需要重启进程
+            decoder.kill()
+            self._open_decoder()
+        if self.verbose:
+            print('mp3 audio player is flushed')
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "underruns": self.jitter.underruns,
+            "underrun_ms": round(self.jitter.underrun_ms, 1),
+            "target_ms": round(self.jitter.target_ms, 1),
+            "buffered_ms": round(self.jitter.buffered_ms, 1),
+        }
+
+    def stop(self):
+        self._close_decoder()
+        if self._stream:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._player:
+            self._player.terminate()
+            self._player = None
+        if self.verbose:
+            print(f'mp3 audio player is stopped, {self.stats}')
@@ -0,0 +1,141 @@
+"""
+Utterance noise filter
+在送给 LLM 之前丢掉明显没有完整语义的识别结果（电视声、语气词、背景人声碎片）
+"""
+import re
+import time
+import logging
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from app.services.voice.tts_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# 单独出现时没有语义的语气词
+FILLER_CHARS = set("嗯啊哦噢呃额唉哎诶欸嘿哈呵嘻呀哇喔唔呐咦")
+
+# 背景节目里常被识别出来的片段
+DEFAULT_BLACKLIST = [
+    "谢谢观看", "感谢观看", "谢谢收看", "欢迎收看", "请订阅", "点赞订阅",
+    "字幕由Amara.org社区提供", "本节目由", "下期再见",
+]
+
+NON_CONTENT = re.compile(r"[^\w]|_", re.UNICODE)
+
+EMPTY, TOO_SHORT, BLACKLISTED, INCOMPLETE = (
+    "empty", "too_short", "blacklisted", "incomplete")
+
+
+class NoiseFilter:
+    """识别结果噪声过滤
+
+    Each final utterance is scored for semantic completeness from cheap
+    signals: how many content characters it has, the share of them that
+    are fillers like "嗯啊", and how repetitive its character bigrams are
+    ("哈哈哈哈", "对对对对"). Utterances on the blacklist are dropped outright.
+    An utterance the LLM labels ``噪声`` ``learn_after`` times is
+    blacklisted too, for ``learn_ttl`` seconds, so a TV jingle costs a
+    couple of LLM calls instead of one per airing, while a command the LLM
+    got wrong once stays reachable.
+
+    Only clear-cut noise is dropped here, anything ambiguous is left for
+    the LLM to classify: a single character is a complete command ("停",
+    "开") unless it is a filler. Counters in ``stats()`` show how many LLM
+    calls were saved and how much noise got past.
+    """
+
+    def __init__(self, min_chars: int = 1, threshold: float = 0.5,
+                 blacklist: Optional[Iterable[str]] = None, max_learned: int = 200,
+                 learn_after: int = 2, learn_ttl: float = 3600,
+                 clock: Callable[[], float] = time.monotonic):
+        self.min_chars = min_chars
+        self.threshold = threshold
+        self.blacklist = {self._content(t) for t in (blacklist if blacklist is not None
+                                                     else DEFAULT_BLACKLIST)}
+        self.max_learned = max_learned
+        self.learn_after = learn_after
+        self.learn_ttl = learn_ttl
+        self.clock = clock
+        # 被 LLM 判为噪声的次数，以及已学会的噪声 -> 过期时间
+        self.labels: "OrderedDict[str, int]" = OrderedDict()
+        self.learned: "OrderedDict[str, float]" = OrderedDict()
+        self.received = 0
+        self.dropped: Counter = Counter()
+        self.llm_noise = 0
+
+    @staticmethod
+    def _content(text: str) -> str:
+        return NON_CONTENT.sub("", normalize_text(text)).lower()
+
+    @staticmethod
+    def completeness(content: str) -> float:
+        """0 for pure fillers or a repeated syllable, 1 for varied content"""
+        if not content:
+            return 0.0
+        fillers = sum(1 for ch in content if ch in FILLER_CHARS) / len(content)
+        bigrams = [content[i:i + 2] for i in range(len(content) - 1)]
+        variety = len(set(bigrams)) / len(bigrams) if len(bigrams) > 1 else 1.0
+        return (1 - fillers) * variety
+
+    def classify(self, text: str) -> Tuple[float, Optional[str]]:
+        """``(score, reason)``, reason is None when the utterance should be kept"""
+        content = self._content(text)
+        if not content:
+            return 0.0, EMPTY
+        if content in self.blacklist or self._is_learned(content):
+            return 0.0, BLACKLISTED
+        score = self.completeness(content)
+        if len(content) < self.min_chars:
+            return score, TOO_SHORT
+        if score < self.threshold:
+            return score, INCOMPLETE
+        return score, None
+
+    def accept(self, text: str) -> bool:
+        self.received += 1
+        score, reason = self.classify(text)
+        if reason is None:
+            return True
+        self.dropped[reason] += 1
+        logger.info(f"Dropped noise ({reason}, {score:.2f}): {text}")
+        return False
+
+    def _is_learned(self, content: str) -> bool:
+        expires_at = self.learned.get(content)
+        if expires_at is None:
+            return False
+        if self.clock() >= expires_at:
+            del self.learned[content]
+            return False
+        return True
+
+    def learn(self, text: str) -> None:
+        """The LLM labelled ``text`` as noise, drop it locally once that repeats"""
+        self.llm_noise += 1
+        content = self._content(text)
+        if not content:
+            return
+        count = self.labels.pop(content, 0) + 1
+        if count < self.learn_after:
+            self.labels[content] = count
+            while len(self.labels) > self.max_learned:
+                self.labels.popitem(last=False)
+            return
+        self.learned[content] = self.clock() + self.learn_ttl
+        self.learned.move_to_end(content)
+        while len(self.learned) > self.max_learned:
+            self.learned.popitem(last=False)
+
+    def stats(self) -> Dict[str, object]:
+        dropped = sum(self.dropped.values())
+        return {
+            "received": self.received,
+            "dropped": dropped,
+            "by_reason": dict(self.dropped),
+            "llm_noise": self.llm_noise,
+            "learned": len(self.learned),
+            # 每个被丢弃的结果都省了一次 LLM 调用
+            "llm_calls_saved": dropped,
+            "drop_rate": round(dropped / self.received, 3) if self.received else 0.0,
+        }
@@ -8,13 +8,17 @@ import signal
 import logging
 import asyncio
 import threading
-from typing import List, AsyncGenerator
+from collections import deque
+from typing import List, AsyncGenerator, Optional
 
 import dashscope
 from dashscope.audio.asr import Recognition, RecognitionResult, RecognitionCallback
 
 from app.config.settings import settings
 from app.services.callback import ChainCallback
+from app.services.voice.asr_pool import RecognitionPool, RecognitionSession
+from app.services.voice.endpoint import StabilityTracker
+from app.services import tracing
 from app.log import get_logger
 
 logger = get_logger(__name__)
@@ -22,12 +26,15 @@ logger = get_logger(__name__)
 dashscope.api_key = settings.ALIYUN_ACCESS_KEY
 dashscope.base_websocket_api_url='wss://dashscope.aliyuncs.com/api-ws/v1/inference'
 
+MODEL = "fun-asr-realtime"
+
 
 class ASRCallbackWrapper(RecognitionCallback):
     """ASR 回调处理"""
 
     def __init__(self, callback: ChainCallback):
         self.callback = callback
+        self.stability = StabilityTracker()
 
     def on_result(self, result) -> None:
         logger.info(f"ASR result: {result}")
@@ -42,55 +49,134 @@ class ASRCallbackWrapper(RecognitionCallback):
         sentence = result.output.sentence
         is_final = sentence['sentence_end']
         text = sentence['text']
-        logger.info(f"STT: {text}, {is_final}")
+        stability = self.stability.update(text, is_final)
+        # 在 SDK 线程里打点，不把排队的时间算进识别
+        trace = self.callback.trace
+        trace.mark(tracing.ASR_FIRST_RESULT)
         if is_final:
-            self.callback.on_text(text, is_final=is_final)
+            trace.mark(tracing.ASR_FINAL, replace=True)
+        logger.info(f"STT: {text}, {is_final}, {stability:.2f}")
+        # 中间结果也转发出去，供提前发起 LLM 请求
+        self.callback.on_text(text, is_final=is_final, stability=stability)
+
+
+def create_recognition(callback) -> Recognition:
+    """A new, unstarted recognizer reporting to ``callback``"""
+    recognition = Recognition(
+        model=MODEL,
+        format="wav",
+        sample_rate=settings.AUDIO_SAMPLE_RATE,
+        semantic_punctuation_enabled=False,
+        callback=ASRCallbackWrapper(callback))
+    recognition.SILENCE_TIMEOUT_S = 10
+    return recognition
+
+
+_shared_pool: Optional[RecognitionPool] = None
+
+
+def get_recognition_pool() -> RecognitionPool:
+    """进程内共享的识别会话池"""
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = RecognitionPool(create_recognition)
+    return _shared_pool
+
+
+async def close_recognition_pool() -> None:
+    """进程退出前关闭预热的识别会话"""
+    if _shared_pool is not None:
+        await _shared_pool.close()
 
 
 class DashscopeSTT:
-    """阿里云 Dashscope 语音识别"""
+    """阿里云 Dashscope 语音识别
 
-    def __init__(self, callback: ChainCallback):
+    Sessions come from a ``RecognitionPool``: ``prewarm`` connects the next
+    one while the current turn is answered, and the first frame of a turn
+    takes it. Frames that arrive while a session is still being started are
+    buffered and sent, in order, as soon as it is ready.
+    """
+
+    # 会话建立期间最多缓存的帧数，100 ms 一帧约 5 秒
+    MAX_PENDING_FRAMES = 50
+
+    def __init__(self, callback: ChainCallback, pool: Optional[RecognitionPool] = None):
         self.sample_rate = settings.AUDIO_SAMPLE_RATE
-        self.model = "fun-asr-realtime"
-        self.callback = ASRCallbackWrapper(callback)
-        self.recognition = Recognition(
-            model=self.model,
-            format="wav",
-            sample_rate=self.sample_rate,
-            semantic_punctuation_enabled=False,
-            callback=self.callback)
-        self.recognition.SILENCE_TIMEOUT_S = 10
-        self.started = False
+        self.model = MODEL
+        self.callback = callback
+        self.pool = pool or get_recognition_pool()
+        self.session: Optional[RecognitionSession] = None
+        self.pending: deque = deque(maxlen=self.MAX_PENDING_FRAMES)
+        self._starting: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self.session is not None
+
+    def prewarm(self):
+        """Get the next session connected in the background"""
+        self.pool.prewarm()
 
     async def start(self):
+        if self.session is not None:
+            return
+        if self._starting is None:
+            self._starting = asyncio.create_task(self._start())
+        await asyncio.wait([self._starting])
+
+    async def _start(self):
         logger.info("Starting ASR recognition...")
-        self.recognition.start()
-        self.started = True
+        try:
+            session = await self.pool.acquire(self.callback)
+        except Exception as e:
+            logger.error(f"ASR start failed: {e}")
+            self.pending.clear()
+            return
+        finally:
+            self._starting = None
+        while self.pending:
+            session.send(self.pending.popleft())
+        self.session = session
+        self.callback.trace.mark(tracing.ASR_READY)
         logger.info("ASR recognition started")
 
     async def ensure_started(self):
-        if not self.started:
-            await self.start()
+        await self.start()
+
+    async def stop(self, wait: bool = True):
+        """End the recognition session
+
+        With ``wait=False`` the session is stopped in the background and its
+        late results are dropped, so a turn does not wait for the teardown.
+        """
+        if self._starting is not None:
+            # 让已缓存的帧先送出去
+            await asyncio.wait([self._starting])
+        session, self.session = self.session, None
+        self.pending.clear()
+        if session is None:
+            return
+        if not wait:
+            self.pool.discard(session)
+            return
+        logger.info("Stopping DashScope recognition...")
+        await self.pool.release(session)
+        logger.info("DashScope recognition stopped")
 
-    async def stop(self):
-        if self.started:
-            logger.info("Stopping DashScope recognition...")
+    async def recognize(self, audio_bytes: bytes, is_final: bool = False):
+        if self.session is None:
+            self.callback.trace.mark(tracing.ASR_FIRST_FRAME)
+            self.pending.append(audio_bytes)
+            if self._starting is None:
+                self._starting = asyncio.create_task(self._start())
+        else:
             try:
-                self.recognition.stop()
+                logger.info(f"Recognize: {len(audio_bytes)}")
+                self.session.send(audio_bytes)
             except Exception as e:
-                logger.warning(f"Error: {e}")
-            self.started = False
-            logger.info("DashScope recognition stopped")
-    async def recognize(self, audio_bytes: bytes, is_final: bool = False):
-        if not self.started:
-            await self.start()
-        try:
-            logger.info(f"Recognize: {len(audio_bytes)}")
-            self.recognition.send_audio_frame(audio_bytes)
-        except Exception as e:
-            logger.warning(f"Error occupied")
-            await self.stop()
+                logger.warning(f"Error sending audio: {e}")
+                await self.stop()
         if is_final:
             await self.stop()
 
@@ -98,7 +184,7 @@ class DashscopeSTT:
         """Generate recognized texts"""
         while True:
             try:
-                text, is_final = await self.callback.callback.text_queue.get()
+                text, is_final, _ = await self.callback.text_queue.get()
                 yield text
                 if is_final:
                     break
@@ -7,11 +7,15 @@ import asyncio
 import base64
 import logging
 import threading
-from typing import Optional, Dict, Any, AsyncGenerator
+from typing import Optional, Dict, Any, AsyncGenerator, Callable, List
 
 import dashscope
-from dashscope.audio.tts_v2 import SpeechSynthesizer, ResultCallback
+from dashscope.audio.tts_v2 import AudioFormat, SpeechSynthesizer, ResultCallback
+from dashscope.common.error import InvalidTask
 from app.services.callback import ChainCallback
+from app.services.voice.tts_cache import TTSCache, get_tts_cache, normalize_text
+from app.services.session import SessionStore
+from app.services import tracing
 from app.config.settings import settings
 from app.log import get_logger
 
@@ -19,46 +23,215 @@ logger = get_logger(__name__)
 
 dashscope.api_key = settings.ALIYUN_ACCESS_KEY
 
+# Opus 有多种码率可选时使用的码率 (kbps)
+OPUS_BITRATE = 32
+
+
+def resolve_audio_format(audio_format: str = "mp3", sample_rate: int = 22050) -> AudioFormat:
+    """Dashscope output format for a client's ``audio_format`` ("mp3", "pcm",
+    "wav" or "opus") at ``sample_rate`` Hz"""
+    matches = [f for f in AudioFormat
+               if f.value[0] == audio_format and f.value[1] == sample_rate]
+    if not matches:
+        raise ValueError(f"Unsupported TTS output: {audio_format} at {sample_rate} Hz")
+    for f in matches:
+        if f.value[3] == OPUS_BITRATE:
+            return f
+    return matches[0]
+
+
 class CallbackWrapper(ResultCallback):
+    """一个合成会话的回调，会话被打断或出错后不再转发任何东西"""
 
     def __init__(self, callback: ChainCallback):
         self.callback = callback
+        # 打断后 SDK 线程可能还会回调，此时丢弃数据
+        self.muted = False
+        # 已经请求结束会话，之后出错也要给出结束标记
+        self.completing = False
+        self.failed = False
+        # 本次合成的音频，完成时以 record_key 存入缓存
+        self.recording: Optional[bytearray] = None
+        self.record_key: Optional[str] = None
+        self.on_recorded: Optional[Callable[[str, bytes], None]] = None
 
     def on_data(self, data: bytes):
-        if data:
+        if data and not self.muted:
+            if self.recording is not None:
+                self.recording += data
+            self.callback.trace.mark(tracing.TTS_FIRST_CHUNK)
             self.callback.on_audio(data, is_final=False)
 
     def on_complete(self):
         logger.info("TTS synthesis complete")
+        recording, self.recording = self.recording, None
+        if self.muted:
+            return
+        if recording and self.record_key and self.on_recorded:
+            self.on_recorded(self.record_key, bytes(recording))
         self.callback.on_audio(b"", is_final=True)
         self.callback.on_audio_complete()
 
+    def on_error(self, message):
+        logger.error(f"TTS error: {message}")
+        self.failed = True
+        self.recording = None
+        if self.completing and not self.muted:
+            # 不会再有 on_complete 了，别让对方一直等播放结束
+            self.callback.on_audio(b"", is_final=True)
+
 class DashscopeTTS:
-    """阿里云 Dashscope 文本转语音"""
+    """阿里云 Dashscope 文本转语音
 
-    def __init__(self, callback: ChainCallback):
+    A ``SpeechSynthesizer`` only runs one streaming session: once it has been
+    completed, further ``streaming_call``s raise ``InvalidTask``. Each session
+    therefore gets a new one from ``synthesizer_factory(callbackwrap)``.
+    """
+
+    # 单次回放时每块的大小
+    REPLAY_CHUNK = 4096
+
+    def __init__(self, callback: ChainCallback,
+                 audio_format: str = "mp3", sample_rate: int = 22050,
+                 cache: Optional[TTSCache] = None, max_cached_chars: int = 40,
+                 store: Optional[SessionStore] = None,
+                 synthesizer_factory: Optional[Callable[[CallbackWrapper], object]] = None):
         self.model = "cosyvoice-v3-flash"
         self.voice = "longanhuan"
+        # 输出格式由客户端决定：本地播放直接要 PCM，浏览器可以要 Opus，省掉转码
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.format = resolve_audio_format(audio_format, sample_rate)
+        self.callback = callback
         self.callbackwrap = CallbackWrapper(callback)
-        self.synthesizer = SpeechSynthesizer(
-            model=self.model,
-            voice=self.voice,
-            callback=self.callbackwrap)
+        self.synthesizer_factory = synthesizer_factory or self.create_synthesizer
+        # 当前合成会话的 synthesizer，会话结束后丢弃
+        self.synthesizer = None
+        self.started = False
+        # 常用短句（确认、"已为您开灯"、报错）直接回放缓存的音频
+        self.cache = cache if cache is not None else get_tts_cache()
+        self.max_cached_chars = max_cached_chars
+        # 共享存储里的音频所有 worker 都能回放
+        self.store = store
+        self._session_text: List[str] = []
 
     async def start(self):
         pass
 
+    def create_synthesizer(self, callback: CallbackWrapper) -> SpeechSynthesizer:
+        return SpeechSynthesizer(
+            model=self.model,
+            voice=self.voice,
+            format=self.format,
+            callback=callback)
+
+    def cache_key(self, text: str) -> Optional[str]:
+        if len(normalize_text(text)) > self.max_cached_chars:
+            return None
+        return TTSCache.key(self.model, self.voice,
+                            f"{self.audio_format}/{self.sample_rate}", text)
+
+    async def replay(self, text: str) -> bool:
+        """Stream cached audio for ``text`` through the callback, if there is any"""
+        key = self.cache_key(text)
+        if key is None:
+            return False
+        audio = await asyncio.to_thread(self.cache.get, key)
+        if audio is None and self.store is not None:
+            audio = await self.store.get_tts(key)
+            if audio is not None:
+                await asyncio.to_thread(self.cache.put, key, audio)
+        if audio is None:
+            return False
+        logger.info(f"TTS cache hit: {text}")
+        trace = self.callback.trace
+        trace.mark(tracing.TTS_FIRST_CHUNK)
+        trace.attributes.setdefault("tts_cache", "hit")
+        for i in range(0, len(audio), self.REPLAY_CHUNK):
+            self.callback.on_audio(audio[i:i + self.REPLAY_CHUNK], is_final=False)
+        return True
+
+    def _on_recorded(self, key: str, audio: bytes) -> None:
+        # SDK 线程里回调
+        self.cache.put(key, audio)
+        loop = self.callback.loop
+        if self.store is not None and loop is not None and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self.store.put_tts(key, audio), loop)
+
+    def _open_session(self) -> None:
+        self.callbackwrap = CallbackWrapper(self.callback)
+        self.callbackwrap.on_recorded = self._on_recorded
+        self.callbackwrap.recording = bytearray()
+        self.synthesizer = self.synthesizer_factory(self.callbackwrap)
+
+    def _drop_session(self):
+        """Forget the current session; whatever it still delivers is discarded"""
+        self.started = False
+        self._session_text = []
+        self.callbackwrap.muted = True
+        synthesizer, self.synthesizer = self.synthesizer, None
+        return synthesizer
+
     async def stop(self):
+        if not self.started:
+            return
+        self.started = False
+        wrapper = self.callbackwrap
+        # 整段合成的文本作为缓存键，单句回复下次即可直接回放
+        wrapper.record_key = self.cache_key("".join(self._session_text))
+        wrapper.completing = True
+        self._session_text = []
+        # 结束后这个 synthesizer 不能再用，SDK 线程收尾期间由它自己持有引用
+        synthesizer, self.synthesizer = self.synthesizer, None
         try:
-            self.synthesizer.async_streaming_complete()
+            await asyncio.to_thread(synthesizer.async_streaming_complete)
         except Exception as e:
             logger.error(f"Error stopping TTS: {e}")
+            # 会话已经失效，不会再有 on_complete
+            self.callback.on_audio(b"", is_final=True)
+
+    async def cancel(self):
+        """Abort the in-flight synthesis and drop any audio still on its way"""
+        # 被取消的 synthesizer 不能再用，下一句话用新的
+        synthesizer = self._drop_session()
+        if synthesizer is None:
+            return
+        try:
+            await asyncio.to_thread(synthesizer.streaming_cancel)
+        except InvalidTask:
+            # 没有正在进行的合成任务
+            pass
+        except Exception as e:
+            logger.error(f"Error cancelling TTS: {e}")
 
     async def synthesize(self, text: str, is_final: bool = False):
         try:
-            logger.info(f"synthesizing text: {text}")
-            self.synthesizer.streaming_call(text=text)
+            if text:
+                self.callback.trace.mark(tracing.TTS_REQUEST)
+            # 合成会话进行中时不能插入缓存音频，否则顺序会乱
+            replayed = bool(text) and not self.started and await self.replay(text)
+            if text and not replayed:
+                logger.info(f"synthesizing text: {text}")
+                if self.started and self.callbackwrap.failed:
+                    # 服务端已经结束了这个会话，后面的句子换一个新的
+                    self._drop_session()
+                if not self.started:
+                    self._open_session()
+                self._session_text.append(text)
+                try:
+                    # streaming_call 会阻塞（首次调用还要建立 WebSocket），放到线程里执行
+                    await asyncio.to_thread(self.synthesizer.streaming_call, text)
+                except Exception as e:
+                    logger.error(f"Dashscope TTS error: {e}")
+                    self._drop_session()
+                else:
+                    self.started = True
             if is_final:
-                await self.stop()
+                if self.started:
+                    await self.stop()
+                else:
+                    # 只有回放的缓存音频，或者合成失败了：不会再有音频，马上结束
+                    self.callback.on_audio(b"", is_final=True)
+                logger.debug(f"TTS cache stats: {self.cache.stats()}")
         except Exception as e:
-            logger.error(f"Dashscope TTS error: {e}")
\ No newline at end of file
+            logger.error(f"Dashscope TTS error: {e}")
@@ -0,0 +1,179 @@
+"""
+Phrase-level TTS audio cache
+按 (模型, 音色, 格式, 规范化文本) 寻址的合成音频缓存：内存 LRU + 磁盘两级
+"""
+import os
+import re
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角、去掉首尾和重复空白，让同一句话得到同一个键"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class TTSCache:
+    """合成音频缓存
+
+    Recently used audio stays in memory up to ``max_memory_bytes``. With a
+    ``directory`` every entry is also written to disk, where the least
+    recently used files are removed once they add up to more than
+    ``max_disk_bytes``. Methods are thread-safe: entries are stored from the
+    Dashscope callback thread. Disk lookups should be made off the event
+    loop.
+    """
+
+    def __init__(self, directory: Optional[str] = None,
+                 max_memory_bytes: int = 8 * 1024 * 1024,
+                 max_disk_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        # 磁盘层总大小，第一次写入时扫描目录得到
+        self._disk_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory:
+            try:
+                os.makedirs(directory, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"TTS disk cache disabled: {e}")
+                self.directory = None
+
+    @staticmethod
+    def key(model: str, voice: str, audio_format: str, text: str) -> str:
+        raw = "\x00".join([model, voice, audio_format, normalize_text(text)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.audio")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return audio
+        audio = self._read_disk(key)
+        with self._lock:
+            if audio is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, key: str, audio: bytes) -> None:
+        if not audio:
+            return
+        with self._lock:
+            self._remember(key, audio)
+        if self.directory:
+            self._write_disk(key, audio)
+
+    def _remember(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            # 用 mtime 记录最近使用时间，淘汰时按它排序
+            os.utime(path)
+            return audio
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"TTS cache read failed: {e}")
+            return None
+
+    def _write_disk(self, key: str, audio: bytes) -> None:
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(audio)
+            os.replace(tmp, path)
+            with self._lock:
+                if self._disk_bytes is None:
+                    self._disk_bytes = self._scan_disk()[1]
+                else:
+                    self._disk_bytes += len(audio)
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._evict_disk()
+        except OSError as e:
+            logger.warning(f"TTS cache write failed: {e}")
+
+    def _scan_disk(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".audio"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        return entries, total
+
+    def _evict_disk(self) -> None:
+        entries, total = self._scan_disk()
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._disk_bytes = total
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+
+_shared_cache: Optional[TTSCache] = None
+
+
+def get_tts_cache() -> TTSCache:
+    """进程内共享的 TTS 缓存，磁盘层放在 ~/.cache/anybot/tts"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = TTSCache(os.path.expanduser("~/.cache/anybot/tts"))
+    return _shared_cache
@@ -0,0 +1,141 @@
+"""
+Voice activity detection
+基于能量的语音活动检测
+"""
+from collections import deque
+from typing import List, Tuple
+
+import numpy
+
+
+def frame_rms(frame: bytes) -> float:
+    """RMS of a 16-bit little-endian PCM frame"""
+    samples = numpy.frombuffer(frame, dtype=numpy.int16)
+    if samples.size == 0:
+        return 0.0
+    return float(numpy.sqrt(numpy.mean(samples.astype(numpy.float32) ** 2)))
+
+
+class BargeInDetector:
+    """播放期间的插话检测
+
+    Reports speech once ``min_frames`` consecutive frames are louder than
+    ``threshold``. The threshold is set above the level of our own playback
+    picked up by the microphone so the assistant does not interrupt itself.
+    """
+
+    def __init__(self, threshold: float = 1500, min_frames: int = 3):
+        self.threshold = threshold
+        self.min_frames = min_frames
+        self._loud_frames = 0
+
+    def reset(self) -> None:
+        self._loud_frames = 0
+
+    def is_speech(self, frame: bytes) -> bool:
+        if frame_rms(frame) > self.threshold:
+            self._loud_frames += 1
+        else:
+            self._loud_frames = 0
+        return self._loud_frames >= self.min_frames
+
+
+def frame_features(frame: bytes) -> Tuple[float, float]:
+    """RMS and zero-crossing rate of a 16-bit PCM frame"""
+    samples = numpy.frombuffer(frame, dtype=numpy.int16)
+    if samples.size < 2:
+        return 0.0, 0.0
+    x = samples.astype(numpy.float32)
+    rms = float(numpy.sqrt(numpy.dot(x, x) / x.size))
+    signs = numpy.signbit(samples)
+    zcr = numpy.count_nonzero(signs[1:] != signs[:-1]) / (samples.size - 1)
+    return rms, float(zcr)
+
+
+class VoiceActivityDetector:
+    """语音活动检测：能量 + 过零率，自适应噪声基底
+
+    A frame is voiced when its RMS is ``ratio`` times above the tracked noise
+    floor (and above ``min_rms``). Frames that are only marginally loud but
+    cross zero more often than ``max_zcr`` look like hiss and are rejected.
+    The floor follows the background level quickly downward and slowly
+    upward, ten times slower while voiced. Speech starts after
+    ``onset_frames`` voiced frames and ends after ``hangover_frames``
+    unvoiced ones; ``process`` also releases the ``preroll_frames`` heard
+    before the onset so word starts are kept, and keeps forwarding
+    ``tail_frames`` after the end of speech. Streaming ASR only closes a
+    sentence after it has heard enough silence (about a second for
+    Dashscope), so without the tail its final result would not come until
+    the next utterance.
+    """
+
+    def __init__(self, ratio: float = 2.0, min_rms: float = 300,
+                 max_zcr: float = 0.35, onset_frames: int = 2,
+                 hangover_frames: int = 3, preroll_frames: int = 3,
+                 tail_frames: int = 12,
+                 rise: float = 0.02, fall: float = 0.2,
+                 initial_floor: float = 100.0):
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.max_zcr = max_zcr
+        self.onset_frames = onset_frames
+        self.hangover_frames = hangover_frames
+        self.tail_frames = tail_frames
+        self.rise = rise
+        self.fall = fall
+        self.preroll: deque = deque(maxlen=preroll_frames + onset_frames - 1)
+        self.noise_floor = initial_floor
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new utterance, keeping the learned noise floor"""
+        self.triggered = False
+        self._voiced = 0
+        self._unvoiced = 0
+        self._tail = 0
+        self.preroll.clear()
+
+    def is_voiced(self, frame: bytes) -> bool:
+        """Frame-level decision, also updating the noise floor"""
+        rms, zcr = frame_features(frame)
+        threshold = max(self.min_rms, self.noise_floor * self.ratio)
+        voiced = rms > threshold and (zcr < self.max_zcr or rms > 2 * threshold)
+        # 语音期间基底只缓慢上升，持续的稳态噪声最终会被吸收
+        if rms < self.noise_floor:
+            rate = self.fall
+        else:
+            rate = self.rise * 0.1 if voiced else self.rise
+        self.noise_floor += rate * (rms - self.noise_floor)
+        return voiced
+
+    def is_speech(self, frame: bytes) -> bool:
+        """Smoothed decision with onset and hangover"""
+        if self.is_voiced(frame):
+            self._voiced += 1
+            self._unvoiced = 0
+            if self._voiced >= self.onset_frames:
+                self.triggered = True
+        else:
+            self._voiced = 0
+            self._unvoiced += 1
+            if self._unvoiced > self.hangover_frames:
+                self.triggered = False
+        return self.triggered
+
+    def process(self, frame: bytes) -> List[bytes]:
+        """Frames to forward to ASR for this input frame"""
+        was_triggered = self.triggered
+        if not self.is_speech(frame):
+            if was_triggered:
+                self._tail = self.tail_frames
+            if self._tail > 0:
+                # 说完之后再送一段静音，ASR 靠它判断句尾；已经送出的帧不进预录
+                self._tail -= 1
+                return [bytes(frame)]
+            self.preroll.append(bytes(frame))
+            return []
+        if was_triggered:
+            return [bytes(frame)]
+        frames = list(self.preroll) + [bytes(frame)]
+        self.preroll.clear()
+        return frames
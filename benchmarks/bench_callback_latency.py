@@ -0,0 +1,86 @@
+"""
+Callback -> collector hand-off latency
+
+Simulates the Dashscope SDK firing ``ChainCallback.on_text`` from its own
+thread and measures how long it takes for the result to reach a collector
+coroutine, comparing the legacy ``get_nowait()`` + ``sleep(0.05)`` polling loop
+with the event-driven ``await queue.get()`` collector. Also counts how often
+each collector wakes up while the session is idle.
+
+    python benchmarks/bench_callback_latency.py --events 200
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.callback import ChainCallback
+
+
+async def polling_collector(queue: asyncio.Queue, received: list, wakeups: list):
+    while True:
+        wakeups[0] += 1
+        try:
+            sent_at = queue.get_nowait()[0]
+        except asyncio.QueueEmpty:
+            await asyncio.sleep(0.05)
+            continue
+        received.append(time.perf_counter() - float(sent_at))
+
+
+async def event_collector(queue: asyncio.Queue, received: list, wakeups: list):
+    while True:
+        sent_at = (await queue.get())[0]
+        wakeups[0] += 1
+        received.append(time.perf_counter() - float(sent_at))
+
+
+def fire_from_sdk_thread(callback: ChainCallback, events: int, interval: float):
+    for _ in range(events):
+        callback.on_text(repr(time.perf_counter()), True)
+        time.sleep(interval)
+
+
+async def run(name: str, collector, events: int, interval: float, idle: float):
+    text_queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+    callback = ChainCallback(text_queue, asyncio.Queue())
+    received: list = []
+    wakeups = [0]
+    task = asyncio.create_task(collector(text_queue, received, wakeups))
+
+    # idle phase: nothing arrives, count wakeups
+    await asyncio.sleep(idle)
+    idle_wakeups = wakeups[0]
+
+    thread = threading.Thread(target=fire_from_sdk_thread, args=(callback, events, interval))
+    thread.start()
+    while len(received) < events:
+        await asyncio.sleep(0.01)
+    thread.join()
+    task.cancel()
+
+    latencies = sorted(x * 1e6 for x in received)
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    print(f"{name:>8}: mean {statistics.mean(latencies):9.1f} us  "
+          f"p50 {p(0.50):9.1f} us  p99 {p(0.99):9.1f} us  "
+          f"idle wakeups/s {idle_wakeups / idle:6.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="ChainCallback hand-off latency")
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.013)
+    parser.add_argument("--idle", type=float, default=1.0)
+    args = parser.parse_args()
+
+    await run("polling", polling_collector, args.events, args.interval, args.idle)
+    await run("event", event_collector, args.events, args.interval, args.idle)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+MP3 decoder backends: time-to-first-sample and CPU cost
+
+Feeds an MP3 stream to each ``RealtimeMp3Player`` decoder backend in
+TTS-sized chunks and measures the time from creating the decoder to the
+first decoded PCM, plus CPU seconds spent per second of decoded audio
+(including the ffmpeg child process).
+
+Without ``--mp3`` a tone is encoded with PyAV, which therefore has to be
+installed for the default run.
+
+    python benchmarks/bench_decoder.py --runs 20
+    python benchmarks/bench_decoder.py --mp3 reply.mp3 --backends ffmpeg
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import resource
+import threading
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.voice.decoder import create_decoder
+
+RATE = 22050
+
+
+def synthetic_mp3(seconds: float) -> bytes:
+    import av
+    import numpy
+
+    buf = io.BytesIO()
+    with av.open(buf, "w", format="mp3") as container:
+        stream = container.add_stream("libmp3lame", rate=RATE, layout="mono")
+        t = numpy.arange(int(seconds * RATE)) / RATE
+        pcm = (numpy.sin(2 * numpy.pi * 220 * t) * 8000).astype(numpy.int16)
+        frame = av.AudioFrame.from_ndarray(pcm.reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = RATE
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buf.getvalue()
+
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_once(backend: str, mp3: bytes, chunk: int):
+    first_sample = []
+    decoded = [0]
+
+    started = time.perf_counter()
+    cpu_started = cpu_seconds()
+    decoder = create_decoder(backend, RATE)
+
+    def drain():
+        while True:
+            pcm = decoder.read(1024)
+            if not pcm:
+                break
+            if not first_sample:
+                first_sample.append(time.perf_counter() - started)
+            decoded[0] += len(pcm)
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+    for i in range(0, len(mp3), chunk):
+        decoder.write(mp3[i:i + chunk])
+    decoder.close()
+    reader.join()
+    decoder.kill()
+    cpu = cpu_seconds() - cpu_started
+    audio_seconds = decoded[0] / 2 / RATE
+    return first_sample[0], cpu / audio_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mp3")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--chunk", type=int, default=1024)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--backends", nargs="*", default=["pyav", "ffmpeg"])
+    args = parser.parse_args()
+
+    if args.mp3:
+        with open(args.mp3, "rb") as f:
+            mp3 = f.read()
+    else:
+        mp3 = synthetic_mp3(args.seconds)
+
+    for backend in args.backends:
+        try:
+            results = [run_once(backend, mp3, args.chunk) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{backend:<7} skipped: {e}")
+            continue
+        ttfs = [r[0] * 1000 for r in results]
+        cpu = [r[1] * 1000 for r in results]
+        print(f"{backend:<7} time-to-first-sample p50={statistics.median(ttfs):7.2f} ms "
+              f"max={max(ttfs):7.2f} ms  cpu={statistics.median(cpu):6.2f} ms per audio second")
+
+
+if __name__ == "__main__":
+    main()
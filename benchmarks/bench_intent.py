@@ -0,0 +1,114 @@
+"""
+Local intent routing coverage, accuracy and cost
+
+Runs ``IntentRouter`` over a corpus of Chinese utterances labelled with the
+command the LLM is expected to emit (or nothing, for chat and anything the
+router should leave alone) and reports how many turns skip the LLM, how
+many of those were routed correctly, and the cost per query. The routed
+share times the LLM time to first token is the latency saved.
+
+The corpus is a text file with one ``utterance<TAB>command`` per line, the
+command empty for non-commands. Without ``--corpus`` a built-in one is used
+against two lights in 客厅 and 卧室 (alias 台灯).
+
+    python benchmarks/bench_intent.py
+    python benchmarks/bench_intent.py --corpus fixtures/commands.tsv --llm-ms 600
+"""
+import os
+import sys
+import time
+import argparse
+from typing import List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.devices.base import BaseDevice
+from app.devices.intent import IntentRouter
+from app.devices.manager import DeviceManager
+
+CORPUS: List[Tuple[str, Optional[str]]] = [
+    ("开灯", "开灯"), ("打开灯", "开灯"), ("把灯打开", "开灯"), ("帮我开一下灯", "开灯"),
+    ("请打开客厅的灯", "开灯"), ("客厅灯打开", "开灯"), ("打开台灯", "开灯"),
+    ("把卧室的灯开了吧", "开灯"), ("麻烦把灯都打开", "开灯"), ("点亮客厅灯", "开灯"),
+    ("开一下台灯。", "开灯"), ("灯开一下", "开灯"),
+    ("关灯", "关灯"), ("关掉灯", "关灯"), ("把灯关了", "关灯"), ("关闭所有灯", "关灯"),
+    ("帮我把客厅的灯关掉", "关灯"), ("关上台灯", "关灯"), ("卧室灯关一下", "关灯"),
+    ("把全部灯都关了！", "关灯"), ("熄灭客厅灯", "关灯"),
+    ("灯开着吗", "灯状态"), ("客厅灯开着吗？", "灯状态"), ("台灯关了吗", "灯状态"),
+    ("灯的状态", "灯状态"), ("卧室的灯亮着吗", "灯状态"), ("现在灯是开着的吗", "灯状态"),
+    ("今天天气怎么样", None), ("给我讲个笑话", None), ("现在几点了", None),
+    ("不要开灯", None), ("别关灯", None), ("灯为什么不亮", None), ("打开空调", None),
+    ("关闭客厅", None), ("开灯还是关灯好", None), ("灯泡坏了怎么办", None),
+    ("你好", None), ("播放一首歌", None), ("明天早上七点叫我起床", None),
+]
+
+
+class BenchLight(BaseDevice):
+
+    domain = "light"
+    category = "灯"
+
+    def __init__(self, entity_id, area="", aliases=()):
+        super().__init__(client=object())
+        self.entity_id = entity_id
+        self.area = area
+        self.aliases = list(aliases)
+
+    def get_device_id(self):
+        return self.entity_id
+
+
+def load_corpus(path: str) -> List[Tuple[str, Optional[str]]]:
+    corpus = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                query, _, command = line.rstrip("\n").partition("\t")
+                corpus.append((query, command.strip() or None))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--llm-ms", type=float, default=500,
+                        help="LLM time to first token that a routed turn saves")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else CORPUS
+    manager = DeviceManager()
+    manager.register(BenchLight("light.living_room", area="客厅"))
+    manager.register(BenchLight("light.bedroom", area="卧室", aliases=["台灯"]))
+    router = IntentRouter.from_prompt(manager)
+
+    routed = correct = false_routes = 0
+    commands = sum(1 for _, expected in corpus if expected)
+    for query, expected in corpus:
+        intent = router.match(query)
+        if intent is None:
+            if expected:
+                print(f"  missed   {query} (expected {expected})")
+            continue
+        routed += 1
+        if intent.command == expected:
+            correct += 1
+        else:
+            false_routes += 1
+            print(f"  WRONG    {query} -> {intent.command} (expected {expected})")
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for query, _ in corpus:
+            router.match(query)
+    cost = (time.perf_counter() - started) / (args.repeat * len(corpus))
+
+    print(f"{len(corpus)} utterances, {commands} commands")
+    print(f"routed={routed / len(corpus):6.1%} of all, {routed / max(commands, 1):6.1%} of commands")
+    print(f"accuracy={correct / max(routed, 1):6.1%} false_routes={false_routes}")
+    print(f"cost={cost * 1e6:6.1f} us/query vs {args.llm_ms:.0f} ms LLM, "
+          f"saves {routed / len(corpus) * args.llm_ms:.0f} ms per turn on average")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+LLM streaming: blocking OpenAI client vs AsyncOpenAI
+
+Starts a local fake OpenAI-compatible server that streams a canned answer
+token by token, then runs several concurrent sessions through the legacy
+synchronous path and through ``OpenAILLM.agenerate``. Reports time-to-first-
+token per session and how long the event loop was stalled while streaming.
+
+    python benchmarks/bench_llm_stream.py --sessions 4 --tokens 30
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+
+from aiohttp import web
+from openai import OpenAI, AsyncOpenAI
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.chat.llm import OpenAILLM
+
+ANSWER = "问答|今天天气晴朗，温度适宜，适合出门散步。"
+
+
+def run_fake_server(port: int, tokens: int, first_delay: float, token_delay: float,
+                    ready: threading.Event):
+    async def completions(request: web.Request):
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        await asyncio.sleep(first_delay)
+        for i in range(tokens):
+            chunk = {
+                "id": "chatcmpl-bench", "object": "chat.completion.chunk",
+                "created": 0, "model": "bench",
+                "choices": [{"index": 0, "delta": {"content": ANSWER[i % len(ANSWER)]},
+                             "finish_reason": None}],
+            }
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(token_delay)
+        await resp.write(b"data: [DONE]\n\n")
+        return resp
+
+    async def serve():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", completions)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+async def legacy_agenerate(client: OpenAI, q: str):
+    """Previous OpenAILLM.agenerate: blocking stream inside an async generator"""
+    response = client.chat.completions.create(
+        model="bench", messages=[{"role": "user", "content": q}], stream=True)
+    for chunk in response:
+        content = chunk.choices[0].delta.content
+        if content is None:
+            continue
+        yield content
+
+
+async def loop_monitor(stop: asyncio.Event, stalls: list, tick: float = 0.005):
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(tick)
+        stalls.append(max(0.0, time.perf_counter() - t - tick))
+
+
+async def session(agen) -> float:
+    start = time.perf_counter()
+    ttft = None
+    async for _ in agen:
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft
+
+
+async def run(name: str, make_agen, sessions: int):
+    stop = asyncio.Event()
+    stalls: list = []
+    monitor = asyncio.create_task(loop_monitor(stop, stalls))
+    start = time.perf_counter()
+    ttfts = await asyncio.gather(*[session(make_agen(i)) for i in range(sessions)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    print(f"{name:>8}: ttft mean {statistics.mean(ttfts) * 1000:7.1f} ms  "
+          f"max {max(ttfts) * 1000:7.1f} ms  wall {elapsed * 1000:7.1f} ms  "
+          f"loop stall max {max(stalls) * 1000:7.1f} ms  total {sum(stalls) * 1000:7.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="LLM streaming benchmark")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--tokens", type=int, default=30)
+    parser.add_argument("--first-delay", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    ready = threading.Event()
+    threading.Thread(
+        target=run_fake_server,
+        args=(args.port, args.tokens, args.first_delay, args.token_delay, ready),
+        daemon=True).start()
+    ready.wait()
+    base_url = f"http://127.0.0.1:{args.port}/v1"
+
+    sync_client = OpenAI(base_url=base_url, api_key="bench")
+    await run("legacy", lambda i: legacy_agenerate(sync_client, f"q{i}"), args.sessions)
+
+    llm = OpenAILLM(None, client=AsyncOpenAI(base_url=base_url, api_key="bench"))
+    await run("async", lambda i: llm.agenerate(f"q{i}", model="bench"), args.sessions)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""
+Cost of turn latency tracing
+
+Times the calls that sit on the audio path (a stage mark that is already
+set, a replaced mark, a mark with no turn open) against a 100 ms audio
+frame, and the per-turn work done when a turn finishes. Marks cost well
+under a microsecond; ``finish`` runs once per turn.
+
+    python benchmarks/bench_tracing.py
+    python benchmarks/bench_tracing.py --iterations 1000000
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import tracing
+from app.services.tracing import NULL_TRACE, LatencyTracer
+
+# 16 kHz 单声道一帧 100 ms
+FRAME_MS = 100
+
+
+def bench(label: str, fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    ns = (time.perf_counter() - started) / iterations * 1e9
+    print(f"{label:<28} {ns:8.0f} ns  {ns / (FRAME_MS * 1e6) * 100:.5f}% of a frame")
+    return ns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    tracer = LatencyTracer()
+    trace = tracer.begin("bench")
+    trace.mark(tracing.TTS_FIRST_CHUNK)
+    bench("mark (already set)", lambda: trace.mark(tracing.TTS_FIRST_CHUNK), args.iterations)
+    bench("mark (replace)", lambda: trace.mark(tracing.ASR_FINAL, replace=True), args.iterations)
+    bench("mark (no turn open)", lambda: NULL_TRACE.mark(tracing.TTS_FIRST_CHUNK), args.iterations)
+
+    def turn():
+        trace = tracer.begin("bench")
+        for stage in (tracing.ASR_FIRST_RESULT, tracing.ASR_FINAL, tracing.ENDPOINT,
+                      tracing.TURN_START, tracing.LLM_REQUEST, tracing.LLM_FIRST_TOKEN,
+                      tracing.TTS_REQUEST, tracing.TTS_FIRST_CHUNK, tracing.FIRST_AUDIO,
+                      tracing.CLIENT_AUDIO):
+            trace.mark(stage)
+        tracer.finish(trace)
+
+    bench("whole turn incl. finish", turn, args.iterations // 10)
+    started = time.perf_counter()
+    tracer.stats()
+    print(f"{'stats() over history':<28} {(time.perf_counter() - started) * 1e6:8.0f} us")
+
+
+if __name__ == "__main__":
+    main()
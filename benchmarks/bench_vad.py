@@ -0,0 +1,128 @@
+"""
+Voice activity detection accuracy and per-frame cost
+
+Runs ``VoiceActivityDetector`` over 16 kHz mono 16-bit WAV fixtures with
+speech labels and reports frame accuracy, precision/recall, how many frames
+would be uploaded to ASR, and the cost per frame. The fixed RMS gate the
+local client used to have is measured alongside.
+
+Labels are a text file next to the WAV (``foo.wav`` -> ``foo.txt``) with one
+``start end`` pair in seconds per speech segment. Without ``--wav`` a
+synthetic fixture is generated: voiced syllables over a noise floor that
+rises halfway through, plus a burst of hiss.
+
+No recorded fixtures ship with the repository, so by default only the
+synthetic signal is measured. Harmonic tones over Gaussian noise are far
+easier than real speech in a real room (fricatives, TV, reverb), so those
+numbers compare the two gates but say little about absolute accuracy;
+report results from recorded fixtures wherever accuracy matters.
+
+    python benchmarks/bench_vad.py
+    python benchmarks/bench_vad.py --wav fixtures/kitchen.wav fixtures/tv.wav
+"""
+import os
+import sys
+import time
+import wave
+import argparse
+from typing import List, Tuple
+
+import numpy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.voice.vad import VoiceActivityDetector, frame_rms
+
+SAMPLE_RATE = 16000
+
+
+def load_fixture(path: str) -> Tuple[numpy.ndarray, List[Tuple[float, float]]]:
+    with wave.open(path, "rb") as f:
+        assert f.getframerate() == SAMPLE_RATE and f.getnchannels() == 1 \
+            and f.getsampwidth() == 2, f"{path}: expected 16 kHz mono 16-bit PCM"
+        samples = numpy.frombuffer(f.readframes(f.getnframes()), dtype=numpy.int16)
+    segments = []
+    with open(os.path.splitext(path)[0] + ".txt") as f:
+        for line in f:
+            if line.strip():
+                start, end = line.split()[:2]
+                segments.append((float(start), float(end)))
+    return samples, segments
+
+
+def synthetic_fixture(seconds: float = 60, seed: int = 0):
+    rng = numpy.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    t = numpy.arange(n) / SAMPLE_RATE
+    # 背景噪声，后半段换成高于固定门限的风扇声
+    noise_level = numpy.where(t < seconds / 2, 60.0, 450.0)
+    audio = rng.normal(0, 1, n) * noise_level
+    # 一段较响的嘶声（高过零率）
+    hiss = (t > seconds * 0.4) & (t < seconds * 0.45)
+    audio[hiss] += rng.normal(0, 1, hiss.sum()) * 600
+
+    segments = []
+    start = 1.0
+    while start < seconds - 3:
+        length = rng.uniform(0.8, 2.5)
+        f0 = rng.uniform(100, 250)
+        mask = (t >= start) & (t < start + length)
+        ts = t[mask] - start
+        voiced = sum(numpy.sin(2 * numpy.pi * f0 * k * ts) / k for k in range(1, 8))
+        syllables = 0.55 + 0.45 * numpy.sin(2 * numpy.pi * rng.uniform(3, 5) * ts) ** 2
+        audio[mask] += voiced * syllables * rng.uniform(1500, 5000)
+        segments.append((start, start + length))
+        start += length + rng.uniform(0.8, 3.0)
+
+    audio = numpy.clip(audio, -32768, 32767).astype(numpy.int16)
+    return audio, segments
+
+
+def frame_labels(n_frames: int, frame_samples: int, segments) -> numpy.ndarray:
+    centers = (numpy.arange(n_frames) + 0.5) * frame_samples / SAMPLE_RATE
+    labels = numpy.zeros(n_frames, dtype=bool)
+    for start, end in segments:
+        labels |= (centers >= start) & (centers < end)
+    return labels
+
+
+def evaluate(name: str, decide, frames: List[bytes], labels: numpy.ndarray):
+    started = time.perf_counter()
+    decisions = numpy.array([decide(frame) for frame in frames], dtype=bool)
+    elapsed = time.perf_counter() - started
+    tp = numpy.count_nonzero(decisions & labels)
+    precision = tp / max(1, numpy.count_nonzero(decisions))
+    recall = tp / max(1, numpy.count_nonzero(labels))
+    accuracy = numpy.count_nonzero(decisions == labels) / len(labels)
+    print(f"{name:<14} accuracy={accuracy:6.1%} precision={precision:6.1%} "
+          f"recall={recall:6.1%} uploaded={decisions.mean():6.1%} "
+          f"cost={elapsed / len(frames) * 1e6:6.1f} us/frame")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--wav", nargs="*", default=[])
+    parser.add_argument("--frame-ms", type=int, default=100)
+    parser.add_argument("--rms-threshold", type=float, default=300)
+    args = parser.parse_args()
+
+    fixtures = [(path, *load_fixture(path)) for path in args.wav] \
+        or [("synthetic", *synthetic_fixture())]
+    frame_samples = SAMPLE_RATE * args.frame_ms // 1000
+
+    for name, audio, segments in fixtures:
+        n_frames = len(audio) // frame_samples
+        frames = [audio[i * frame_samples:(i + 1) * frame_samples].tobytes()
+                  for i in range(n_frames)]
+        labels = frame_labels(n_frames, frame_samples, segments)
+        print(f"{name}: {n_frames} frames of {args.frame_ms} ms, "
+              f"{labels.mean():.1%} speech")
+        if name == "synthetic":
+            print("  synthetic signal, not a recording: use --wav for real accuracy figures")
+        evaluate("fixed rms", lambda f: frame_rms(f) > args.rms_threshold, frames, labels)
+        evaluate("vad", VoiceActivityDetector(min_rms=args.rms_threshold).is_speech,
+                 frames, labels)
+
+
+if __name__ == "__main__":
+    main()
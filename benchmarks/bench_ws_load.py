@@ -0,0 +1,172 @@
+"""
+WebSocket chat load test
+
+Serves the chat WebSocket route from one uvicorn worker with stubbed
+STT/LLM/TTS backends. Drives hundreds of simulated browser clients against
+it, each streaming PCM frames and waiting for its answer. Reports per-turn
+latencies and how many sessions completed.
+
+    python benchmarks/bench_ws_load.py --clients 300
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+
+import numpy
+import uvicorn
+import websockets
+from fastapi import FastAPI
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.v1.endpoints import chat
+from app.services.chain import BotChain
+
+FRAME = (numpy.sin(numpy.arange(1600) / 5) * 8000).astype(numpy.int16).tobytes()
+FRAMES_PER_UTTERANCE = 10
+
+
+class StubSTT:
+    """Emits a final sentence after a fixed number of frames"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.frames = 0
+
+    async def recognize(self, audio_bytes, is_final=False):
+        self.frames += 1
+        if self.frames % FRAMES_PER_UTTERANCE == 0:
+            self.callback.on_text("今天天气怎么样", True)
+
+    def prewarm(self):
+        pass
+
+    async def stop(self, wait=True):
+        pass
+
+
+class StubLLM:
+    """Streams a canned answer with a fixed first-token and per-token delay"""
+
+    def remember(self, q, reply):
+        pass
+
+    async def agenerate(self, q, **kwargs):
+        await asyncio.sleep(0.2)
+        for token in ["问答|", "今天", "天气", "晴朗，", "温度", "适宜。", "适合", "出门", "散步。"]:
+            await asyncio.sleep(0.02)
+            yield token
+
+    async def cancel(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class StubTTS:
+    """Returns 4 KB of audio per segment after 50 ms"""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    async def synthesize(self, text, is_final=False):
+        if text:
+            await asyncio.sleep(0.05)
+            self.callback.on_audio(b"\x00" * 4096, is_final=False)
+        if is_final:
+            self.callback.on_audio(b"", is_final=True)
+
+    async def cancel(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+def stub_chain(client):
+    chain = BotChain(client, silence_timeout=0.3)
+    chain.stt = StubSTT(chain.callback)
+    chain.llm = StubLLM()
+    chain.tts = StubTTS(chain.callback)
+    return chain
+
+
+def serve(port: int) -> uvicorn.Server:
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.dependency_overrides[chat.get_chain_factory] = lambda: stub_chain
+    server = uvicorn.Server(uvicorn.Config(
+        app, host="127.0.0.1", port=port, log_level="warning", ws_max_queue=64))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def simulated_client(port: int, index: int, frame_interval: float) -> dict:
+    url = f"ws://127.0.0.1:{port}/api/v1/ws/chat/client_{index}"
+    async with websockets.connect(url, max_size=None) as ws:
+        for _ in range(FRAMES_PER_UTTERANCE):
+            await ws.send(FRAME)
+            await asyncio.sleep(frame_interval)
+        spoke_at = time.perf_counter()
+        result = {}
+        async for message in ws:
+            now = time.perf_counter() - spoke_at
+            if isinstance(message, bytes):
+                result.setdefault("first_audio", now)
+                continue
+            event = json.loads(message)
+            if event["type"] == "sentence_complete":
+                result["endpoint"] = now
+            elif event["type"] == "turn_done":
+                result["turn_done"] = now
+                return result
+    return result
+
+
+def summary(name: str, values: list) -> str:
+    values = sorted(values)
+    p = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+    return f"{name:>12}: p50 {p(0.5):7.1f} ms  p95 {p(0.95):7.1f} ms  max {values[-1] * 1000:7.1f} ms"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="WebSocket chat load test")
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--frame-interval", type=float, default=0.1)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    server = serve(args.port)
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *[asyncio.wait_for(simulated_client(args.port, i, args.frame_interval), args.timeout)
+          for i in range(args.clients)],
+        return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    done = [r for r in results if isinstance(r, dict) and "turn_done" in r]
+    failed = len(results) - len(done)
+    print(f"{args.clients} clients, {len(done)} completed, {failed} failed, wall {elapsed:.1f} s")
+    if done:
+        print(summary("endpoint", [r["endpoint"] for r in done]))
+        print(summary("first audio", [r["first_audio"] for r in done if "first_audio" in r]))
+        print(summary("turn done", [r["turn_done"] for r in done]))
+    # 服务端在连接关闭后才清理会话
+    for _ in range(50):
+        if not chat.sessions:
+            break
+        await asyncio.sleep(0.1)
+    print(f"active sessions after run: {len(chat.sessions)}")
+    server.should_exit = True
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,182 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.client.base import BaseClient
+from app.schemas import Message
+from app.services import tracing
+from app.services.chain import BotChain
+
+
+class RecordingClient(BaseClient):
+    """Records what the chain sends; audio frames are fed through ``frames``"""
+
+    def __init__(self):
+        self.messages = []
+        self.frames: asyncio.Queue = asyncio.Queue()
+        self.flushed = 0
+
+    async def stt_input(self):
+        while True:
+            yield await self.frames.get()
+
+    async def llm_output(self, message: Message):
+        self.messages.append(message)
+        if message.data.audio_chunk:
+            self.trace.mark(tracing.CLIENT_AUDIO)
+
+    async def flush(self):
+        self.flushed += 1
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class FakeSTT:
+
+    def __init__(self):
+        self.frames = []
+
+    async def recognize(self, audio_bytes, is_final=False):
+        self.frames.append(audio_bytes)
+
+    def prewarm(self):
+        pass
+
+    async def stop(self, wait=True):
+        pass
+
+
+class FakeLLM:
+    """Streams ``tokens`` with a fixed delay between them"""
+
+    def __init__(self, tokens, delay=0.02):
+        self.tokens = tokens
+        self.delay = delay
+        self.finished = False
+        self.cancelled = False
+
+    async def agenerate(self, q, **kwargs):
+        for token in self.tokens:
+            await asyncio.sleep(self.delay)
+            yield token
+        self.finished = True
+
+    async def cancel(self):
+        self.cancelled = True
+
+    def remember(self, q, reply):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class UnusedLLM:
+
+    def remember(self, q, reply):
+        pass
+
+    async def agenerate(self, q, **kwargs):
+        raise AssertionError("the LLM should not be called")
+        yield
+
+    async def cancel(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class FakeTTS:
+    """Plays every segment back as its UTF-8 bytes"""
+
+    def __init__(self, callback, llm=None):
+        self.callback = callback
+        self.llm = llm
+        self.segments = []
+        self.audio_before_llm_done = False
+        self.cancelled = False
+
+    async def synthesize(self, text, is_final=False):
+        if text:
+            self.segments.append(text)
+            if self.llm is not None and not self.llm.finished:
+                self.audio_before_llm_done = True
+            self.callback.on_audio(text.encode(), is_final=False)
+        if is_final:
+            self.callback.on_audio(b"", is_final=True)
+
+    async def cancel(self):
+        self.cancelled = True
+
+    async def stop(self):
+        pass
+
+
+class FakeSynthesizer:
+    """Plays back ``text * 2`` as audio and completes from a worker thread, like the SDK"""
+
+    def __init__(self, wrapper, calls=None):
+        self.wrapper = wrapper
+        self.calls = calls if calls is not None else []
+
+    def streaming_call(self, text):
+        self.calls.append(text)
+        self.wrapper.on_data(text.encode() * 2)
+
+    def async_streaming_complete(self):
+        thread = threading.Thread(target=self.wrapper.on_complete)
+        thread.start()
+        thread.join()
+
+
+async def speak_segments(tts, queue, *segments):
+    """Synthesize ``segments`` as one answer and collect its audio"""
+    for segment in segments:
+        await tts.synthesize(segment)
+    await tts.synthesize("", is_final=True)
+    audio = b""
+    while True:
+        chunk, is_final = await asyncio.wait_for(queue.get(), 1)
+        if is_final:
+            return audio
+        audio += chunk
+
+
+@pytest.fixture
+def synthesizer_calls():
+    """Texts sent to every ``FakeSynthesizer`` made by ``synthesizer_factory``"""
+    return []
+
+
+@pytest.fixture
+def synthesizer_factory(synthesizer_calls):
+    """``synthesizer_factory`` for DashscopeTTS that never touches the network"""
+    return lambda wrapper: FakeSynthesizer(wrapper, synthesizer_calls)
+
+
+@pytest.fixture
+def speak():
+    return speak_segments
+
+
+@pytest.fixture
+def make_chain():
+    """``make_chain(tokens=None, **kwargs) -> (chain, client)``
+
+    A BotChain on fake STT, LLM and TTS. The LLM streams ``tokens``; without
+    them any LLM call fails the test.
+    """
+    def make(tokens=None, **kwargs):
+        client = RecordingClient()
+        chain = BotChain(client, **kwargs)
+        chain.stt = FakeSTT()
+        chain.llm = UnusedLLM() if tokens is None else FakeLLM(tokens)
+        chain.tts = FakeTTS(chain.callback, None if tokens is None else chain.llm)
+        return chain, client
+    return make
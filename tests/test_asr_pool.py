@@ -0,0 +1,129 @@
+import time
+import asyncio
+
+from app.services.callback import ChainCallback
+from app.services.voice.asr_pool import RecognitionPool
+from app.services.voice.stt import DashscopeSTT
+
+
+class FakeRecognition:
+    """Blocking start() like the SDK, records what it is sent"""
+
+    instances = []
+
+    def __init__(self, callback, start_delay=0.05):
+        self.callback = callback
+        self.start_delay = start_delay
+        self.frames = []
+        self.started = self.stopped = False
+        FakeRecognition.instances.append(self)
+
+    def start(self):
+        time.sleep(self.start_delay)
+        self.started = True
+
+    def send_audio_frame(self, frame):
+        assert self.started and not self.stopped
+        self.frames.append(frame)
+        self.callback.on_text(frame.decode(), is_final=True)
+
+    def stop(self):
+        self.stopped = True
+
+
+def make_callback():
+    return ChainCallback(asyncio.Queue(), asyncio.Queue())
+
+
+async def test_frames_buffered_during_start_up():
+    """Nothing is dropped or reordered while the session connects"""
+    pool = RecognitionPool(FakeRecognition)
+    stt = DashscopeSTT(make_callback(), pool=pool)
+    for i in range(5):
+        await stt.recognize(f"f{i}".encode())
+    assert not stt.started
+    await stt.start()
+    await stt.recognize(b"f5")
+    recognition = stt.session.recognition
+    assert recognition.frames == [f"f{i}".encode() for i in range(6)]
+    await stt.stop()
+    assert recognition.stopped
+
+
+async def test_prewarmed_session_removes_start_latency():
+    pool = RecognitionPool(FakeRecognition)
+    stt = DashscopeSTT(make_callback(), pool=pool)
+    stt.prewarm()
+    await asyncio.sleep(0.1)
+    started = time.monotonic()
+    await stt.start()
+    assert time.monotonic() - started < 0.02
+    stats = pool.stats()
+    assert (stats["warm_hits"], stats["cold_starts"]) == (1, 0)
+    assert stats["start_ms_p50"] >= 50
+    assert stats["wait_ms_max"] < 20
+
+
+async def test_pool_shared_across_chains():
+    """A session warmed by one chain reports to whichever chain takes it"""
+    pool = RecognitionPool(FakeRecognition)
+    first, second = make_callback(), make_callback()
+    pool.prewarm()
+    await asyncio.sleep(0.1)
+    stt = DashscopeSTT(second, pool=pool)
+    await stt.recognize(b"hello")
+    await stt.start()
+    assert second.text_queue.get_nowait() == ("hello", True, 1.0)
+    assert first.text_queue.empty()
+
+
+async def test_idle_sessions_expire():
+    pool = RecognitionPool(FakeRecognition, max_idle=0.05)
+    pool.prewarm()
+    await asyncio.sleep(0.15)
+    session = await pool.acquire(make_callback())
+    stats = pool.stats()
+    assert (stats["expired"], stats["cold_starts"]) == (1, 1)
+    assert session.recognition.started
+
+
+class SlowStopRecognition(FakeRecognition):
+    """stop() blocks while the server flushes its last results"""
+
+    def stop(self):
+        time.sleep(0.2)
+        self.callback.on_text("迟到的结果", is_final=True)
+        self.stopped = True
+
+
+async def test_turn_does_not_wait_for_session_teardown():
+    callback = make_callback()
+    pool = RecognitionPool(SlowStopRecognition)
+    stt = DashscopeSTT(callback, pool=pool)
+    await stt.recognize(b"hello")
+    await stt.start()
+    callback.text_queue.get_nowait()
+    recognition = stt.session.recognition
+
+    started = time.monotonic()
+    await stt.stop(wait=False)
+    assert time.monotonic() - started < 0.05
+    assert not stt.started
+    await asyncio.sleep(0.3)
+    assert recognition.stopped
+    # 旧会话的迟到结果不会变成下一句话
+    assert callback.text_queue.empty()
+
+
+async def test_close_stops_warm_sessions():
+    FakeRecognition.instances = []
+    pool = RecognitionPool(FakeRecognition, size=2)
+    pool.prewarm()
+    await asyncio.sleep(0.01)
+    # 一个还在连接中也要在连上后关掉
+    await pool.close()
+    assert len(FakeRecognition.instances) == 2
+    assert all(r.started and r.stopped for r in FakeRecognition.instances)
+    assert not pool.ready
+    pool.prewarm()
+    assert not pool._warming
@@ -0,0 +1,23 @@
+import pytest
+from dashscope.audio.tts_v2 import AudioFormat
+
+from app.services.voice.decoder import create_decoder
+from app.services.voice.tts import resolve_audio_format
+
+
+def test_resolve_audio_format():
+    assert resolve_audio_format() == AudioFormat.MP3_22050HZ_MONO_256KBPS
+    assert resolve_audio_format("pcm", 24000) == AudioFormat.PCM_24000HZ_MONO_16BIT
+    assert resolve_audio_format("opus", 48000) == AudioFormat.OGG_OPUS_48KHZ_MONO_32KBPS
+    with pytest.raises(ValueError):
+        resolve_audio_format("opus", 22050)
+
+
+def test_pcm_passthrough_keeps_whole_samples():
+    decoder = create_decoder("pcm")
+    decoder.write(b"\x01\x02\x03")
+    decoder.write(b"\x04\x05")
+    decoder.close()
+    assert decoder.read() == b"\x01\x02"
+    assert decoder.read() == b"\x03\x04"
+    assert decoder.read() == b""
@@ -0,0 +1,29 @@
+import asyncio
+import threading
+
+from app.services.callback import ChainCallback
+
+
+async def test_on_text_from_sdk_thread():
+    """Results fired from an SDK thread wake an awaiting collector"""
+    text_queue = asyncio.Queue()
+    callback = ChainCallback(text_queue, asyncio.Queue())
+
+    thread = threading.Thread(target=callback.on_text, args=("打开客厅灯", True))
+    thread.start()
+    text, is_final, stability = await asyncio.wait_for(text_queue.get(), timeout=1)
+    thread.join()
+    assert text == "打开客厅灯"
+    assert is_final is True
+    assert stability == 1.0
+
+
+async def test_on_audio_queue_full_drops_chunk():
+    """A full audio queue drops the chunk instead of raising"""
+    audio_queue = asyncio.Queue(maxsize=1)
+    callback = ChainCallback(asyncio.Queue(), audio_queue)
+
+    callback.on_audio(b"\x00", is_final=False)
+    callback.on_audio(b"\x01", is_final=False)
+    assert audio_queue.qsize() == 1
+    assert audio_queue.get_nowait() == (b"\x00", False)
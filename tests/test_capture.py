@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.client.capture import MicrophoneCapture, RingBuffer
+
+
+def test_ring_buffer_wraps_contiguously():
+    ring = RingBuffer(10)
+    ring.write(b"abcdefgh")
+    ring.write(b"ijklmn")
+    assert ring.written == 14
+    frame = ring.read(6, 6)
+    assert bytes(frame) == b"ghijkl"
+    assert frame.obj is ring._buf
+    with pytest.raises(IndexError):
+        ring.read(2, 4)
+    with pytest.raises(IndexError):
+        ring.read(10, 6)
+
+
+def test_ring_buffer_keeps_tail_of_oversized_write():
+    ring = RingBuffer(4)
+    ring.write(b"0123456789")
+    assert ring.written == 10
+    assert bytes(ring.read(6, 4)) == b"6789"
+
+
+def feed(capture, chunks):
+    """Write from a foreign thread the way the PortAudio callback does"""
+    def run():
+        for chunk in chunks:
+            capture._on_audio(chunk, len(chunk) // 2, None, 0)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+async def test_readers_get_frames_from_capture_thread():
+    capture = MicrophoneCapture(rate=1000, buffer_seconds=1.0)
+    capture._loop = asyncio.get_running_loop()
+    speech = capture.reader(frame_bytes=300)
+    wake = capture.reader(frame_bytes=64)
+
+    chunks = [bytes([i]) * 100 for i in range(9)]
+    feed(capture, chunks).join()
+
+    frames = [bytes(await speech.read()) for _ in range(3)]
+    assert b"".join(frames) == b"".join(chunks)
+    assert len(await wake.read()) == 64
+    assert speech.overruns == 0
+
+
+async def test_slow_reader_skips_to_latest_frame():
+    capture = MicrophoneCapture(rate=100, buffer_seconds=1.0)
+    capture._loop = asyncio.get_running_loop()
+    reader = capture.reader(frame_bytes=50)
+
+    feed(capture, [bytes([i]) * 50 for i in range(10)]).join()
+    assert bytes(await reader.read()) == bytes([9]) * 50
+    assert reader.overruns == 1
+
+
+async def test_read_waits_for_data_and_ends_on_stop():
+    capture = MicrophoneCapture(rate=1000, buffer_seconds=1.0)
+    capture._loop = asyncio.get_running_loop()
+    reader = capture.reader(frame_bytes=100)
+
+    pending = asyncio.ensure_future(reader.read())
+    await asyncio.sleep(0.01)
+    assert not pending.done()
+    feed(capture, [b"\x01" * 60, b"\x02" * 60]).join()
+    assert bytes(await asyncio.wait_for(pending, 1)) == b"\x01" * 60 + b"\x02" * 40
+
+    capture.stop()
+    assert [frame async for frame in reader] == []
@@ -0,0 +1,71 @@
+import io
+import threading
+
+import numpy
+import pytest
+
+av = pytest.importorskip("av")
+
+from app.services.voice.decoder import PyAVDecoder, create_decoder
+
+RATE = 22050
+
+
+def encode_mp3(seconds=1.0):
+    buf = io.BytesIO()
+    with av.open(buf, "w", format="mp3") as container:
+        stream = container.add_stream("libmp3lame", rate=RATE, layout="mono")
+        t = numpy.arange(int(seconds * RATE)) / RATE
+        pcm = (numpy.sin(2 * numpy.pi * 440 * t) * 8000).astype(numpy.int16)
+        frame = av.AudioFrame.from_ndarray(pcm.reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = RATE
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buf.getvalue()
+
+
+def test_pyav_decodes_chunked_stream():
+    mp3 = encode_mp3(1.0)
+    decoder = create_decoder("pyav", RATE)
+    assert isinstance(decoder, PyAVDecoder)
+
+    for i in range(0, len(mp3), 700):
+        decoder.write(mp3[i:i + 700])
+    decoder.close()
+
+    pcm = b""
+    while True:
+        chunk = decoder.read()
+        if not chunk:
+            break
+        pcm += chunk
+    samples = len(pcm) // 2
+    # 编码器前后会补几帧静音
+    assert RATE <= samples < RATE * 1.2
+    assert numpy.abs(numpy.frombuffer(pcm, dtype=numpy.int16)).max() > 4000
+
+
+def test_kill_releases_blocked_reader():
+    decoder = create_decoder("pyav", RATE)
+    chunks = []
+
+    def drain():
+        while True:
+            chunk = decoder.read()
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+    decoder.write(encode_mp3(0.5)[:2000])
+    decoder.kill()
+    reader.join(1)
+    assert not reader.is_alive()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_decoder("gstreamer")
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from app.devices.base import BaseDevice
+from app.devices.dispatcher import CommandDispatcher
+from app.devices.manager import DeviceManager
+from app.schemas import CMD
+
+
+class FakeLight(BaseDevice):
+
+    domain = "light"
+    category = "灯"
+
+    def __init__(self, entity_id, area="", aliases=()):
+        super().__init__(client=object())
+        self.entity_id = entity_id
+        self.area = area
+        self.aliases = list(aliases)
+        self.calls = []
+
+    def get_device_id(self):
+        return self.entity_id
+
+    async def turn_on(self):
+        self.calls.append("turn_on")
+        return True
+
+    async def turn_off(self):
+        self.calls.append("turn_off")
+        return True
+
+    async def get_state(self):
+        self.calls.append("get_state")
+        return "off"
+
+
+def make_manager():
+    manager = DeviceManager()
+    manager.register(FakeLight("light.living_room", area="客厅", aliases=["吊灯"]))
+    manager.register(FakeLight("light.bedroom", area="卧室", aliases=["台灯"]))
+    return manager
+
+
+def test_resolve_by_alias_area_and_category():
+    """Aliases win over areas, and a bare command targets the whole category"""
+    manager = make_manager()
+    assert manager.resolve("灯", "打开台灯") == ["light.bedroom"]
+    assert manager.resolve("灯", "打开客厅的灯") == ["light.living_room"]
+    assert manager.resolve("灯", "把所有灯都关了") == ["light.bedroom", "light.living_room"]
+    assert manager.resolve("空调", "打开空调") == []
+
+
+def test_resolve_unmatched_area_targets_nothing():
+    """Naming a room without such a device never falls back to every device"""
+    manager = make_manager()
+    manager.register(FakeLight("light.kitchen", area="厨房"))
+    # 书房没有任何设备，餐厅不在已知设备里
+    assert manager.resolve("灯", "关书房灯") == []
+    assert manager.resolve("灯", "把餐厅的灯打开") == []
+    assert manager.resolve("灯", "关厨房灯") == ["light.kitchen"]
+
+
+async def test_command_dispatched_before_stream_ends():
+    """Execution starts as soon as the command is known"""
+    manager = make_manager()
+    events = []
+    manager.subscribe(events.append)
+    dispatcher = CommandDispatcher(manager, "打开客厅灯")
+    assert dispatcher.feed("指令") == ""
+    dispatcher.feed("|开")
+    assert dispatcher.task is None
+    dispatcher.feed("灯")
+    assert dispatcher.task is not None
+    await asyncio.sleep(0.01)
+    assert manager.devices["light.living_room"].calls == ["turn_on"]
+
+    dispatcher.feed("。")
+    dispatcher.finish()
+    assert await dispatcher.result() == "已为您打开灯"
+    assert manager.states.get("light.living_room") == "on"
+    assert events[0].cmd == CMD.ON
+
+
+async def test_prefix_of_longer_command_waits():
+    """A command that may still grow into a longer one is not dispatched early"""
+    manager = make_manager()
+    dispatcher = CommandDispatcher(manager, "灯开着吗", commands={
+        "灯": (CMD.ON, "灯"),
+        "灯状态": (CMD.STATE, "灯"),
+    })
+    dispatcher.feed("指令|灯")
+    assert dispatcher.task is None
+    dispatcher.feed("状态")
+    assert dispatcher.command == "灯状态"
+    await dispatcher.result()
+
+
+async def test_state_query_never_switches_devices():
+    manager = make_manager()
+    for switch in (manager.execute(CMD.STATE, ["light.bedroom"]), manager.broadcast(CMD.STATE)):
+        with pytest.raises(ValueError):
+            await switch
+    assert all(not device.calls for device in manager.devices.values())
+
+
+async def test_state_query_uses_cache():
+    """Repeated state queries are answered from the local cache"""
+    manager = make_manager()
+    light = manager.devices["light.bedroom"]
+    for _ in range(3):
+        dispatcher = CommandDispatcher(manager, "台灯开着吗")
+        dispatcher.feed("指令|灯状态")
+        dispatcher.finish()
+        assert await dispatcher.result() == "灯是关着的"
+    assert light.calls == ["get_state"]
+
+
+async def test_answer_is_not_dispatched():
+    """Answers and noise never touch devices"""
+    manager = make_manager()
+    dispatcher = CommandDispatcher(manager, "今天天气怎么样")
+    dispatcher.feed("问答|开灯")
+    dispatcher.finish()
+    assert await dispatcher.result() is None
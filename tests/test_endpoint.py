@@ -0,0 +1,61 @@
+import time
+import asyncio
+
+from app.services.callback import ChainCallback
+from app.services.chain import BotState
+from app.services.voice.endpoint import Endpointer
+
+
+async def test_final_text_fires_after_silence():
+    """A final result becomes a query once the silence timeout expires"""
+    queries = []
+    endpointer = Endpointer(queries.append, silence_timeout=0.05, max_utterance=5)
+    endpointer.feed("打开", True)
+    endpointer.feed("客厅灯", True)
+    await asyncio.sleep(0.02)
+    assert queries == []
+    await asyncio.sleep(0.1)
+    assert queries == ["打开客厅灯"]
+    assert not endpointer.pending
+
+
+async def test_partial_text_fires_at_hard_cap():
+    """Non-final results are flushed once the utterance hits the hard cap"""
+    queries = []
+    endpointer = Endpointer(queries.append, silence_timeout=0.01, max_utterance=0.1)
+    endpointer.feed("今天天气", False)
+    await asyncio.sleep(0.05)
+    assert queries == []
+    await asyncio.sleep(0.1)
+    assert queries == ["今天天气"]
+
+
+async def test_concurrent_sessions_stay_idle():
+    """Hundreds of pending utterances cost no CPU while they wait"""
+    sessions = 500
+    states = []
+    for _ in range(sessions):
+        callback = ChainCallback(asyncio.Queue(), asyncio.Queue())
+        states.append(BotState(callback, silence_timeout=0.5, max_utterance=10))
+    collectors = [asyncio.create_task(s.collect_stt_texts()) for s in states]
+
+    async def first_query(state: BotState) -> str:
+        async for query in state.stream_query():
+            return query
+
+    waiters = [asyncio.create_task(first_query(s)) for s in states]
+    for i, state in enumerate(states):
+        state.callback.on_text(f"打开灯{i}", True)
+    await asyncio.sleep(0.05)
+
+    cpu_before = time.process_time()
+    await asyncio.sleep(0.3)
+    cpu_pending = time.process_time() - cpu_before
+
+    queries = await asyncio.wait_for(asyncio.gather(*waiters), timeout=2)
+    for task in collectors:
+        task.cancel()
+    await asyncio.gather(*collectors, return_exceptions=True)
+
+    assert queries == [f"打开灯{i}" for i in range(sessions)]
+    assert cpu_pending < 0.05
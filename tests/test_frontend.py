@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+import numpy
+
+from app.client.capture import MicrophoneCapture
+from app.client.frontend import AudioFrontEnd
+from app.services.voice.vad import VoiceActivityDetector
+
+WAKE = 64      # 32 samples per wake-word frame
+FRAME = 320    # 160 samples per ASR frame
+
+
+def silence(n):
+    return b"\x00" * n
+
+
+def speech(n, marker):
+    t = numpy.arange(n // 2)
+    wave = numpy.sin(2 * numpy.pi * t / 40) * 4000 + marker
+    return wave.astype(numpy.int16).tobytes()
+
+
+def is_wake_word(frame):
+    return bytes(frame[:2]) == b"\x7f\x7f"
+
+
+def feed(capture, chunks):
+    def run():
+        for chunk in chunks:
+            capture._on_audio(chunk, len(chunk) // 2, None, 0)
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+
+
+async def make_frontend(tail_frames=0, **kwargs):
+    capture = MicrophoneCapture(rate=1600, buffer_seconds=2.0)
+    capture._loop = asyncio.get_running_loop()
+    vad = VoiceActivityDetector(onset_frames=1, hangover_frames=1, preroll_frames=1,
+                                tail_frames=tail_frames)
+    frontend = AudioFrontEnd(capture, wake_word=is_wake_word, vad=vad,
+                             frame_bytes=FRAME, wake_frame_bytes=WAKE, **kwargs)
+    return capture, frontend
+
+
+async def test_words_right_after_wake_word_reach_asr():
+    capture, frontend = await make_frontend()
+    stream = frontend.stream()
+    first = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0.01)
+
+    command = speech(FRAME, marker=7)
+    # 唤醒词后紧接着说指令，中间没有停顿
+    feed(capture, [silence(WAKE) * 3, b"\x7f\x7f" + silence(WAKE - 2), command,
+                   silence(FRAME) * 3])
+
+    assert await asyncio.wait_for(first, 1) == command
+    assert frontend.awake
+    assert frontend.wake_reader.overruns == frontend.speech_reader.overruns == 0
+    await stream.aclose()
+
+
+async def test_manual_wake_and_idle_timeout():
+    capture, frontend = await make_frontend(tail_frames=2, idle_timeout=0.05)
+    frames = []
+
+    async def consume():
+        async for data in frontend.listen(await frontend.wait_for_wake()):
+            frames.append(bytes(data))
+
+    task = asyncio.ensure_future(consume())
+    await asyncio.sleep(0.01)
+    frontend.wake()
+    feed(capture, [silence(WAKE)])
+    await asyncio.sleep(0.01)
+    assert frontend.awake
+
+    feed(capture, [speech(FRAME, marker=3)] + [silence(FRAME)] * 2)
+    await asyncio.sleep(0.1)
+    feed(capture, [silence(FRAME)])
+    await asyncio.wait_for(task, 1)
+
+    # 拖尾的静音也送给 ASR，但不会让会话一直醒着
+    assert frames == [speech(FRAME, marker=3)] + [silence(FRAME)] * 3
+    assert not frontend.awake
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from app.devices.base import BaseDevice
+from app.devices.client import HomeAssistantClient, HomeAssistantError
+from app.devices.manager import DeviceManager
+from app.devices.xiaomi_cuco_switch import XiaomiCucoSwitch
+from app.schemas import CMD
+
+
+class FakeHomeAssistant:
+    """Local stand-in for the Home Assistant REST API"""
+
+    def __init__(self, delay=0.0, failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.peers = set()
+
+    async def call_service(self, request: web.Request):
+        assert request.headers["Authorization"] == "Bearer test-token"
+        self.peers.add(request.transport.get_extra_info("peername"))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.failures > 0:
+                self.failures -= 1
+                return web.json_response({"message": "busy"}, status=503)
+            body = await request.json()
+            self.calls.append((request.match_info["domain"], request.match_info["service"],
+                               body["entity_id"]))
+            return web.json_response([])
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+async def fake_ha(unused_tcp_port):
+    servers = []
+
+    async def start(**kwargs):
+        ha = FakeHomeAssistant(**kwargs)
+        app = web.Application()
+        app.router.add_post("/api/services/{domain}/{service}", ha.call_service)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", unused_tcp_port).start()
+        servers.append(runner)
+        return ha, f"http://127.0.0.1:{unused_tcp_port}"
+
+    yield start
+    for runner in servers:
+        await runner.cleanup()
+
+
+class Light(BaseDevice):
+
+    domain = "light"
+
+    def __init__(self, entity_id, client):
+        super().__init__(client)
+        self.entity_id = entity_id
+
+    def get_device_id(self):
+        return self.entity_id
+
+
+async def test_switch_turn_on_reuses_connection(fake_ha):
+    """Device commands go through one pooled keep-alive connection"""
+    ha, endpoint = await fake_ha()
+    client = HomeAssistantClient(endpoint, "test-token")
+    switch = XiaomiCucoSwitch(client)
+    assert await switch.turn_on()
+    assert await switch.turn_off()
+    await client.close()
+    assert ha.calls == [
+        ("switch", "turn_on", "switch.cuco_v3_8679_switch"),
+        ("switch", "turn_off", "switch.cuco_v3_8679_switch"),
+    ]
+    assert len(ha.peers) == 1
+
+
+async def test_retry_on_server_error(fake_ha):
+    """5xx responses are retried before giving up"""
+    ha, endpoint = await fake_ha(failures=2)
+    client = HomeAssistantClient(endpoint, "test-token", retries=2, backoff=0.01)
+    await client.call_service("switch", "turn_on", "switch.a")
+    assert ha.calls == [("switch", "turn_on", "switch.a")]
+
+    ha.failures = 5
+    with pytest.raises(HomeAssistantError):
+        await client.call_service("switch", "turn_on", "switch.a")
+    await client.close()
+
+
+async def test_broadcast_fans_out_in_parallel(fake_ha):
+    """Commands on many entities run concurrently up to the limit"""
+    ha, endpoint = await fake_ha(delay=0.1)
+    client = HomeAssistantClient(endpoint, "test-token", max_concurrency=4)
+    manager = DeviceManager()
+    for i in range(8):
+        manager.register(Light(f"light.room_{i}", client))
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    results = await manager.broadcast(CMD.OFF)
+    elapsed = loop.time() - start
+    await client.close()
+
+    assert results == {f"light.room_{i}": True for i in range(8)}
+    assert ha.max_in_flight == 4
+    assert elapsed < 0.4
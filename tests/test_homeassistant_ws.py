@@ -0,0 +1,175 @@
+import json
+import time
+import asyncio
+
+import pytest
+import websockets
+
+from app.devices.client import HomeAssistantError
+from app.devices.manager import DeviceManager
+from app.devices.websocket import HomeAssistantWebSocket
+from app.devices.xiaomi_cuco_switch import XiaomiCucoSwitch
+from app.schemas import CMD
+
+ENTITY_ID = XiaomiCucoSwitch().get_device_id()
+
+
+class FakeHomeAssistantWS:
+    """Local stand-in for the Home Assistant WebSocket API"""
+
+    def __init__(self):
+        self.states = {ENTITY_ID: "off", "light.bedroom": "on"}
+        self.calls = []
+        self.subscribers = set()
+
+    async def handler(self, ws):
+        await ws.send(json.dumps({"type": "auth_required"}))
+        auth = json.loads(await ws.recv())
+        if auth.get("access_token") != "test-token":
+            await ws.send(json.dumps({"type": "auth_invalid"}))
+            return
+        await ws.send(json.dumps({"type": "auth_ok"}))
+        try:
+            async for raw in ws:
+                message = json.loads(raw)
+                result = None
+                if message["type"] == "subscribe_events":
+                    self.subscribers.add((ws, message["id"]))
+                elif message["type"] == "get_states":
+                    result = [{"entity_id": e, "state": s} for e, s in self.states.items()]
+                elif message["type"] == "call_service":
+                    entity_id = message["target"]["entity_id"]
+                    self.calls.append((message["domain"], message["service"], entity_id))
+                    await ws.send(json.dumps(
+                        {"id": message["id"], "type": "result", "success": True, "result": None}))
+                    await self.change(entity_id, "on" if message["service"] == "turn_on" else "off")
+                    continue
+                await ws.send(json.dumps(
+                    {"id": message["id"], "type": "result", "success": True, "result": result}))
+        finally:
+            self.subscribers = {s for s in self.subscribers if s[0] is not ws}
+
+    async def change(self, entity_id, state):
+        self.states[entity_id] = state
+        for ws, subscription in list(self.subscribers):
+            await ws.send(json.dumps({
+                "id": subscription,
+                "type": "event",
+                "event": {
+                    "event_type": "state_changed",
+                    "data": {"entity_id": entity_id, "new_state": {"state": state}},
+                },
+            }))
+
+
+@pytest.fixture
+async def fake_ha_ws(unused_tcp_port):
+    ha = FakeHomeAssistantWS()
+    async with websockets.serve(ha.handler, "127.0.0.1", unused_tcp_port) as server:
+        yield ha, f"http://127.0.0.1:{unused_tcp_port}", server
+
+
+async def wait_for(condition, timeout=2.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+async def test_initial_states_and_pushed_changes(fake_ha_ws):
+    ha, endpoint, _ = fake_ha_ws
+    ws = HomeAssistantWebSocket(endpoint, "test-token")
+    await ws.start()
+    try:
+        await asyncio.wait_for(ws.connected.wait(), 2)
+        assert ws.states.get("light.bedroom") == "on"
+        await ha.change("light.bedroom", "off")
+        await wait_for(lambda: ws.states.get("light.bedroom") == "off")
+    finally:
+        await ws.stop()
+
+
+async def test_commands_share_the_socket(fake_ha_ws):
+    ha, endpoint, _ = fake_ha_ws
+    manager = DeviceManager()
+    manager.register(XiaomiCucoSwitch())
+    manager.attach(HomeAssistantWebSocket(endpoint, "test-token"))
+    await manager.start()
+    try:
+        await asyncio.wait_for(manager.transport.connected.wait(), 2)
+        results = await manager.execute(CMD.ON, [ENTITY_ID])
+        assert results == {ENTITY_ID: True}
+        assert ha.calls == [("switch", "turn_on", ENTITY_ID)]
+        await wait_for(lambda: manager.states.get(ENTITY_ID) == "on")
+        assert await manager.query_state([ENTITY_ID]) == {ENTITY_ID: "on"}
+    finally:
+        await manager.stop()
+
+
+async def test_reconnects_and_resyncs(fake_ha_ws):
+    ha, endpoint, server = fake_ha_ws
+    ws = HomeAssistantWebSocket(endpoint, "test-token", max_backoff=0.05)
+    await ws.start()
+    try:
+        await asyncio.wait_for(ws.connected.wait(), 2)
+        for connection in list(server.connections):
+            await connection.close()
+        await wait_for(lambda: not ws.connected.is_set())
+        ha.states["light.bedroom"] = "off"
+        await asyncio.wait_for(ws.connected.wait(), 2)
+        assert ws.states.get("light.bedroom") == "off"
+    finally:
+        await ws.stop()
+
+
+async def test_subscribed_states_do_not_expire(fake_ha_ws):
+    _, endpoint, _ = fake_ha_ws
+    manager = DeviceManager()
+    manager.register(XiaomiCucoSwitch())
+    manager.attach(HomeAssistantWebSocket(endpoint, "test-token"))
+    assert manager.transport.states is manager.states
+    await manager.start()
+    try:
+        await asyncio.wait_for(manager.transport.connected.wait(), 2)
+        # 一个小时没有变化的状态依然可信
+        manager.states._states[ENTITY_ID] = ("off", time.monotonic() - 3600)
+        assert await manager.query_state([ENTITY_ID]) == {ENTITY_ID: "off"}
+        assert manager.describe_states() == "客厅灯：关"
+    finally:
+        await manager.stop()
+
+
+class BrokenSocket:
+    """The connection dropped but the reader has not noticed yet"""
+
+    async def send(self, data):
+        raise websockets.ConnectionClosed(None, None)
+
+
+class FakeRest:
+
+    def __init__(self):
+        self.calls = []
+
+    async def call_service(self, domain, service, entity_id, **data):
+        self.calls.append((domain, service, entity_id))
+
+
+async def test_send_failure_falls_back_to_rest():
+    rest = FakeRest()
+    ws = HomeAssistantWebSocket("http://127.0.0.1:1", "test-token", fallback=rest)
+    ws._ws = BrokenSocket()
+    ws.connected.set()
+    await ws.call_service("switch", "turn_on", ENTITY_ID)
+    assert rest.calls == [("switch", "turn_on", ENTITY_ID)]
+    assert not ws._pending
+
+
+async def test_send_failure_only_fails_the_command():
+    ws = HomeAssistantWebSocket("http://127.0.0.1:1", "test-token")
+    ws._ws = BrokenSocket()
+    ws.connected.set()
+    with pytest.raises(HomeAssistantError):
+        await ws.call_service("switch", "turn_on", ENTITY_ID)
+    device = XiaomiCucoSwitch(client=ws)
+    assert await device.turn_on() is False
@@ -0,0 +1,106 @@
+import asyncio
+
+from app.devices.base import BaseDevice
+from app.devices.intent import AhoCorasick, IntentRouter, prompt_commands
+from app.devices.manager import DeviceManager
+from app.schemas import CMD, Step
+from app.services.chat.prompt import prompt_registry
+
+
+class FakeLight(BaseDevice):
+
+    domain = "light"
+    category = "灯"
+
+    def __init__(self, entity_id, area="", aliases=()):
+        super().__init__(client=object())
+        self.entity_id = entity_id
+        self.area = area
+        self.aliases = list(aliases)
+        self.calls = []
+
+    def get_device_id(self):
+        return self.entity_id
+
+    async def turn_on(self):
+        self.calls.append("turn_on")
+        return True
+
+    async def turn_off(self):
+        self.calls.append("turn_off")
+        return True
+
+    async def get_state(self):
+        self.calls.append("get_state")
+        return "on"
+
+
+class FakeFan(FakeLight):
+
+    domain = "fan"
+    category = "风扇"
+
+
+def make_manager():
+    manager = DeviceManager()
+    manager.register(FakeLight("light.living_room", area="客厅", aliases=["吊灯"]))
+    manager.register(FakeLight("light.bedroom", area="卧室", aliases=["台灯"]))
+    return manager
+
+
+def test_prompt_commands():
+    """The fast path only knows the commands the prompt lists"""
+    source = prompt_registry.source("command")
+    assert prompt_commands(source) == ["开灯", "关灯", "灯状态"]
+
+
+def test_aho_corasick_overlapping_matches():
+    matcher = AhoCorasick([("he", 1), ("she", 2), ("hers", 3)])
+    assert sorted(matcher.finditer("ushers")) == [(1, 4, 2), (2, 4, 1), (2, 6, 3)]
+
+
+def test_router_matches_device_commands():
+    router = IntentRouter(make_manager())
+    intent = router.match("请帮我把客厅的灯打开。")
+    assert (intent.command, intent.device_ids) == ("开灯", ["light.living_room"])
+    assert router.match("关掉台灯").device_ids == ["light.bedroom"]
+    assert router.match("把灯都关了").command == "关灯"
+    assert router.match("吊灯开着吗").cmd == CMD.STATE
+
+
+def test_router_leaves_the_rest_to_the_llm():
+    """Negations, questions and unknown devices are not guessed at"""
+    router = IntentRouter(make_manager())
+    for query in ["不要开灯", "灯为什么不亮", "今天天气怎么样", "打开空调", "关闭客厅", "开灯关灯"]:
+        assert router.match(query) is None, query
+
+
+def test_router_defers_when_the_named_room_has_no_device():
+    manager = make_manager()
+    # 书房只有风扇，没有灯
+    manager.register(FakeFan("fan.study", area="书房"))
+    router = IntentRouter(manager)
+    assert router.match("关书房灯") is None
+    assert router.match("关卧室灯").device_ids == ["light.bedroom"]
+
+
+def test_router_restricted_to_listed_commands():
+    router = IntentRouter(make_manager(), command_names=["开灯"])
+    assert router.match("开灯") is not None
+    assert router.match("关灯") is None
+
+
+async def test_chain_fast_path_skips_llm(make_chain):
+    manager = make_manager()
+    chain, client = make_chain(devices=manager)
+    output = asyncio.create_task(chain.process_audio_output())
+    try:
+        await asyncio.wait_for(chain.process_turn("打开台灯"), 2)
+    finally:
+        output.cancel()
+
+    assert manager.devices["light.bedroom"].calls == ["turn_on"]
+    assert manager.devices["light.living_room"].calls == []
+    assert chain.tts.segments == ["已为您打开灯"]
+    final = [m.data.text_chunk for m in client.messages if m.step == Step.LLM and m.data.is_final]
+    assert final == chain.tts.segments
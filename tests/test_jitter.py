@@ -0,0 +1,57 @@
+from app.services.voice.jitter import JitterBuffer
+
+RATE = 1000  # 2 bytes per ms
+PERIOD = 20  # 10 ms
+
+
+def make_buffer(**kwargs):
+    return JitterBuffer(rate=RATE, min_ms=30, max_ms=120, **kwargs)
+
+
+def test_waits_for_target_then_plays():
+    jitter = make_buffer()
+    assert jitter.read(PERIOD) == bytes(PERIOD)
+    jitter.write(b"\x01" * 40)
+    assert jitter.read(PERIOD) == bytes(PERIOD)
+    assert jitter.state == JitterBuffer.BUFFERING
+    jitter.write(b"\x01" * 20)
+    assert jitter.read(PERIOD) == b"\x01" * PERIOD
+    assert jitter.state == JitterBuffer.PLAYING
+    assert jitter.underruns == 0
+
+
+def test_underrun_pads_silence_and_grows_target():
+    jitter = make_buffer()
+    jitter.write(b"\x01" * 70)
+    out = [jitter.read(PERIOD) for _ in range(4)]
+    assert out[3] == b"\x01" * 10 + bytes(10)
+    assert jitter.underruns == 1
+    assert jitter.underrun_ms == 5
+    assert jitter.target_ms == 45
+    assert jitter.state == JitterBuffer.BUFFERING
+
+
+def test_end_of_stream_is_not_an_underrun():
+    jitter = make_buffer()
+    jitter.write(b"\x01" * 30)
+    jitter.end_of_stream()
+    # 不足目标时长的短回复也立即播放
+    assert jitter.read(PERIOD) == b"\x01" * PERIOD
+    assert jitter.read(PERIOD) == b"\x01" * 10 + bytes(10)
+    assert jitter.state == JitterBuffer.IDLE
+    assert jitter.underruns == 0
+
+    # 下一段回复重新缓冲
+    jitter.write(b"\x02" * 80)
+    assert jitter.state == JitterBuffer.BUFFERING
+    assert jitter.read(PERIOD) == b"\x02" * PERIOD
+
+
+def test_flush_discards_instantly():
+    jitter = make_buffer()
+    jitter.write(b"\x01" * 200)
+    jitter.read(PERIOD)
+    jitter.flush()
+    assert jitter.buffered_ms == 0
+    assert jitter.read(PERIOD) == bytes(PERIOD)
+    assert jitter.underruns == 0
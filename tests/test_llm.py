@@ -0,0 +1,180 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+from openai import AsyncOpenAI
+
+from app.services.chat.cache import ResponseCache
+from app.services.chat.llm import OpenAILLM
+from app.services.chat.memory import ConversationMemory
+from app.services.chat.prompt import prompt_registry
+
+
+@pytest.fixture
+async def fake_openai(unused_tcp_port):
+    """Local OpenAI-compatible server streaming one token every 10 ms"""
+    state = {"disconnected": False, "requests": 0, "messages": []}
+
+    async def completions(request: web.Request):
+        state["requests"] += 1
+        state["messages"].append((await request.json())["messages"])
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        try:
+            for token in ["问答", "|", "你好", "，", "世界"] * 10:
+                chunk = {
+                    "id": "chatcmpl-test", "object": "chat.completion.chunk",
+                    "created": 0, "model": "test",
+                    "choices": [{"index": 0, "delta": {"content": token},
+                                 "finish_reason": None}],
+                }
+                await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                await asyncio.sleep(0.01)
+            await resp.write(b"data: [DONE]\n\n")
+        except (ConnectionResetError, asyncio.CancelledError):
+            state["disconnected"] = True
+            raise
+        return resp
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", unused_tcp_port).start()
+    client = AsyncOpenAI(base_url=f"http://127.0.0.1:{unused_tcp_port}/v1", api_key="test")
+    yield client, state
+    await client.close()
+    await runner.cleanup()
+
+
+async def test_agenerate_streams_tokens(fake_openai):
+    """Tokens are streamed without blocking the loop"""
+    client, _ = fake_openai
+    llm = OpenAILLM(None, client=client, cache=ResponseCache())
+    tokens = [t async for t in llm.agenerate("你好", model="test")]
+    assert "".join(tokens[:3]) == "问答|你好"
+    assert len(tokens) == 50
+
+
+async def test_cancel_aborts_upstream_stream(fake_openai):
+    """cancel() closes the upstream stream and ends the generator"""
+    client, state = fake_openai
+    llm = OpenAILLM(None, client=client, cache=ResponseCache())
+    tokens = []
+    async for token in llm.agenerate("你好", model="test"):
+        tokens.append(token)
+        if len(tokens) == 3:
+            await llm.cancel()
+    await asyncio.sleep(0.05)
+    assert len(tokens) < 50
+    assert state["disconnected"]
+
+
+async def test_repeated_answer_replayed_from_cache(fake_openai):
+    """A repeated question is answered without another upstream request"""
+    client, state = fake_openai
+    llm = OpenAILLM(None, client=client, cache=ResponseCache())
+    first = "".join([t async for t in llm.agenerate("你好", model="test")])
+    second = [t async for t in llm.agenerate("你好！", model="test")]
+    assert state["requests"] == 1
+    assert "".join(second) == first
+    assert len(second) > 1
+
+
+async def test_standalone_questions_cached_mid_conversation(fake_openai):
+    client, state = fake_openai
+    llm = OpenAILLM(None, client=client, cache=ResponseCache())
+    llm.remember("北京天气怎么样", "问答|晴")
+    first = "".join([t async for t in llm.agenerate("长城有多长", model="test")])
+    assert "".join([t async for t in llm.agenerate("长城有多长", model="test")]) == first
+    assert state["requests"] == 1
+    # 追问依赖上文，每次都问 LLM
+    [t async for t in llm.agenerate("那上海呢", model="test")]
+    [t async for t in llm.agenerate("那上海呢", model="test")]
+    assert state["requests"] == 3
+
+
+async def test_cancelled_answer_not_cached(fake_openai):
+    client, state = fake_openai
+    llm = OpenAILLM(None, client=client, cache=ResponseCache())
+    async for token in llm.agenerate("你好", model="test"):
+        await llm.cancel()
+    assert llm.cache.stats()["entries"] == 0
+
+
+async def test_history_follows_stable_system_prefix(fake_openai):
+    """Follow-ups carry earlier turns after an unchanged system message"""
+    client, state = fake_openai
+    llm = OpenAILLM(None, client=client, cache=ResponseCache())
+    first = "".join([t async for t in llm.agenerate("北京天气怎么样", model="test")])
+    llm.remember("北京天气怎么样", first)
+    [t async for t in llm.agenerate("那上海呢", model="test")]
+
+    before, after = state["messages"]
+    assert before[0]["role"] == "system"
+    assert after[0] == before[0]
+    assert after[1:] == [
+        {"role": "user", "content": "北京天气怎么样"},
+        {"role": "assistant", "content": first},
+        {"role": "user", "content": "那上海呢"},
+    ]
+
+
+async def test_summary_instructions_sent_as_system_message():
+    requests = []
+
+    async def create(**kwargs):
+        requests.append(kwargs)
+        message = SimpleNamespace(content="用户问过天气")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    llm = OpenAILLM(None, client=client, cache=ResponseCache())
+    assert await llm.summarize("", [("北京天气怎么样", "问答|晴")], model="test") == "用户问过天气"
+    system, user = requests[0]["messages"]
+    assert system == {"role": "system", "content": prompt_registry.render_system("summary")}
+    assert user["role"] == "user"
+    assert user["content"].startswith("已有摘要：\n无")
+    assert "user: 北京天气怎么样\nassistant: 问答|晴" in user["content"]
+    assert system["content"] not in user["content"]
+
+
+async def test_old_turns_summarized_in_background(fake_openai):
+    client, _ = fake_openai
+    summaries = []
+
+    async def summarizer(summary, turns):
+        summaries.append(turns)
+        return "用户问过天气"
+
+    llm = OpenAILLM(None, client=client, cache=ResponseCache(),
+                    memory=ConversationMemory(max_tokens=20, keep_turns=1, summarizer=summarizer))
+    for i in range(3):
+        llm.remember(f"第{i}个问题是什么", "问答|这是一个比较长的回答内容")
+        await asyncio.sleep(0)
+    assert summaries and llm.memory.summary == "用户问过天气"
+    assert len(llm.memory.turns) == 1
+    messages = llm.build_messages("再说一遍")
+    assert messages[1] == {"role": "system", "content": "之前的对话摘要：用户问过天气"}
+
+
+async def test_device_states_sent_before_the_query(fake_openai):
+    client, state = fake_openai
+    states = ["客厅灯：关"]
+    cache = ResponseCache()
+    llm = OpenAILLM(None, client=client, cache=cache, device_states=lambda: states[0])
+    first = "".join([t async for t in llm.agenerate("客厅灯开着吗", model="test")])
+    messages = state["messages"][0]
+    assert messages[0]["role"] == "system"
+    assert messages[-2:] == [
+        {"role": "system", "content": "当前设备状态：\n客厅灯：关"},
+        {"role": "user", "content": "客厅灯开着吗"},
+    ]
+    # 状态没变可以用缓存，变了要重新问
+    assert "".join([t async for t in llm.agenerate("客厅灯开着吗", model="test")]) == first
+    assert state["requests"] == 1
+    states[0] = "客厅灯：开"
+    [t async for t in llm.agenerate("客厅灯开着吗", model="test")]
+    assert state["requests"] == 2
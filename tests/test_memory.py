@@ -0,0 +1,60 @@
+import asyncio
+
+from app.services.chat.memory import ConversationMemory, estimate_tokens
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("今天天气怎么样") == 7
+    assert estimate_tokens("hello world") == 3
+    assert estimate_tokens("") == 0
+
+
+def test_messages_in_order():
+    memory = ConversationMemory()
+    memory.add("打开台灯", "指令|开灯")
+    memory.add("再关掉", "指令|关灯")
+    assert memory.messages() == [
+        {"role": "user", "content": "打开台灯"},
+        {"role": "assistant", "content": "指令|开灯"},
+        {"role": "user", "content": "再关掉"},
+        {"role": "assistant", "content": "指令|关灯"},
+    ]
+
+
+async def test_without_summarizer_old_turns_are_dropped():
+    memory = ConversationMemory(max_tokens=30, keep_turns=2)
+    for i in range(6):
+        memory.add(f"问题{i}", "问答|一个十来个字的回答内容")
+    assert memory.over_budget
+    await memory.compact()
+    assert [q for q, _ in memory.turns] == ["问题4", "问题5"]
+    assert memory.summary == ""
+    assert not memory.over_budget
+
+
+async def test_turns_added_while_summarizing_are_kept():
+    release = asyncio.Event()
+
+    async def summarizer(summary, turns):
+        await release.wait()
+        return f"{len(turns)}轮"
+
+    memory = ConversationMemory(max_tokens=10, keep_turns=1, summarizer=summarizer)
+    for i in range(3):
+        memory.add(f"问题{i}", "问答|回答内容")
+    task = asyncio.create_task(memory.compact())
+    await asyncio.sleep(0)
+    memory.add("问题3", "问答|回答内容")
+    release.set()
+    await task
+    assert memory.summary == "2轮"
+    assert [q for q, _ in memory.turns] == ["问题2", "问题3"]
+
+
+def test_idle_conversation_starts_over():
+    memory = ConversationMemory(idle_reset=60)
+    memory.add("你好", "问答|你好")
+    assert not memory.empty
+    memory.last_active -= 61
+    assert memory.empty
+    assert memory.messages() == []
@@ -0,0 +1,68 @@
+import asyncio
+
+from app.services.callback import ChainCallback
+from app.services.chain import BotState
+from app.services.voice.noise import NoiseFilter
+
+
+def test_clear_noise_is_dropped():
+    noise_filter = NoiseFilter()
+    for text, reason in [("", "empty"), ("。", "empty"), ("嗯", "incomplete"),
+                         ("哈哈哈哈", "incomplete"), ("对对对对对", "incomplete"),
+                         ("谢谢观看！", "blacklisted")]:
+        assert noise_filter.classify(text)[1] == reason, text
+
+
+def test_commands_and_questions_are_kept():
+    """Short commands and anything ambiguous are left for the LLM"""
+    noise_filter = NoiseFilter()
+    for text in ["开灯", "你好", "嗯，开灯", "今天天气怎么样", "哈那杯"]:
+        assert noise_filter.classify(text)[1] is None, text
+
+
+def test_one_character_commands_are_kept():
+    noise_filter = NoiseFilter()
+    for text in ["停", "好", "开", "关。"]:
+        assert noise_filter.classify(text)[1] is None, text
+    assert NoiseFilter(min_chars=2).classify("停")[1] == "too_short"
+
+
+def test_learns_noise_labelled_by_llm():
+    noise_filter = NoiseFilter(max_learned=2, learn_after=2)
+    assert noise_filter.accept("买二送一限时抢购")
+    # 一次判错不算数，再次被判为噪声才拉黑
+    noise_filter.learn("买二送一，限时抢购！")
+    assert noise_filter.accept("买二送一限时抢购")
+    noise_filter.learn("买二送一限时抢购")
+    assert not noise_filter.accept("买二送一限时抢购")
+
+    for text in ["第二句", "第二句", "第三句", "第三句"]:
+        noise_filter.learn(text)
+    assert noise_filter.accept("买二送一限时抢购")
+
+    stats = noise_filter.stats()
+    assert stats["received"] == 4
+    assert stats["llm_calls_saved"] == 1
+    assert stats["by_reason"] == {"blacklisted": 1}
+    assert stats["llm_noise"] == 6
+
+
+def test_learned_noise_expires():
+    now = [0.0]
+    noise_filter = NoiseFilter(learn_after=1, learn_ttl=60, clock=lambda: now[0])
+    noise_filter.learn("打开客厅灯")
+    assert not noise_filter.accept("打开客厅灯")
+    now[0] = 61
+    assert noise_filter.accept("打开客厅灯")
+
+
+async def test_stream_query_skips_noise():
+    callback = ChainCallback(asyncio.Queue(), asyncio.Queue())
+    state = BotState(callback)
+    for query in ["嗯嗯", "打开客厅灯", "哈哈哈哈哈", "灯开着吗"]:
+        state.queries.put_nowait(query)
+
+    queries = state.stream_query()
+    assert await queries.__anext__() == "打开客厅灯"
+    assert await queries.__anext__() == "灯开着吗"
+    assert state.noise_filter.stats()["dropped"] == 2
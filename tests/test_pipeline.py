@@ -0,0 +1,168 @@
+import asyncio
+import threading
+
+import numpy
+import pytest
+from dashscope.common.error import InvalidTask
+
+from app.schemas import Step
+from app.services.callback import ChainCallback
+from app.services.chain import BotChain
+from app.services.voice import tts as tts_module
+from app.services.voice.tts import DashscopeTTS
+from app.services.voice.tts_cache import TTSCache
+
+SILENCE = numpy.zeros(1600, dtype=numpy.int16).tobytes()
+SPEECH = (numpy.sin(numpy.arange(1600) / 5) * 8000).astype(numpy.int16).tobytes()
+
+
+async def run_tasks(chain: BotChain, until, timeout=2.0):
+    tasks = [
+        asyncio.create_task(chain.process_llm_generate()),
+        asyncio.create_task(chain.process_audio_output()),
+        asyncio.create_task(chain.process_audio_receive()),
+    ]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not until() and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def test_first_audio_before_llm_completes(make_chain):
+    """Segments reach TTS and the client while the LLM is still streaming"""
+    chain, client = make_chain(["问答", "|今天", "天气晴朗。", "温度", "适宜，", "适合散步。"])
+    chain.state.queries.put_nowait("今天天气怎么样")
+    await run_tasks(chain, lambda: chain.llm.finished and chain.step == Step.ASR)
+
+    assert chain.tts.segments == ["今天天气晴朗。", "温度适宜，适合散步。"]
+    assert chain.tts.audio_before_llm_done
+    audio = [m.data.audio_chunk for m in client.messages if m.data.audio_chunk]
+    assert audio == [b.encode() for b in chain.tts.segments]
+    assert chain.last_ttfa is not None
+
+
+async def test_barge_in_interrupts_answer(make_chain):
+    """Speech during an answer cancels LLM and TTS and restarts ASR"""
+    chain, client = make_chain(["问答|"] + ["很长的回答。"] * 100)
+    chain.state.queries.put_nowait("讲个故事")
+
+    async def speak_later():
+        await asyncio.sleep(0.1)
+        for _ in range(5):
+            client.frames.put_nowait(SILENCE)
+        for _ in range(4):
+            client.frames.put_nowait(SPEECH)
+
+    speaker = asyncio.create_task(speak_later())
+    await run_tasks(chain, lambda: client.flushed and len(chain.stt.frames) == 6)
+    await speaker
+
+    assert not chain.llm.finished
+    assert chain.llm.cancelled
+    assert chain.tts.cancelled
+    assert client.flushed == 1
+    assert chain.step == Step.ASR
+    # 触发打断的语音帧及其前面的少量音频一起送给 ASR
+    assert chain.stt.frames == [SILENCE] * 2 + [SPEECH] * 4
+
+
+class StubSpeechSynthesizer:
+    """Session rules of dashscope's SpeechSynthesizer: one streaming session per object"""
+
+    instances = []
+
+    def __init__(self, model, voice, format, callback):
+        self.callback = callback
+        self.texts = []
+        self._is_first = True
+        self._is_started = False
+        StubSpeechSynthesizer.instances.append(self)
+
+    def streaming_call(self, text):
+        if self._is_first:
+            self._is_first = False
+            self._is_started = True
+        if not self._is_started:
+            raise InvalidTask("speech synthesizer has not been started.")
+        self.texts.append(text)
+        self.callback.on_data(text.encode())
+
+    def async_streaming_complete(self):
+        if not self._is_started:
+            raise InvalidTask("speech synthesizer has not been started.")
+        self._is_started = False
+        threading.Thread(target=self.callback.on_complete).start()
+
+    def streaming_cancel(self):
+        if not self._is_started:
+            raise InvalidTask("speech synthesizer has not been started.")
+        self._is_started = False
+
+
+def turns_done(client):
+    return sum(1 for m in client.messages
+               if m.step == Step.TTS and m.data.is_final and not m.data.audio_chunk)
+
+
+async def test_every_turn_is_synthesized(monkeypatch, make_chain):
+    """Each turn opens a new SDK session instead of reusing a finished one"""
+    monkeypatch.setattr(tts_module, "SpeechSynthesizer", StubSpeechSynthesizer)
+    StubSpeechSynthesizer.instances = []
+    chain, client = make_chain(["问答|", "今天天气晴朗。"])
+    chain.tts = DashscopeTTS(chain.callback, cache=TTSCache(), max_cached_chars=0)
+    chain.state.queries.put_nowait("今天天气怎么样")
+    chain.state.queries.put_nowait("明天呢")
+    await run_tasks(chain, lambda: turns_done(client) == 2)
+
+    assert turns_done(client) == 2
+    assert [s.texts for s in StubSpeechSynthesizer.instances] == [["今天天气晴朗。"]] * 2
+    audio = [m.data.audio_chunk for m in client.messages if m.data.audio_chunk]
+    assert audio == ["今天天气晴朗。".encode()] * 2
+
+
+async def test_synthesis_resumes_after_barge_in(monkeypatch):
+    monkeypatch.setattr(tts_module, "SpeechSynthesizer", StubSpeechSynthesizer)
+    StubSpeechSynthesizer.instances = []
+    audio_queue = asyncio.Queue()
+    tts = DashscopeTTS(ChainCallback(asyncio.Queue(), audio_queue),
+                       cache=TTSCache(), max_cached_chars=0)
+    await tts.synthesize("很长的回答。")
+    cancelled = StubSpeechSynthesizer.instances[-1]
+    await tts.cancel()
+    await tts.synthesize("好的。")
+    # 被取消的会话迟到的音频不能混进下一句
+    cancelled.callback.on_data(b"late")
+    await tts.synthesize("", is_final=True)
+    items = [await asyncio.wait_for(audio_queue.get(), 1) for _ in range(3)]
+    assert items == [("很长的回答。".encode(), False), ("好的。".encode(), False), (b"", True)]
+    assert len(StubSpeechSynthesizer.instances) == 2
+
+
+class BrokenSynthesizer(StubSpeechSynthesizer):
+
+    def streaming_call(self, text):
+        raise ConnectionError("handshake failed")
+
+
+class FailingTaskSynthesizer(StubSpeechSynthesizer):
+    """The server fails the task after it was asked to finish"""
+
+    def async_streaming_complete(self):
+        self._is_started = False
+        threading.Thread(target=self.callback.on_error, args=("task-failed",)).start()
+
+
+@pytest.mark.parametrize("synthesizer", [BrokenSynthesizer, FailingTaskSynthesizer])
+async def test_failed_synthesis_does_not_hold_the_turn(synthesizer, make_chain):
+    chain, client = make_chain(["问答|", "今天天气晴朗。"])
+    chain.tts = DashscopeTTS(chain.callback, cache=TTSCache(), max_cached_chars=0,
+                             synthesizer_factory=lambda wrapper: synthesizer(
+                                 None, None, None, wrapper))
+    chain.state.queries.put_nowait("今天天气怎么样")
+    started = asyncio.get_running_loop().time()
+    await run_tasks(chain, lambda: turns_done(client) == 1)
+    assert turns_done(client) == 1
+    assert asyncio.get_running_loop().time() - started < 1
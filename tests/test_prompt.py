@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from app.services.chat.prompt import PromptRegistry, prompt_registry
+
+
+def test_render_named_prompts():
+    """Command and Q&A prompts render the query"""
+    command = prompt_registry.render("command", q="打开客厅灯")
+    qa = prompt_registry.render("qa", q="今天天气怎么样")
+    assert command.endswith("打开客厅灯")
+    assert "可执行指令" in command
+    assert qa.endswith("今天天气怎么样")
+    assert "可执行指令" not in qa
+
+
+def test_system_block_is_query_independent():
+    """The system part renders on its own and is a prefix of the full prompt"""
+    system = prompt_registry.render_system("command")
+    assert "可执行指令" in system
+    assert "{{" not in system and "打开客厅灯" in system
+    assert prompt_registry.render("command", q="关灯").startswith(system)
+    assert prompt_registry.render_system("qa") != system
+
+
+def test_template_compiled_once():
+    """Repeated lookups return the same compiled template"""
+    assert prompt_registry.get("command") is prompt_registry.get("command")
+
+
+def test_unknown_prompt():
+    """Unknown prompt names are rejected"""
+    with pytest.raises(ValueError):
+        prompt_registry.get("missing")
+
+
+def test_hot_reload_on_mtime_change(tmp_path):
+    """A modified template file is recompiled on next lookup"""
+    template = tmp_path / "greet.jinja"
+    template.write_text("你好 {{ q }}", encoding="utf-8")
+    registry = PromptRegistry(
+        prompts={"greet": "greet.jinja"},
+        search_path=str(tmp_path),
+        bytecode_cache_dir=str(tmp_path / "cache"))
+    first = registry.get("greet")
+    assert first.render(q="世界") == "你好 世界"
+
+    template.write_text("再见 {{ q }}", encoding="utf-8")
+    stat = template.stat()
+    os.utime(template, (stat.st_atime, stat.st_mtime + 10))
+    assert registry.render("greet", q="世界") == "再见 世界"
+    assert registry.get("greet") is not first
+
+
+def test_template_without_system_block(tmp_path):
+    (tmp_path / "plain.jinja").write_text("你好 {{ q }}", encoding="utf-8")
+    registry = PromptRegistry(
+        prompts={"plain": "plain.jinja"},
+        search_path=str(tmp_path),
+        bytecode_cache_dir=str(tmp_path / "cache"))
+    assert registry.render_system("plain") is None
+
+
+def test_default_bytecode_cache_is_private():
+    """Never a fixed shared directory another local user could plant bytecode in"""
+    directory = PromptRegistry().env.bytecode_cache.directory
+    stat = os.stat(directory)
+    assert stat.st_uid == os.getuid()
+    assert stat.st_mode & 0o077 == 0
+    assert os.path.basename(directory) != "anybot-prompts"
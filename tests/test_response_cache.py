@@ -0,0 +1,60 @@
+from app.services.chat.cache import HashingEmbedder, ResponseCache, is_context_free
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_only_answers_are_cached():
+    cache = ResponseCache()
+    assert cache.put("打开客厅灯", "指令|开灯") is False
+    assert cache.put("哈那杯", "噪声|无意义") is False
+    assert cache.put("什么是光合作用", "问答|植物利用光能制造有机物")
+    assert cache.get("什么是光合作用？") == "问答|植物利用光能制造有机物"
+    assert cache.get("打开客厅灯") is None
+
+
+def test_keyed_by_prompt_and_model():
+    cache = ResponseCache()
+    cache.put("你好", "问答|你好", prompt="command", model="a")
+    assert cache.get("你好", prompt="command", model="a") == "问答|你好"
+    assert cache.get("你好", prompt="qa", model="a") is None
+    assert cache.get("你好", prompt="command", model="b") is None
+
+
+def test_ttl_and_time_sensitive_queries():
+    clock = FakeClock()
+    cache = ResponseCache(ttl=100, volatile_ttl=10, clock=clock)
+    assert cache.put("现在几点了", "问答|十点") is False
+    cache.put("今天天气怎么样", "问答|晴")
+    cache.put("长城有多长", "问答|两万多公里")
+    clock.now = 20
+    assert cache.get("今天天气怎么样") is None
+    assert cache.get("长城有多长") == "问答|两万多公里"
+    clock.now = 120
+    assert cache.get("长城有多长") is None
+
+
+def test_similar_phrasing_served_from_vector_index():
+    cache = ResponseCache(embedder=HashingEmbedder(), similarity=0.85)
+    cache.put("光合作用是什么意思", "问答|植物利用光能制造有机物")
+    assert cache.get("光合作用是什么意思呢") == "问答|植物利用光能制造有机物"
+    assert cache.get("呼吸作用是什么意思") is None
+    assert cache.stats()["similar_hits"] == 1
+
+
+async def test_replay_is_a_token_stream():
+    tokens = [t async for t in ResponseCache.replay("问答|今天天气晴朗", chars=4)]
+    assert tokens == ["问答|今", "天天气晴", "朗"]
+
+
+def test_follow_ups_are_not_context_free():
+    for query in ["长城有多长", "什么是光合作用？", "给我讲个笑话"]:
+        assert is_context_free(query), query
+    for query in ["那上海呢", "再说一遍", "它有多高", "为什么", "还有呢"]:
+        assert not is_context_free(query), query
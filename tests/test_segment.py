@@ -0,0 +1,73 @@
+from app.services.chat.response import ResponseParser, ANSWER, COMMAND
+from app.services.chat.segment import SentenceSegmenter
+
+
+def feed_all(segmenter: SentenceSegmenter, tokens):
+    segments = []
+    for token in tokens:
+        segments.extend(segmenter.feed(token))
+    rest = segmenter.flush()
+    if rest:
+        segments.append(rest)
+    return segments
+
+
+def test_cut_on_chinese_sentence_end():
+    """Chinese sentence ends cut a segment immediately"""
+    segmenter = SentenceSegmenter()
+    assert segmenter.feed("今天天气晴朗。明天") == ["今天天气晴朗。"]
+    assert segmenter.flush() == "明天"
+
+
+def test_cut_on_western_sentence_end():
+    """Periods cut only when followed by whitespace"""
+    segmenter = SentenceSegmenter()
+    assert segmenter.feed("It is 3.") == []
+    assert segmenter.feed("5 degrees. Nice") == ["It is 3.5 degrees."]
+
+
+def test_clause_break_after_soft_length():
+    """Commas cut once the segment is long enough"""
+    segmenter = SentenceSegmenter(soft_chars=8, first_soft_chars=4)
+    segments = feed_all(segmenter, ["好的，", "今天的气温是二十度，", "适合", "出门。"])
+    assert segments == ["好的，今天的气温是二十度，", "适合出门。"]
+
+
+def test_cut_at_max_length():
+    """Text without punctuation is cut at max_chars"""
+    segmenter = SentenceSegmenter(max_chars=5)
+    assert segmenter.feed("一二三四五六七") == ["一二三四五"]
+    assert segmenter.flush() == "六七"
+
+
+def test_closing_quote_stays_with_sentence():
+    """Closing quotes follow the sentence end into the same segment"""
+    segmenter = SentenceSegmenter()
+    assert segmenter.feed("他说“你好。”然后") == ["他说“你好。”"]
+
+
+def test_response_parser_streams_content():
+    """The type prefix is stripped from the streamed content"""
+    parser = ResponseParser()
+    assert parser.feed("问") == ""
+    assert parser.feed("答|今天") == "今天"
+    assert parser.feed("晴朗") == "晴朗"
+    assert parser.kind == ANSWER
+    assert parser.speakable
+    assert parser.content == "今天晴朗"
+
+
+def test_response_parser_command_not_speakable():
+    """Command replies are not spoken"""
+    parser = ResponseParser()
+    parser.feed("指令|开灯")
+    assert parser.kind == COMMAND
+    assert not parser.speakable
+
+
+def test_response_parser_without_prefix():
+    """Replies that ignore the format are treated as answers"""
+    parser = ResponseParser()
+    assert parser.feed("好的") == ""
+    assert parser.finish() == "好的"
+    assert parser.speakable
@@ -0,0 +1,125 @@
+import time
+import asyncio
+
+import pytest
+
+from app.services.callback import ChainCallback
+from app.services.chat.memory import ConversationMemory
+from app.services.session import MemorySessionStore, RedisSessionStore
+from app.services.voice.tts import DashscopeTTS
+from app.services.voice.tts_cache import TTSCache
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return MemorySessionStore(max_tts_entries=2)
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisSessionStore(fakeredis.FakeAsyncRedis(), max_tts_entries=2)
+
+
+async def test_history_round_trip(store):
+    assert await store.load_history("a") == ("", [], None)
+    await store.append_turn("a", "北京天气怎么样", "问答|晴")
+    await store.append_turn("a", "那上海呢", "问答|多云")
+    summary, turns, updated_at = await store.load_history("a")
+    assert (summary, turns) == ("", [("北京天气怎么样", "问答|晴"), ("那上海呢", "问答|多云")])
+    assert abs(updated_at - time.time()) < 5
+
+    await store.save_history("a", "问过北京天气", [("那上海呢", "问答|多云")])
+    assert (await store.load_history("a"))[:2] == ("问过北京天气", [("那上海呢", "问答|多云")])
+    assert (await store.load_history("b"))[:2] == ("", [])
+    await store.clear_history("a")
+    assert await store.load_history("a") == ("", [], None)
+
+
+async def test_turn_state(store):
+    await store.set_state("a", step="llm", query="你好")
+    await store.set_state("a", step="asr")
+    assert await store.get_state("a") == {"step": "asr", "query": "你好"}
+    assert await store.get_state("b") == {}
+
+
+async def test_tts_audio_shared_and_bounded(store):
+    await store.put_tts("k1", b"one")
+    await store.put_tts("k2", b"two")
+    assert await store.get_tts("k1") == b"one"
+    await store.put_tts("k3", b"three")
+    # k2 最久没用，被淘汰
+    assert await store.get_tts("k2") is None
+    assert await store.get_tts("k1") == b"one"
+    assert await store.get_tts("k3") == b"three"
+
+
+async def test_memory_store_audio_bounded_by_bytes():
+    store = MemorySessionStore(max_tts_bytes=10)
+    await store.put_tts("k1", b"1234")
+    await store.put_tts("k2", b"5678")
+    await store.put_tts("k1", b"1234")
+    await store.put_tts("k3", b"abcd")
+    assert await store.get_tts("k2") is None
+    assert await store.get_tts("k1") == b"1234"
+    assert store.tts_bytes == 8
+    # 超过整个预算的音频不存
+    await store.put_tts("k4", b"x" * 11)
+    assert await store.get_tts("k4") is None and store.tts_bytes == 8
+
+
+async def test_conversation_resumed_by_another_worker(store):
+    first = ConversationMemory()
+    first.bind(store, "kitchen")
+    first.add("打开台灯", "指令|开灯")
+    first.add("再调暗一点", "问答|暂不支持调光")
+    await asyncio.gather(*first._writes)
+
+    second = ConversationMemory()
+    second.bind(store, "kitchen")
+    await second.load()
+    assert second.turns == first.turns
+
+    idle = ConversationMemory(idle_reset=0.05)
+    idle.bind(store, "kitchen")
+    await asyncio.sleep(0.1)
+    await idle.load()
+    assert idle.empty
+    await asyncio.gather(*idle._writes)
+    assert (await store.load_history("kitchen"))[1] == []
+
+
+async def test_compaction_replaces_stored_history(store):
+    async def summarizer(summary, turns):
+        return "聊过灯"
+
+    memory = ConversationMemory(max_tokens=10, keep_turns=1, summarizer=summarizer)
+    memory.bind(store, "a")
+    for i in range(3):
+        memory.add(f"问题{i}", "问答|回答内容")
+    await memory.compact()
+    summary, turns, _ = await store.load_history("a")
+    assert (summary, turns) == ("聊过灯", [("问题2", "问答|回答内容")])
+
+
+async def test_redis_unavailable_does_not_fail_turns():
+    store = RedisSessionStore.from_url("redis://127.0.0.1:1", timeout=0.1)
+    await store.append_turn("a", "你好", "问答|你好")
+    await store.set_state("a", step="asr")
+    assert await store.load_history("a") == ("", [], None)
+    assert await store.get_state("a") == {}
+    assert await store.get_tts("k") is None
+
+
+async def test_phrase_audio_shared_between_workers(store, synthesizer_factory,
+                                                    synthesizer_calls, speak):
+    """Audio synthesized by one worker is replayed by another"""
+    audio_queue = asyncio.Queue()
+    callback = ChainCallback(asyncio.Queue(), audio_queue)
+    tts = DashscopeTTS(callback, cache=TTSCache(), store=store,
+                       synthesizer_factory=synthesizer_factory)
+    await speak(tts, audio_queue, "已为您开灯")
+    await asyncio.sleep(0.05)
+    assert synthesizer_calls == ["已为您开灯"]
+
+    other = DashscopeTTS(callback, cache=TTSCache(), store=store,
+                         synthesizer_factory=synthesizer_factory)
+    assert await speak(other, audio_queue, "已为您开灯") == "已为您开灯".encode() * 2
+    assert synthesizer_calls == ["已为您开灯"]
@@ -0,0 +1,109 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services import chain as chain_module
+from app.services.callback import ChainCallback
+from app.services.chain import BotState
+from app.services.session import MemorySessionStore
+from app.services.speculation import Speculator
+from app.services.voice.endpoint import Endpointer, StabilityTracker, stability
+
+
+class CountingLLM:
+
+    def __init__(self, tokens=("问答|", "晴天"), delay=0.01):
+        self.tokens = tokens
+        self.delay = delay
+        self.queries = []
+
+    async def agenerate(self, q, **kwargs):
+        self.queries.append(q)
+        for token in self.tokens:
+            await asyncio.sleep(self.delay)
+            yield token
+
+
+def test_stability_of_interim_hypotheses():
+    assert stability("", "今天") == 0.0
+    assert stability("今天天气", "今天天气") == 1.0
+    assert stability("今天天汽", "今天天气") == 0.75
+    tracker = StabilityTracker()
+    assert tracker.update("今天", False) == 0.0
+    assert tracker.update("今天", False) == 1.0
+    assert tracker.update("今天天气怎么样", True) == 1.0
+    assert tracker.previous == ""
+
+
+async def test_interim_results_replace_each_other():
+    queries = []
+    endpointer = Endpointer(queries.append, silence_timeout=0.02)
+    endpointer.feed("今天", False)
+    endpointer.feed("今天天气", False)
+    endpointer.feed("今天天气怎么样。", True)
+    endpointer.feed("明天", False)
+    assert endpointer.text == "今天天气怎么样。明天"
+    endpointer.feed("明天呢", True)
+    await asyncio.sleep(0.05)
+    assert queries == ["今天天气怎么样。明天呢"]
+
+
+async def test_speculation_committed_on_matching_endpoint():
+    llm = CountingLLM()
+    speculator = Speculator(llm.agenerate)
+    speculator.update("今天天气", stability=0.5)
+    assert speculator.current is None
+    speculator.update("今天天气怎么样", stability=1.0)
+    await asyncio.sleep(0.05)
+
+    speculation = speculator.take("今天天气怎么样？")
+    assert [t async for t in speculation.stream()] == ["问答|", "晴天"]
+    assert llm.queries == ["今天天气怎么样"]
+    stats = speculator.stats()
+    assert (stats["started"], stats["committed"], stats["wasted"]) == (1, 1, 0)
+    assert stats["saved_ms_mean"] > 0
+
+
+async def test_changed_text_wastes_speculation():
+    llm = CountingLLM(delay=1)
+    speculator = Speculator(llm.agenerate, accept=lambda text: "灯" not in text)
+    speculator.update("今天天气怎么样", stability=1.0)
+    first = speculator.current
+    speculator.update("今天天气怎么样明天呢", stability=1.0)
+    await asyncio.sleep(0)
+    assert first.task.cancelled() or first.task.done()
+    assert speculator.take("今天天气怎么样明天会下雨吗") is None
+    speculator.update("打开灯", stability=1.0)
+    assert speculator.current is None
+    assert speculator.stats()["wasted"] == 2
+
+
+async def test_bot_state_speculates_before_endpoint():
+    """The LLM request starts at the final result, not after the silence timeout"""
+    llm = CountingLLM()
+    callback = ChainCallback(asyncio.Queue(), asyncio.Queue())
+    state = BotState(callback, silence_timeout=0.2, speculator=Speculator(llm.agenerate))
+    collector = asyncio.create_task(state.collect_stt_texts())
+    queries = state.stream_query()
+    try:
+        callback.on_text("讲个", False, stability=0.0)
+        callback.on_text("讲个笑话", False, stability=0.5)
+        callback.on_text("讲个笑话", True)
+        await asyncio.sleep(0.05)
+        assert llm.queries == ["讲个笑话"]
+        query = await asyncio.wait_for(queries.__anext__(), 1)
+    finally:
+        collector.cancel()
+    speculation = state.speculator.take(query)
+    assert speculation is not None
+    assert state.speculator.saved_ms[-1] >= 10
+
+
+async def test_speculation_is_opt_in(monkeypatch, make_chain):
+    """Each speculation may be a paid request that is thrown away"""
+    chain, _ = make_chain(store=MemorySessionStore())
+    assert chain.state.speculator is None
+    monkeypatch.setattr(chain_module, "settings", SimpleNamespace(LLM_SPECULATION=True))
+    chain, _ = make_chain(store=MemorySessionStore())
+    assert chain.state.speculator is not None
+    chain, _ = make_chain(speculate=False, store=MemorySessionStore())
+    assert chain.state.speculator is None
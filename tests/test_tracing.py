@@ -0,0 +1,130 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.schemas import Step
+from app.services import tracing
+from app.services.callback import ChainCallback
+from app.services.chat.cache import ResponseCache
+from app.services.chat.llm import OpenAILLM
+from app.services.session import MemorySessionStore
+from app.services.tracing import NULL_TRACE, LatencyTracer, TurnTrace
+from app.services.voice.stt import ASRCallbackWrapper
+from app.services.voice.tts import DashscopeTTS
+from app.services.voice.tts_cache import TTSCache
+
+
+def make_trace(**offsets):
+    trace = TurnTrace("t")
+    for stage, seconds in offsets.items():
+        trace.marks[stage] = 100 + seconds
+    return trace
+
+
+def test_first_mark_wins_unless_replaced():
+    trace = TurnTrace("t")
+    trace.mark(tracing.ASR_FINAL)
+    first = trace.marks[tracing.ASR_FINAL]
+    trace.mark(tracing.ASR_FINAL)
+    assert trace.marks[tracing.ASR_FINAL] == first
+    trace.mark(tracing.ASR_FINAL, replace=True)
+    assert trace.marks[tracing.ASR_FINAL] >= first
+
+    NULL_TRACE.mark(tracing.ASR_FINAL)
+    NULL_TRACE.attributes["route"] = "llm"
+    assert NULL_TRACE.marks == {} and NULL_TRACE.attributes == {}
+    assert LatencyTracer().finish(NULL_TRACE) == {}
+
+
+def test_only_crossed_spans_are_recorded():
+    trace = make_trace(asr_final=0, endpoint=1.0, llm_request=0.5, llm_first_token=0.8,
+                       tts_request=2.0)
+    durations = trace.durations()
+    assert set(durations) == {"endpoint_wait", "llm_ttft"}
+    assert durations["endpoint_wait"] == pytest.approx(1000)
+    assert durations["llm_ttft"] == pytest.approx(300)
+    spans = trace.spans()
+    assert [s["name"] for s in spans] == ["endpoint_wait", "llm_ttft"]
+    assert spans[0]["end"] - spans[0]["start"] == pytest.approx(1.0)
+
+
+def test_percentiles_per_span():
+    exported = []
+    tracer = LatencyTracer(exporter=exported.append)
+    for i in range(1, 101):
+        tracer.finish(make_trace(llm_request=0, llm_first_token=i / 1000))
+    stats = tracer.stats()
+    assert stats["turns"] == 100
+    assert stats["llm_ttft"]["count"] == 100
+    assert stats["llm_ttft"]["p50"] == pytest.approx(51, abs=0.2)
+    assert stats["llm_ttft"]["p95"] == pytest.approx(96, abs=0.2)
+    assert stats["llm_ttft"]["p99"] == pytest.approx(100, abs=0.2)
+    assert len(exported) == 100 and tracing.TURN_END in exported[0].marks
+
+
+def test_failing_exporter_does_not_break_turns():
+    def exporter(trace):
+        raise RuntimeError("collector down")
+
+    tracer = LatencyTracer(exporter=exporter)
+    assert tracer.finish(make_trace(llm_request=0, llm_first_token=0.1))
+    assert tracer.turns == 1
+
+
+def test_otel_exporter():
+    pytest.importorskip("opentelemetry")
+    trace = make_trace(asr_first_result=0, asr_final=0.5, endpoint=1.5)
+    LatencyTracer(exporter=tracing.otel_exporter).finish(trace, route="llm")
+
+
+async def test_llm_marks_first_token():
+    callback = ChainCallback(asyncio.Queue(), asyncio.Queue())
+    callback.trace = trace = TurnTrace("t")
+    cache = ResponseCache()
+    cache.put("你好", "问答|你好", "command", "test")
+    llm = OpenAILLM(callback, client=object(), cache=cache)
+    assert "".join([t async for t in llm.agenerate("你好", model="test")]) == "问答|你好"
+    assert trace.marks[tracing.LLM_FIRST_TOKEN] >= trace.marks[tracing.LLM_REQUEST]
+    assert trace.attributes["llm_cache"] == "hit"
+
+
+async def test_turn_traced_across_the_chain(make_chain, synthesizer_factory):
+    tracer = LatencyTracer()
+    chain, client = make_chain(silence_timeout=0.05, speculate=False,
+                               store=MemorySessionStore(), tracer=tracer)
+    cache = ResponseCache()
+    cache.put("今天天气怎么样", "问答|今天晴。", "command", settings.OPENAI_MODEL)
+    chain.llm = OpenAILLM(chain.callback, client=object(), cache=cache)
+    asr = ASRCallbackWrapper(chain.callback)
+    chain.tts = DashscopeTTS(chain.callback, cache=TTSCache(),
+                             synthesizer_factory=synthesizer_factory)
+    first = chain.callback.trace
+    assert client.trace is first
+
+    tasks = [asyncio.create_task(coro) for coro in (
+        chain.state.collect(), chain.process_llm_generate(), chain.process_audio_output())]
+    try:
+        for text, is_final in [("今天", False), ("今天天气怎么样", True)]:
+            asr.on_event(SimpleNamespace(output=SimpleNamespace(
+                sentence={"text": text, "sentence_end": is_final})))
+        for _ in range(100):
+            if tracer.turns:
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert chain.step == Step.ASR
+    stats = tracer.stats()
+    assert stats["turns"] == 1
+    for span in ("asr_finalize", "endpoint_wait", "llm_ttft", "tts_first_chunk",
+                 "time_to_first_audio", "client_handoff", "turn"):
+        assert stats[span]["count"] == 1, span
+    assert stats["endpoint_wait"]["p50"] >= 50
+    assert first.attributes == {"route": "llm", "speculated": False, "llm_cache": "hit"}
+    # 下一轮换了新的打点
+    assert chain.callback.trace is client.trace is not first
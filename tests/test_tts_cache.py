@@ -0,0 +1,60 @@
+import os
+import asyncio
+
+from app.services.callback import ChainCallback
+from app.services.voice.tts import DashscopeTTS
+from app.services.voice.tts_cache import TTSCache, normalize_text
+
+
+def test_key_normalizes_text():
+    assert normalize_text("  已为您 \n 开灯！ ") == "已为您 开灯!"
+    key = TTSCache.key("m", "v", "mp3/22050", "已为您开灯！")
+    assert key == TTSCache.key("m", "v", "mp3/22050", " 已为您开灯! ")
+    assert key != TTSCache.key("m", "v", "pcm/22050", "已为您开灯！")
+    assert key != TTSCache.key("m", "other", "mp3/22050", "已为您开灯！")
+
+
+def test_memory_tier_is_lru_bounded():
+    cache = TTSCache(max_memory_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.put("c", b"1234")
+    assert cache.get("b") is None
+    assert cache.get("a") == cache.get("c") == b"1234"
+    assert cache.stats()["memory_bytes"] == 8
+    assert (cache.memory_hits, cache.misses) == (3, 1)
+    assert cache.hit_rate == 0.75
+
+
+def test_disk_tier_survives_memory_eviction_and_is_size_bounded(tmp_path):
+    cache = TTSCache(str(tmp_path), max_memory_bytes=4, max_disk_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    assert cache.disk_hits == 1
+    # 再写入超过磁盘上限，最久没用的 b 被淘汰
+    os.utime(tmp_path / "b.audio", (0, 0))
+    cache.put("c", b"cccc")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.audio", "c.audio"]
+
+    reopened = TTSCache(str(tmp_path))
+    assert reopened.get("c") == b"cccc"
+    assert reopened.get("b") is None
+
+
+async def test_repeated_phrase_is_replayed_from_cache(synthesizer_factory, synthesizer_calls,
+                                                       speak):
+    text_queue, audio_queue = asyncio.Queue(), asyncio.Queue()
+    callback = ChainCallback(text_queue, audio_queue)
+    tts = DashscopeTTS(callback, cache=TTSCache(), synthesizer_factory=synthesizer_factory)
+
+    assert await speak(tts, audio_queue, "已为您开灯") == "已为您开灯".encode() * 2
+    assert await speak(tts, audio_queue, "已为您开灯") == "已为您开灯".encode() * 2
+    assert synthesizer_calls == ["已为您开灯"]
+    assert tts.cache.hit_rate == 0.5
+
+    # 缓存句之后的新句子照常合成，合成会话开始后不再插入缓存音频
+    audio = await speak(tts, audio_queue, "已为您开灯", "今天天气晴朗", "已为您开灯")
+    assert audio == ("已为您开灯" * 2 + "今天天气晴朗" * 2 + "已为您开灯" * 2).encode()
+    assert synthesizer_calls == ["已为您开灯", "今天天气晴朗", "已为您开灯"]
@@ -0,0 +1,86 @@
+import numpy
+
+from app.services.voice.vad import BargeInDetector, VoiceActivityDetector, frame_features
+
+RATE = 16000
+FRAME = 1600  # 100 ms
+
+
+def noise(level, seed=0):
+    rng = numpy.random.default_rng(seed)
+    return (rng.normal(0, 1, FRAME) * level).astype(numpy.int16).tobytes()
+
+
+def voice(level, f0=150.0):
+    t = numpy.arange(FRAME) / RATE
+    wave = sum(numpy.sin(2 * numpy.pi * f0 * k * t) / k for k in range(1, 6))
+    return (wave * level).astype(numpy.int16).tobytes()
+
+
+def test_frame_features():
+    rms, zcr = frame_features(voice(1000))
+    assert rms > 500 and zcr < 0.1
+    rms, zcr = frame_features(noise(1000))
+    assert 900 < rms < 1100 and zcr > 0.4
+    assert frame_features(b"") == (0.0, 0.0)
+
+
+def test_onset_releases_preroll_and_hangover_keeps_tail():
+    vad = VoiceActivityDetector(onset_frames=2, hangover_frames=2, preroll_frames=2,
+                                tail_frames=0)
+    quiet = [noise(50, seed=i) for i in range(5)]
+    speech = [voice(3000) for _ in range(3)]
+
+    out = [vad.process(frame) for frame in quiet + speech]
+    assert out[:6] == [[]] * 6
+    # 起始两帧之前的两帧静音 + 起始两帧
+    assert out[6] == quiet[3:] + speech[:2]
+    assert out[7] == [speech[2]]
+
+    tail = [noise(50, seed=10 + i) for i in range(4)]
+    out = [vad.process(frame) for frame in tail]
+    assert out == [[tail[0]], [tail[1]], [], []]
+    assert not vad.triggered
+
+
+def test_silence_after_speech_reaches_asr():
+    vad = VoiceActivityDetector(onset_frames=1, hangover_frames=1, preroll_frames=1,
+                                tail_frames=3)
+    speech = voice(3000)
+    assert vad.process(speech) == [speech]
+    quiet = [noise(50, seed=i) for i in range(6)]
+    # 一帧拖尾之后再送三帧静音
+    out = [vad.process(frame) for frame in quiet]
+    assert out == [[q] for q in quiet[:4]] + [[], []]
+    assert not vad.triggered
+
+    # 静音期间重新开口：拖尾已经送过的帧不再作为预录重复
+    vad.process(speech)
+    vad.process(quiet[0])
+    out = vad.process(quiet[1])
+    assert not vad.triggered and out == [quiet[1]]
+    assert vad.process(speech) == [speech]
+
+
+def test_noise_floor_adapts_to_steady_noise():
+    vad = VoiceActivityDetector(min_rms=300)
+    # 高于固定门限的风扇声：一开始可能误触发，之后被基底吸收
+    decisions = [vad.is_speech(noise(500, seed=i)) for i in range(300)]
+    assert not any(decisions[-50:])
+    assert vad.noise_floor > 300
+    assert any(vad.is_speech(voice(4000)) for _ in range(3))
+
+
+def test_hiss_is_not_speech():
+    vad = VoiceActivityDetector(min_rms=300)
+    for i in range(20):
+        vad.is_speech(noise(50, seed=i))
+    assert not any(vad.is_voiced(noise(400, seed=100 + i)) for i in range(5))
+
+
+def test_barge_in_detector_needs_consecutive_loud_frames():
+    detector = BargeInDetector(threshold=1500, min_frames=2)
+    assert not detector.is_speech(voice(4000))
+    assert not detector.is_speech(noise(10))
+    assert not detector.is_speech(voice(4000))
+    assert detector.is_speech(voice(4000))
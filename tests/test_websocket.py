@@ -0,0 +1,131 @@
+import json
+import asyncio
+
+import numpy
+import pytest
+from fastapi import FastAPI, WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import chat
+from app.client.websocket import WebSocketClient
+from app.services.chain import BotChain
+
+FRAME = (numpy.sin(numpy.arange(1600) / 5) * 8000).astype(numpy.int16).tobytes()
+
+
+class StubSTT:
+
+    def __init__(self, callback, frames_per_utterance=3):
+        self.callback = callback
+        self.frames_per_utterance = frames_per_utterance
+        self.frames = 0
+
+    async def recognize(self, audio_bytes, is_final=False):
+        self.frames += 1
+        if self.frames % self.frames_per_utterance == 0:
+            self.callback.on_text("今天天气怎么样", True)
+
+    def prewarm(self):
+        pass
+
+    async def stop(self, wait=True):
+        pass
+
+
+class StubLLM:
+
+    def remember(self, q, reply):
+        pass
+
+    async def agenerate(self, q, **kwargs):
+        for token in ["问答|", "今天", "天气晴朗。", "适合散步。"]:
+            await asyncio.sleep(0)
+            yield token
+
+    async def cancel(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class StubTTS:
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    async def synthesize(self, text, is_final=False):
+        if text:
+            self.callback.on_audio(text.encode(), is_final=False)
+        if is_final:
+            self.callback.on_audio(b"", is_final=True)
+
+    async def cancel(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+def stub_chain(client):
+    chain = BotChain(client, silence_timeout=0.05)
+    chain.stt = StubSTT(chain.callback)
+    chain.llm = StubLLM()
+    chain.tts = StubTTS(chain.callback)
+    return chain
+
+
+app = FastAPI()
+app.include_router(chat.router)
+app.dependency_overrides[chat.get_chain_factory] = lambda: stub_chain
+
+
+def test_websocket_turn():
+    """A spoken utterance produces the events index.html expects"""
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/v1/ws/chat/client_test") as ws:
+            assert "client_test" in chat.sessions
+            for _ in range(3):
+                ws.send_bytes(FRAME)
+
+            assert ws.receive_json() == {"type": "sentence_complete", "content": "今天天气怎么样"}
+            texts, audio = [], []
+            while True:
+                message = ws.receive()
+                if message.get("bytes") is not None:
+                    audio.append(message["bytes"])
+                    continue
+                event = json.loads(message["text"])
+                if event["type"] == "turn_done":
+                    break
+                texts.append(event)
+
+            assert texts == [{"type": "text", "content": "今天天气晴朗。适合散步。"}]
+            assert b"".join(audio) == "今天天气晴朗。适合散步。".encode()
+    assert "client_test" not in chat.sessions
+
+
+def test_audio_format_is_negotiated_per_client():
+    with TestClient(app) as client:
+        with client.websocket_connect("/api/v1/ws/chat/client_pcm?format=pcm&sample_rate=24000"):
+            session = chat.sessions["client_pcm"]
+            assert (session.audio_format, session.sample_rate) == ("pcm", 24000)
+
+
+def test_unsupported_audio_format_is_rejected():
+    with TestClient(app) as client:
+        with pytest.raises(WebSocketDisconnect) as e:
+            with client.websocket_connect("/api/v1/ws/chat/client_bad?format=flac"):
+                pass
+    assert e.value.code == 1003
+    assert "client_bad" not in chat.sessions
+
+
+async def test_flush_tells_the_browser_to_stop_playback():
+    """Queued audio is dropped and the browser is told to drop what it scheduled"""
+    session = WebSocketClient(None, "client_flush")
+    for item in [b"one", {"type": "text", "content": "好"}, b"two"]:
+        session.outbound.put_nowait(item)
+    await session.flush()
+    items = [session.outbound.get_nowait() for _ in range(session.outbound.qsize())]
+    assert items == [{"type": "text", "content": "好"}, {"type": "interrupt"}]